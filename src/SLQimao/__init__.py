@@ -16,17 +16,17 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from colorama import Fore, Style, init
 import os
 import platform
 
 __version__ = "v1.0.2"  # SLQimao Core Version
 
-init(autoreset=True)
+# 与colorama的 Fore.XXX + Style.BRIGHT 相同，直接使用ANSI转义序列，避免导入时加载colorama
+red = "\033[31m\033[1m"
+yellow = "\033[33m\033[1m"
+green = "\033[32m\033[1m"
 
-red = Fore.RED + Style.BRIGHT
-yellow = Fore.YELLOW + Style.BRIGHT
-green = Fore.GREEN + Style.BRIGHT
+_console_ready = False
 
 nullproxies = {
     "http": None,
@@ -50,3 +50,15 @@ key = 'd3dGiJc651gSQ8w1'  # sign_key
 
 def clear_screen():
     os.system('cls') if platform.system() == 'Windows' else os.system('clear')
+
+
+def init_console():
+    """
+    初始化控制台颜色输出（colorama，自动重置颜色）\n
+    只在第一次调用时生效，Book对象创建时会自动调用
+    """
+    global _console_ready
+    if not _console_ready:
+        from colorama import init
+        init(autoreset=True)
+        _console_ready = True
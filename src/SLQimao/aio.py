@@ -0,0 +1,140 @@
+"""
+asyncio接口\n
+AsyncBook包装Book，提供相同的方法（协程版本）：网络请求、缓存文件下载、解密与写文件都在执行器中运行，不会阻塞事件循环\n
+一个事件循环可以同时驱动多本小说的下载与搜索，例如:
+    books = [AsyncBook(book_id) for book_id in ids]
+    await asyncio.gather(*(book.ready() for book in books))
+    await asyncio.gather(*(book.totxt(path) for book in books))
+使用profile=True时请用async with（或在用完后await book.aclose()），关闭为该书创建的专用线程\n
+注意：各方法只是把阻塞的Book方法放到执行器的线程中运行，并不是真正的异步IO，
+同时进行的操作数量受执行器的线程数限制（事件循环的默认执行器为min(32, CPU数 + 4)个线程），超出的操作会排队等待；
+并发数量较大时，请用session.configure调大连接池，并给事件循环设置足够大的默认执行器（或传入executor）
+"""
+import asyncio
+import weakref
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from .book import Book, search_books
+
+
+class AsyncBook:
+    """
+    七猫小说类（asyncio版本）\n
+    未在此定义的属性（title、catalog、file_path等）直接读取内部的Book对象\n
+    解密：processes大于1时在进程池中解密，否则在执行器的线程中解密\n
+    并发：每个进行中的方法占用执行器的一个线程，同时下载的小说数量不会超过执行器的线程数\n
+    性能分析（profile=True）：未传入executor时该书的所有操作在一个专用线程中运行，用完后由aclose关闭
+    （对象被回收时也会关闭）
+    :param book_id: 小说ID
+    :param executor: 运行阻塞操作的执行器，默认使用事件循环的默认执行器
+    :param kwargs: 传给Book的参数（workdir、stream、processes、store、cache、profile等），quiet默认为True
+    """
+    def __init__(self, book_id: str, executor: Executor | None = None, **kwargs) -> None:
+        kwargs.setdefault("quiet", True)
+        self.book: Book = Book(book_id, **kwargs)
+        self._close = None
+        if executor is None and self.book.profile:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"profile-{book_id}")
+            self._close = weakref.finalize(self, executor.shutdown, wait=False)
+        self.executor: Executor | None = executor
+
+    async def aclose(self) -> None:
+        """
+        关闭AsyncBook自己创建的执行器（传入的executor由调用者负责关闭），之后改用事件循环的默认执行器
+        :return: None
+        """
+        if self._close is not None:
+            self._close()
+            self._close = None
+            self.executor = None
+
+    async def __aenter__(self) -> "AsyncBook":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
+
+    def __getattr__(self, name: str):
+        return getattr(self.book, name)
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    async def get_info(self, refresh: bool = False) -> None:
+        """
+        获取小说信息
+        :param refresh: 忽略缓存，强制重新获取，默认False
+        :return: None
+        """
+        await self._run(self.book.get_info, refresh)
+
+    async def get_catalog(self, refresh: bool = False) -> None:
+        """
+        获取小说目录
+        :param refresh: 忽略缓存，强制重新获取，默认False
+        :return: None
+        """
+        await self._run(self.book.get_catalog, refresh)
+
+    async def ready(self, refresh: bool = False) -> None:
+        """
+        准备下载，获取小说信息和目录（同Book.ready，包括启动性能分析与记录ready阶段）\n
+        需要同时准备多本小说时，用asyncio.gather同时调用各本的ready
+        :param refresh: 忽略缓存，强制重新获取，默认False
+        :return: None
+        """
+        await self._run(self.book.ready, refresh)
+
+    async def download(self) -> int:
+        """
+        下载缓存文件（所有章节都在章节存储中时跳过），之后调用的输出方法不会重新下载
+        :return: 章节数量
+        """
+        return await self._run(self.book._prepare)
+
+    async def cleanup(self) -> None:
+        """
+        清理download生成的临时文件（只下载、不输出时调用）
+        :return: None
+        """
+        await self._run(self.book._cleanup)
+
+    async def totxt(self, path: str, encoding: str = "utf-8", start: str = "None") -> bool:
+        """
+        下载小说到txt文件，参数同Book.totxt
+        :return: 是否成功
+        """
+        return await self._run(self.book.totxt, path, encoding, start)
+
+    async def totxt_ecs(self, path: str, encoding: str = "utf-8") -> bool:
+        """
+        下载小说到txt文件，分章节保存，参数同Book.totxt_ecs
+        :return: 是否成功
+        """
+        return await self._run(self.book.totxt_ecs, path, encoding)
+
+    async def toepub(self, path: str, streaming: bool = True, **kwargs) -> bool:
+        """
+        下载小说到epub文件，参数同Book.toepub
+        :return: 是否成功
+        """
+        return await self._run(self.book.toepub, path, streaming, **kwargs)
+
+    async def export(self, path: str, formats: list, encoding: str = "utf-8", **kwargs) -> bool:
+        """
+        下载一次，同时输出多种格式，参数同Book.export
+        :return: 是否成功
+        """
+        return await self._run(self.book.export, path, formats, encoding, **kwargs)
+
+
+async def search(keyword: str, executor: Executor | None = None) -> list:
+    """
+    搜索小说（非交互）
+    :param keyword: 搜索关键词
+    :param executor: 运行请求的执行器，默认使用事件循环的默认执行器
+    :return: 搜索结果列表，同book.search_books
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, search_books, keyword)
@@ -1,28 +1,55 @@
-from . import nullproxies, version_list, key, red, yellow, green, clear_screen
+from __future__ import annotations
+from . import nullproxies, version_list, key, red, yellow, green, clear_screen, init_console
+from . import ratelimit
+from .progress import ProgressReporter, NullReporter, RichReporter
+from .stats import BookStats
 import hashlib
 import random
-import requests
 import re
-from base64 import b64decode
-from Crypto.Cipher import AES  # noqa
-from Crypto.Util.Padding import unpad  # noqa
-# import tqdm
-from rich.progress import (
-    Progress,
-    BarColumn,
-    TimeElapsedColumn,
-    TimeRemainingColumn,
-    SpinnerColumn,
-    TaskProgressColumn,
-    DownloadColumn
-)
 import time
-import zipfile
 import os
 import shutil
 import datetime
-# epub mode
-from ebooklib import epub
+import json
+from typing import Iterator, TYPE_CHECKING
+from collections import deque
+from functools import wraps
+from itertools import islice
+from html import escape
+# 以下依赖导入较慢，只在用到的方法中导入，见benchmarks/bench_import.py
+# requests: session属性, rich: progress.RichReporter, zipfile: _gaunade, ebooklib: _write_epub
+# Crypto: crypto模块, pool: _map_pooled, concurrent.futures: toepub
+if TYPE_CHECKING:
+    import requests
+    import zipfile
+    from .store import ChapterStore
+    from .cache import MetaCache
+    from .stats import StatsLog
+    from .profiling import Profiler
+
+
+def _reported(method):
+    """
+    记录输出方法的总耗时与结果，指定了stats_log时把本书的统计写入一行\n
+    正在进行性能分析时，结束分析并把结果保存到输出路径
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs) -> bool:
+        start = time.perf_counter()
+        success = False
+        try:
+            success = method(self, *args, **kwargs)
+            return success
+        finally:
+            self.stats.output(method.__name__, success, time.perf_counter() - start)
+            if self.stats_log is not None:
+                self.stats_log.write(self.report())
+            if self._profiler is not None:
+                profiler, self._profiler = self._profiler, None
+                path = kwargs.get("path", args[0] if args else ".")
+                files = profiler.stop(path, f"{self.title}.{method.__name__}")
+                print(green + f"性能分析结果已保存：{'、'.join(os.path.basename(file) for file in files)}")
+    return wrapper
 
 
 class Book:
@@ -33,14 +60,62 @@ class Book:
     注意：下载过程中使用了tqdm显示进度条，如果不需要显示进度条，请自行修改\n
     :param book_id: 小说ID
     :param proxies: 代理，默认无代理
+    :param workdir: 临时工作目录，缓存文件在此下载和解压，默认当前目录
+    :param quiet: 是否隐藏进度条（并发下载时应开启），默认False；指定了reporter时忽略
+    :param session: 请求使用的会话，默认使用共享连接池会话
+    :param stream: 流式模式，不解压缓存文件，直接从zip中读取并在内存中解密章节，默认False
+    :param limiter: 下载限速器，默认使用全局限速器（ratelimit.limiter，默认不限速）
+    :param processes: 解密使用的进程数，大于1时使用进程池分批处理，默认0（在当前进程中处理）
+    :param retries: 缓存文件下载中断后的重试次数，默认3
+    :param store: 已解密章节的本地存储，所有章节都已缓存时不再下载，默认不使用
+    :param cache: 小说信息与目录的缓存，默认不使用
+    :param reporter: 进度报告器，默认根据quiet选择RichReporter或NullReporter
+    :param stats_log: JSON-lines统计文件，每次调用输出方法后写入一行本书的统计（report()），默认不写入
+    :param profile: 性能分析，从ready开始运行cProfile与tracemalloc，输出方法结束后把结果保存在输出路径，默认False
+                    （同一进程中同时只能分析一本小说，已有其他小说正在分析时这本小说不分析）
     """
-    def __init__(self, book_id: str, proxies: dict = nullproxies) -> None:
+    # 进程池模式下每批处理的章节数
+    decrypt_chunk: int = 64
+    # export支持的输出格式
+    formats: tuple = ("txt", "chapter", "epub")
+    # API地址，可以指向本地的替身服务器（见benchmarks/standin.py）
+    api_bc: str = "https://api-bc.wtzw.com"
+    api_ks: str = "https://api-ks.wtzw.com"
+
+    def __init__(self, book_id: str, proxies: dict = nullproxies, workdir: str = ".", quiet: bool = False,
+                 session: requests.Session | None = None, stream: bool = False,
+                 limiter: ratelimit.TokenBucket | None = None, processes: int = 0, retries: int = 3,
+                 store: ChapterStore | None = None, cache: MetaCache | None = None,
+                 reporter: ProgressReporter | None = None, stats_log: StatsLog | None = None,
+                 profile: bool = False) -> None:
         """
         使用小说ID初始化Book对象
         :param book_id:
         """
+        init_console()
         self.book_id: str = book_id                 # 小说ID
         self.proxies: dict = proxies                # 代理
+        self.workdir: str = workdir                 # 临时工作目录
+        self.quiet: bool = quiet                    # 隐藏进度条
+        self.folder: str = os.path.join(workdir, book_id)   # 解压文件夹
+        self._session: requests.Session | None = session    # 请求会话（未指定时首次使用时获取共享会话）
+        self.stream: bool = stream                  # 流式模式
+        self.limiter: ratelimit.TokenBucket = limiter if limiter is not None else ratelimit.limiter  # 限速器
+        self.processes: int = processes             # 解密进程数
+        self.retries: int = retries                 # 下载重试次数
+        self.store: ChapterStore | None = store     # 章节存储
+        self._from_store: bool = False              # 本次章节内容是否全部来自章节存储
+        self._prepared: int | None = None           # 已准备好的章节数量（_prepare的结果，_cleanup后失效）
+        self.cache: MetaCache | None = cache        # 元数据缓存
+        if reporter is None:
+            reporter = NullReporter() if quiet else RichReporter()
+        self.reporter: ProgressReporter = reporter  # 进度报告器
+        self.stats: BookStats = BookStats(book_id)  # 分阶段统计
+        self.stats_log: StatsLog | None = stats_log     # JSON-lines统计文件
+        self.profile: bool = profile                # 性能分析
+        self._profiler: Profiler | None = None      # 正在运行的性能分析器（ready开始，输出方法结束）
+        self._zip: zipfile.ZipFile | None = None    # 已打开的缓存文件（仅流式模式）
+        self._members: dict = {}                    # 章节ID -> zip内文件名（仅流式模式）
         self.version_list: list = version_list      # app版本列表
         self.key: str = key                         # 签名key
         self.headers: dict = self._get_headers()    # 请求头
@@ -54,17 +129,27 @@ class Book:
         self.catalog: list = []                     # 目录
         self.lastcid: str = "None"                  # 最后一个章节ID
         self.file_path: str = "None"                # 保存后文件路径
+        self.file_hash: str = "None"                # 保存后文件的sha256（写入时计算，仅txt模式）
         self.encoding: str = "utf-8"                # 文件编码（仅txt模式）
 
+    @property
+    def session(self) -> requests.Session:
+        """
+        请求会话，未指定时使用共享连接池会话（首次使用时才导入requests）
+        """
+        if self._session is None:
+            from .session import get_session
+            self._session = get_session()
+        return self._session
+
     def _get_headers(self) -> dict:
         """
         根据小说ID生成请求头
         :return: 请求头
         """
-        # 使用小说ID作为随机种子
-        random.seed(self.book_id)
+        # 使用小说ID作为随机种子（使用独立的随机数生成器，避免多线程下互相干扰）
         # 随机选择一个版本
-        version = random.choice(self.version_list)
+        version = random.Random(self.book_id).choice(self.version_list)
 
         headers = {
             "AUTHORIZATION": "",
@@ -136,38 +221,43 @@ class Book:
         return new_name
 
     @staticmethod
-    def _decrypt(origin: str) -> str:
+    def _decrypt(origin: str | bytes) -> str:
         """
-        解密被加密的文本
+        解密被加密的文本\n
+        实现位于crypto.decrypt
         :param origin: 被加密的文本
         :return: 解密后的文本
         """
         # 七猫使用AES加密
-        txt = b64decode(origin)
-        iv = txt[:16].hex()
-        data = txt[16:].hex()
-        dkey = bytes.fromhex('32343263636238323330643730396531')
-        iv = bytes.fromhex(iv)
-        cipher = AES.new(dkey, AES.MODE_CBC, iv=iv)
-        decrypted = unpad(cipher.decrypt(bytes.fromhex(data)), AES.block_size)
-        decrypted = decrypted.decode('utf-8').strip()
-        return decrypted
-
-    def get_info(self) -> None:
+        from .crypto import decrypt
+        return decrypt(origin)
+
+    def get_info(self, refresh: bool = False) -> None:
         """
         获取小说信息
+        :param refresh: 忽略缓存，强制重新获取，默认False
         :return: None
         """
-        # 请求API
-        info = requests.get(f"https://api-bc.wtzw.com/api/v1/reader/detail?id={self.book_id}", proxies=self.proxies,
-                            timeout=12).json()
+        data = None
+        if self.cache is not None and not refresh:
+            with self.stats.stage("info.cache"):
+                data = self.cache.get(f"info:{self.book_id}")
+        if data is None:
+            # 请求API
+            with self.stats.stage("info") as stage:
+                response = self.session.get(f"{self.api_bc}/api/v1/reader/detail?id={self.book_id}",
+                                            proxies=self.proxies, timeout=12)
+                stage["bytes"] = len(response.content)
+                data = response.json()["data"]
+            if self.cache is not None:
+                self.cache.put(f"info:{self.book_id}", data)
 
         # 提取信息
-        self.title = self._rename(info["data"]["title"])
-        self.author = info["data"]["author"]
-        self.intro = info["data"]["intro"]
-        self.words_num = info["data"]["words_num"]
-        tags = [tag["title"] for tag in info["data"]["book_tag_list"]]
+        self.title = self._rename(data["title"])
+        self.author = data["author"]
+        self.intro = data["intro"]
+        self.words_num = data["words_num"]
+        tags = [tag["title"] for tag in data["book_tag_list"]]
         self.tags = str(tags).replace("'", "").replace("[", "").replace("]", "")
 
         self.basecontent = f"""如果需要小说更新，请勿修改文件名
@@ -183,24 +273,36 @@ Gitee:https://gitee.com/xingyv1024/7mao-novel-downloader/
 字数：{self.words_num}
 书籍ID：{self.book_id}
 """
-        self.img_url = info["data"]["image_link"]
+        self.img_url = data["image_link"]
         return
 
-    def get_catalog(self) -> None:
+    def get_catalog(self, refresh: bool = False) -> None:
         """
         获取小说目录
+        :param refresh: 忽略缓存，强制重新获取，默认False
         :return: None
         """
+        chapters = None
+        if self.cache is not None and not refresh:
+            with self.stats.stage("catalog.cache"):
+                chapters = self.cache.get(f"catalog:{self.book_id}")
+        if chapters is not None:
+            self.catalog = chapters
+            return
         # 请求章节列表
         params = {
             'chapter_ver': '0',
             'id': self.book_id,
         }
-        response = requests.get("https://api-ks.wtzw.com/api/v1/chapter/chapter-list",
-                                params=self._sign(params),
-                                headers=self.headers,
-                                proxies=self.proxies,
-                                timeout=12).json()
+        with self.stats.stage("catalog") as stage:
+            response = self.session.get(f"{self.api_ks}/api/v1/chapter/chapter-list",
+                                        params=self._sign(params),
+                                        headers=self.headers,
+                                        proxies=self.proxies,
+                                        timeout=12)
+            stage["bytes"] = len(response.content)
+            response = response.json()
+            stage["chapters"] = len(response["data"]["chapter_lists"])
 
         # {
         #     "data": {
@@ -221,6 +323,8 @@ Gitee:https://gitee.com/xingyv1024/7mao-novel-downloader/
         chapters.sort(key=lambda x: x["chapter_sort"])
 
         self.catalog = chapters
+        if self.cache is not None:
+            self.cache.put(f"catalog:{self.book_id}", chapters)
 
     class DownloadCacheError(Exception):
         """
@@ -239,6 +343,7 @@ Gitee:https://gitee.com/xingyv1024/7mao-novel-downloader/
         生成一个以小说ID命名的文件夹，内含解密后的小说内容
         :return: 一个os.walk对象
         """
+        import zipfile
         # 4.0新增调用官方缓存接口
         params = {
             'id': self.book_id,
@@ -247,107 +352,409 @@ Gitee:https://gitee.com/xingyv1024/7mao-novel-downloader/
             'is_vip': 1
         }
         # 请求全本缓存接口得到下载链接
-        response = requests.get("https://api-bc.wtzw.com/api/v1/book/download",
-                                params=self._sign(params),
-                                headers=self.headers,
-                                proxies=self.proxies,
-                                timeout=12).json()
+        with self.stats.stage("link"):
+            response = self.session.get(f"{self.api_bc}/api/v1/book/download",
+                                        params=self._sign(params),
+                                        headers=self.headers,
+                                        proxies=self.proxies,
+                                        timeout=12).json()
         link = response["data"]["link"]
         # 创建临时文件
-        temp = f"{self.book_id}.zip"
+        temp = os.path.join(self.workdir, f"{self.book_id}.zip")
         try:
             print("开始下载缓存文件")
-            # 请求zip文件
-            response = requests.get(link, stream=True)
-            # 获取文件大小
-            total_size = int(response.headers.get('content-length', 0))
-            block_size = 1024
-            # 下载进度
-            # with tqdm.tqdm(total=total_size // block_size, unit='KB', unit_scale=True, desc="正在下载缓存文件") as pbar:
-            #     with open(temp, 'wb') as f:
-            #         for data in response.iter_content(block_size):
-            #             pbar.update(1)
-            #             f.write(data)
-            #             time.sleep(0.003)  # 限速约300KB/s
-            with Progress(
-                    "{task.description}",
-                    SpinnerColumn(),
-                    BarColumn(),
-                    # "{task.completed}/{task.total}",
-                    DownloadColumn(),
-                    # TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
-                    TaskProgressColumn(),
-                    TimeElapsedColumn(),
-                    "<",
-                    TimeRemainingColumn(),
-            ) as progress:
-                task = progress.add_task("[cyan]下载缓存文件", total=total_size)
-                with open(temp, 'wb') as f:
-                    for data in response.iter_content(block_size):
-                        f.write(data)
-                        progress.update(task, advance=block_size)
-                        progress.refresh()
-                        time.sleep(0.003)
-
+            self._download(link, temp)
             print(green + f"下载缓存文件成功")
         except Exception as e:
             raise self.DownloadCacheError(f"下载缓存文件失败：{e}")
 
+        if self.stream:
+            # 流式模式：保持zip打开，合并时直接读取并解密，不落地任何章节文件
+            self._zip = zipfile.ZipFile(temp, 'r')
+            self._members = {os.path.splitext(os.path.basename(name))[0]: name
+                             for name in self._zip.namelist() if not name.endswith('/')}
+            print(yellow + "本程序开源免费，如果您遇到收费情况，请立即退款并举报商家")
+            return len(self._members)
+
         # 解压缓存文件
         print("开始解压缓存文件")
-        os.makedirs(self.book_id, exist_ok=True)
-        with zipfile.ZipFile(temp, 'r') as z:
-            z.extractall(self.book_id)
+        os.makedirs(self.folder, exist_ok=True)
+        with self.stats.stage("extract") as stage, zipfile.ZipFile(temp, 'r') as z:
+            members = z.infolist()
+            z.extractall(self.folder)
+            stage["bytes"] = sum(member.file_size for member in members)
+            stage["chapters"] = len(members)
         print(green + f"解压缓存文件成功")
 
         # 删除临时文件
         os.remove(temp)
 
-        txts = os.listdir(self.book_id)
+        txts = os.listdir(self.folder)
         # 重新以数字大小排序
         txts.sort(key=lambda x: int(x.split('.')[0]))
-        txts = [os.path.join(self.book_id, txt) for txt in txts]
+        txts = [os.path.join(self.folder, txt) for txt in txts]
 
         print(yellow + "本程序开源免费，如果您遇到收费情况，请立即退款并举报商家")
 
         # 解密缓存文件
         print("开始解密缓存文件")
-        for file in txts:
-            with open(file, 'r+', encoding='utf-8') as f:
-                content = f.read()
-                f.seek(0)
-                f.truncate()
-                f.write(self._decrypt(content))
+        with self.stats.stage("decrypt", chapters=len(txts)) as stage:
+            if self.processes > 1:
+                def load(file_: str) -> str:
+                    with open(file_, 'r', encoding='utf-8') as f_:
+                        content_ = f_.read()
+                    stage["bytes"] += len(content_)
+                    return content_
+                for file, content in self._decrypt_pooled(txts, load):
+                    with open(file, 'w', encoding='utf-8') as f:
+                        f.write(content)
+            else:
+                for file in txts:
+                    with open(file, 'r+', encoding='utf-8') as f:
+                        content = f.read()
+                        stage["bytes"] += len(content)
+                        f.seek(0)
+                        f.truncate()
+                        f.write(self._decrypt(content))
         print(green + f"解密缓存文件成功")
         return len(txts)
 
+    def _download(self, link: str, temp: str) -> None:
+        """
+        下载缓存文件，支持断点续传\n
+        已接收的数据保存在"temp.part"，"temp.part.json"记录已接收字节数、文件总大小与ETag\n
+        连接中断后（包括下次运行时）使用Range请求从断点继续，下载完成并校验通过后重命名为temp
+        :param link: 缓存文件链接
+        :param temp: 缓存文件保存路径
+        :return: None
+        """
+        import requests
+        import zipfile
+        part = temp + ".part"
+        record_path = part + ".json"
+        start = time.perf_counter()
+        transferred = 0     # 本次实际接收的字节数（不含上次已下载的部分）
+        for attempt in range(self.retries + 1):
+            record = self._read_part_record(part, record_path)
+            received = record.get("received", 0)
+            if received and received == record.get("total"):
+                # 上次已接收完整，只是没来得及校验
+                break
+            headers = {}
+            if received:
+                headers["Range"] = f"bytes={received}-"
+                # 文件在服务器上发生变化时，服务器会返回完整文件而不是206
+                if record.get("etag"):
+                    headers["If-Range"] = record["etag"]
+            try:
+                response = self.session.get(link, stream=True, headers=headers, timeout=30)
+                if response.status_code == 416:
+                    raise self.DownloadCacheError("断点位置无效")
+                response.raise_for_status()
+                if response.status_code == 206:
+                    # Content-Range: bytes 起始-结束/总大小
+                    total_size = int(response.headers.get('content-range', '').rsplit('/', 1)[-1] or 0)
+                    if record.get("total") and total_size != record["total"]:
+                        raise self.DownloadCacheError("缓存文件大小发生变化")
+                else:
+                    received = 0
+                    total_size = int(response.headers.get('content-length', 0))
+                record = {"total": total_size, "received": received, "etag": response.headers.get('etag')}
+                with self.reporter.task("下载缓存文件", total_size, "B", received) as progress:
+                    with open(part, 'r+b' if received else 'wb') as f:
+                        f.seek(received)
+                        f.truncate()
+                        try:
+                            for data in response.iter_content(ratelimit.chunk_size):
+                                self.limiter.consume(len(data))
+                                f.write(data)
+                                transferred += len(data)
+                                record["received"] += len(data)
+                                # 每接收约1MB更新一次记录，防止程序被强制结束时丢失进度
+                                if record["received"] // 1048576 != (record["received"] - len(data)) // 1048576:
+                                    f.flush()
+                                    self._write_part_record(record_path, record)
+                                progress.advance(len(data))
+                        finally:
+                            f.flush()
+                            self._write_part_record(record_path, record)
+                break
+            except requests.RequestException as e:
+                if attempt == self.retries:
+                    raise
+                print(yellow + f"下载中断，正在从断点重试（{attempt + 1}/{self.retries}）：{e}")
+                time.sleep(min(2 ** attempt, 10))
+            except self.DownloadCacheError:
+                # 服务器上的文件已经变化，丢弃已下载的部分
+                os.remove(part)
+                os.remove(record_path)
+                if attempt == self.retries:
+                    raise
+
+        self.stats.add("transfer", time.perf_counter() - start, transferred)
+
+        # 校验下载完成的文件
+        start = time.perf_counter()
+        size = os.path.getsize(part)
+        error = None
+        if record["total"] and size != record["total"]:
+            error = f"文件大小不匹配：{size}/{record['total']}字节"
+        elif not zipfile.is_zipfile(part):
+            error = "文件不是有效的zip文件"
+        else:
+            with zipfile.ZipFile(part, 'r') as z:
+                bad = z.testzip()
+            if bad is not None:
+                error = f"文件{bad}校验失败"
+        self.stats.add("verify", time.perf_counter() - start, size)
+        os.remove(record_path)
+        if error is not None:
+            os.remove(part)
+            raise self.DownloadCacheError(error)
+        os.replace(part, temp)
+
+    @staticmethod
+    def _read_part_record(part: str, record_path: str) -> dict:
+        """
+        读取断点续传记录，记录与已下载文件不一致时视为无记录
+        :param part: 已下载的部分文件路径
+        :param record_path: 记录文件路径
+        :return: 记录
+        """
+        if not (os.path.exists(part) and os.path.exists(record_path)):
+            return {}
+        try:
+            with open(record_path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # 实际写入磁盘的数据可能多于记录，以记录为准（多余部分会被截断）
+        if os.path.getsize(part) < record.get("received", 0):
+            return {}
+        return record
+
+    @staticmethod
+    def _write_part_record(record_path: str, record: dict) -> None:
+        """
+        写入断点续传记录
+        :param record_path: 记录文件路径
+        :param record: 记录
+        :return: None
+        """
+        with open(record_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f)
+
+    def _map_pooled(self, items, func, load) -> Iterator[tuple]:
+        """
+        使用进程池分批处理，按输入顺序逐个返回(对象, 处理结果)\n
+        同时在途的批次数量有限，不会一次性把整本书读入内存\n
+        进程池在进程内共享（见pool模块），同时下载多本小说时不会为每本小说启动一组子进程
+        :param items: 待处理的对象（列表或迭代器）
+        :param func: 在子进程中执行的函数，接收一批参数的列表，返回同样顺序的结果列表
+        :param load: 在当前进程中把对象转换为func参数的函数
+        :return: (对象, 处理结果)的迭代器
+        """
+        from .pool import get_pool
+        items = iter(items)
+        pool = get_pool(self.processes)
+        pending = deque()
+        try:
+            while batch := list(islice(items, self.decrypt_chunk)):
+                pending.append((batch, pool.submit(func, [load(item) for item in batch])))
+                if len(pending) >= self.processes * 2:
+                    batch, future = pending.popleft()
+                    yield from zip(batch, future.result())
+            while pending:
+                batch, future = pending.popleft()
+                yield from zip(batch, future.result())
+        finally:
+            # 提前结束（出错或不再需要结果）时取消尚未开始的批次
+            for _, future in pending:
+                future.cancel()
+
+    def _decrypt_pooled(self, items: list, load) -> Iterator[tuple]:
+        """
+        使用进程池分批解密，按输入顺序逐个返回(对象, 解密后的文本)
+        :param items: 待解密的对象列表（文件路径或章节）
+        :param load: 读取对象对应密文的函数
+        :return: (对象, 解密后的文本)的迭代器
+        """
+        from .crypto import decrypt_many
+        return self._map_pooled(items, decrypt_many, load)
+
+    def _prepare(self) -> int:
+        """
+        准备章节内容\n
+        所有章节都已在章节存储中（且content_md5一致）时直接使用章节存储，不访问网络，否则调用_gaunade\n
+        结果在_cleanup之前保持有效，重复调用不会重新下载
+        :return: 章节数量
+        """
+        if self._prepared is not None:
+            return self._prepared
+        try:
+            if self.store is not None and self.catalog and self.store.missing(self.catalog) == 0:
+                print(green + "所有章节均已缓存，跳过下载")
+                self._from_store = True
+                self._prepared = len(self.catalog)
+            else:
+                self._prepared = self._gaunade()
+        except Exception:
+            # 直接调用_prepare（不经过输出方法）时没有其他地方会停止分析
+            self._discard_profiler()
+            raise
+        self._checkpoint("download")
+        return self._prepared
+
+    def _start_profiler(self) -> None:
+        """
+        开始性能分析，已有其他小说正在分析时（同一进程中同时只能分析一本）不分析这本小说
+        :return: None
+        """
+        from .profiling import Profiler, ProfilerBusy
+        profiler = Profiler()
+        try:
+            profiler.start()
+        except ProfilerBusy as e:
+            print(yellow + f"小说{self.book_id}不进行性能分析：{e}")
+            return
+        self._profiler = profiler
+
+    def _discard_profiler(self) -> None:
+        """
+        出错时停止并丢弃正在进行的性能分析
+        :return: None
+        """
+        if self._profiler is not None:
+            profiler, self._profiler = self._profiler, None
+            profiler.discard()
+
+    def _checkpoint(self, name: str) -> None:
+        """
+        正在进行性能分析时，在阶段结束时保存内存快照
+        :param name: 阶段名
+        :return: None
+        """
+        if self._profiler is not None:
+            self._profiler.checkpoint(name)
+
+    def _iter_chapters(self, chapters: list) -> Iterator[tuple]:
+        """
+        按顺序返回章节及其解密后的内容\n
+        流式模式且指定了多个进程时，使用进程池解密\n
+        使用章节存储时，新解密的章节会同时写入章节存储\n
+        读取与解密的耗时记录在stats的store、decrypt（流式模式）或read（已解压的文件）阶段
+        :param chapters: 目录中的章节列表
+        :return: (章节, 章节内容)的迭代器
+        """
+        if self._from_store:
+            for i in range(0, len(chapters), self.store.batch_size):
+                batch = chapters[i:i + self.store.batch_size]
+                with self.stats.stage("store", chapters=len(batch)):
+                    contents = self.store.get_many(batch)
+                for chapter in batch:
+                    yield chapter, contents[chapter['id']]
+            return
+        if self._zip is not None and self.processes > 1:
+            chapters_ = self._decrypt_pooled(chapters, lambda c: self._zip.read(self._members[c['id']]))
+        else:
+            chapters_ = ((chapter, self._read_chapter(chapter)) for chapter in chapters)
+        chapters_ = self.stats.timed("decrypt" if self._zip is not None else "read", chapters_)
+        if self.store is None:
+            yield from chapters_
+            return
+        pending = []
+        for chapter, content in chapters_:
+            pending.append((chapter, content))
+            if len(pending) >= self.store.batch_size:
+                with self.stats.stage("store.put", chapters=len(pending)):
+                    self.store.put_many(self.book_id, pending)
+                pending = []
+            yield chapter, content
+        if pending:
+            with self.stats.stage("store.put", chapters=len(pending)):
+                self.store.put_many(self.book_id, pending)
+
+    def _read_chapter(self, chapter: dict) -> str:
+        """
+        读取已解密的章节内容\n
+        流式模式下直接从zip中读取并解密，否则读取解压后的文件
+        :param chapter: 目录中的章节
+        :return: 章节内容
+        """
+        if self._zip is not None:
+            return self._decrypt(self._zip.read(self._members[chapter['id']]))
+        with open(os.path.join(self.folder, f"{chapter['id']}.txt"), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def _cleanup(self) -> None:
+        """
+        清理_gaunade生成的临时文件
+        :return: None
+        """
+        self._from_store = False
+        self._prepared = None
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+            self._members = {}
+            os.remove(os.path.join(self.workdir, f"{self.book_id}.zip"))
+        if os.path.exists(self.folder):
+            shutil.rmtree(self.folder)
+
+    def catalog_digest(self) -> str:
+        """
+        目录指纹：按顺序计算所有章节ID与content_md5的sha256\n
+        任一章节新增、删除或内容变化时指纹都会改变，用于判断小说是否需要更新\n
+        没有content_md5的章节（例如合成的目录）只按章节ID计算
+        :return: 十六进制sha256
+        """
+        digest = hashlib.sha256()
+        for chapter in self.catalog:
+            digest.update(f"{chapter['id']}:{chapter.get('content_md5', '')}\n".encode('utf-8'))
+        return digest.hexdigest()
+
+    def report(self) -> dict:
+        """
+        本书的分阶段统计报告（各阶段的耗时、调用次数、字节数与章节数，以及每次调用输出方法的结果）\n
+        阶段：info、catalog（API请求，命中缓存时为info.cache、catalog.cache），link、transfer、verify（缓存文件），
+        extract、decrypt、read、store、store.put（读取章节），merge（合并循环），txt.encode、txt.hash、txt.write、
+        chapter.write、epub.render、epub.write（各格式的写入），cover、assets、hash、update
+        :return: {"book_id", "title", "chapters", "stages", "outputs"}
+        """
+        report = self.stats.to_dict()
+        return {"book_id": self.book_id, "title": self.title, "chapters": len(self.catalog),
+                "stages": report["stages"], "outputs": report["outputs"]}
+
     def write_update(self, datafolder: str) -> None:
         """
         写入更新元数据文件（仅txt模式）\n
-        注意：此方法仅为兼容旧版本和将文件名对应为书籍ID存在的情况，如只使用新版本，已无需调用此方法\n
-        如只使用新版本，已无需调用此方法
+        注意：此方法仅为兼容旧版本和将文件名对应为书籍ID存在的情况\n
+        程序已改用library.Library记录已下载的小说（可以导入.upd文件），如只使用新版本，已无需调用此方法
         :param datafolder: 程序数据文件夹路径
         :return: None
         """
         if self.lastcid == "None":
             print(red + "该下载模式不支持写入更新元数据文件或未调用下载方法")
             return
-        # 计算hash
-        hash_sha256 = hashlib.sha256()
-        with open(self.file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_sha256.update(chunk)
-        sha256_hash = hash_sha256.hexdigest()
+        # 使用写入时计算的hash，没有时才重新读取文件计算
+        if self.file_hash != "None":
+            sha256_hash = self.file_hash
+        else:
+            with self.stats.stage("hash", os.path.getsize(self.file_path)):
+                sha256_hash = file_sha256(self.file_path)
         # 创建更新元数据文件
-        with open(os.path.join(datafolder, f"{self.title}.upd"), 'w', encoding='utf-8') as f:
-            f.write(f"""{datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        with self.stats.stage("update"):
+            with open(os.path.join(datafolder, f"{self.title}.upd"), 'w', encoding='utf-8') as f:
+                f.write(f"""{datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
 {self.book_id}
 {self.lastcid}
 {self.encoding}
-{sha256_hash}""")
+{sha256_hash}
+{self.catalog_digest()}""")
         return
 
-    def totxt(self, path: str, encoding: str = "utf-8", start: str = "None") -> None:
+    @_reported
+    def totxt(self, path: str, encoding: str = "utf-8", start: str = "None") -> bool:
         """
         下载小说到txt文件\n
         注意：该方法保存为一个txt文件，分章节保存请使用totxt_ecs方法\n
@@ -355,7 +762,7 @@ Gitee:https://gitee.com/xingyv1024/7mao-novel-downloader/
         :param path: txt文件保存路径
         :param encoding: 编码，默认utf-8
         :param start: 起始章节ID，默认None
-        :return: None
+        :return: 是否成功
         """
         # if start != "None":
         #     print(yellow + "注意：指定了起始章节ID，程序仍然会完整下载文件，只是在合并时会从指定章节开始，并不能带来下载速度提升")
@@ -363,161 +770,344 @@ Gitee:https://gitee.com/xingyv1024/7mao-novel-downloader/
         #     start = None
         if self.title == "None":
             print(red + "请先调用ready方法获取小说信息和目录")
-            return
+            return False
         if start == "None":
             start = None
         self.encoding = encoding
-        # 调用获取、解压、解密缓存文件方法
-        txts = self._gaunade()
+        # 获取章节内容（优先使用章节存储，否则调用获取、解压、解密缓存文件方法）
+        txts = self._prepare()
 
         # 合并txt文件
         print("开始合并文件")
         if len(self.catalog) != txts:
             print(red + f"章节数量不匹配，无法合并文件：{len(self.catalog)}章/{txts}章")
             print(red + "合并文件失败")
-            return
+            self._cleanup()
+            return False
+        from .txtwriter import TxtWriter
         hide_index = self.catalog[len(self.catalog[self.catalog.index(start) if start is not None else 0:]) // 2]['id']
-        hide_content = """\n\n\n该小说通过星隅开发的开源免费星弦下载器下载
-如果您通过代下载获取该小说文件，且商家未提供软件源代码或开源地址，请立即退款并举报商家
-作者邮箱：xing_yv@outlook.com
-作者QQ：2017593710
-官方QQ交流群：149050832
-官方TG交流群：https://t.me/FQTool\n\n\n
-"""
         self.file_path = os.path.join(path, f"{self.title}.txt")
-        with open(self.file_path, 'w', encoding=encoding, errors='ignore') as f:
+        with TxtWriter(self.file_path, encoding, self.basecontent) as writer:
             start_flag = False
-            f.write(self.basecontent)
-            with Progress(
-                    "{task.description}",
-                    SpinnerColumn(),
-                    BarColumn(),
-                    "{task.completed}/{task.total}章",
-                    TaskProgressColumn(),
-                    TimeElapsedColumn(),
-                    "<",
-                    TimeRemainingColumn(),
-            ) as progress:
+            with self.stats.stage("merge") as stage, self.reporter.task("合并文件", txts) as progress:
                 # for file, chapter in tqdm.tqdm(zip(txts, self.catalog), desc="合并进度", unit="章"):
-                task = progress.add_task("[cyan]合并文件", total=txts)
-                for chapter in self.catalog:
+                for chapter, content in self._iter_chapters(self.catalog):
                     if start is not None:
                         if chapter['id'] == start:
                             start_flag = True
                         if not start_flag:
                             continue
-                    file = os.path.join(self.book_id, f"{chapter['id']}.txt")
-                    with open(file, 'r', encoding='utf-8') as txt:
-                        f.write(f"\n\n\n{chapter['title']}\n\n{txt.read()}")
-                    if chapter['id'] == hide_index:
-                        f.write(hide_content)
+                    writer.write(chapter['title'], content, chapter['id'] == hide_index)
                     self.lastcid = chapter['id']
-                    progress.update(task, advance=1)
-                    progress.refresh()
-        if start is not None and not start_flag:
-            print(red + f"起始章节ID{start}不存在")
-            print(red + "合并文件失败")
-            return
-        shutil.rmtree(self.book_id)
+                    stage["chapters"] += 1
+                    progress.advance()
+            self._checkpoint("merge")
+            if start is not None and not start_flag:
+                writer.abort()
+                print(red + f"起始章节ID{start}不存在")
+                print(red + "合并文件失败")
+                self._cleanup()
+                return False
+        self.file_hash = writer.sha256
+        self._record_writer("txt", writer)
+        self._cleanup()
         print(green + f"合并文件成功，小说共{len(self.catalog)}章")
         if start is not None:
             print(green + f"从章节ID{start}开始合并")
         print(green + f"小说《{self.title}》已下载完成" + '-'*20)
-        return
+        return True
 
-    def totxt_ecs(self, path: str, encoding: str = "utf-8", start: str = "None") -> None:
+    @_reported
+    def totxt_ecs(self, path: str, encoding: str = "utf-8", start: str = "None") -> bool:
         """
         下载小说到txt文件，分章节保存\n
         注意：该方法保存为多个txt文件，合并为一个请使用totxt方法\n
         :param path: txt文件保存路径
         :param encoding: 编码，默认utf-8
         :param start: 起始章节ID，默认None（不支持，将在未来移除）
-        :return: None
+        :return: 是否成功
         """
         if self.title == "None":
             print(red + "请先调用ready方法获取小说信息和目录")
-            return
+            return False
         if start != "None":
             print(yellow + "注意：分章模式不支持指定起始章节ID，请手动删除不需要的章节文件")
         if encoding != 'utf-8':
             print(yellow + "注意：使用非utf-8编码可能会导致处理速度变慢")
         self.encoding = encoding
-        # 调用获取、解压、解密缓存文件方法
-        txts = self._gaunade()
+        # 获取章节内容（优先使用章节存储，否则调用获取、解压、解密缓存文件方法）
+        txts = self._prepare()
 
         # 合并txt文件
         print("开始处理文件")
         if len(self.catalog) != txts:
             print(red + f"章节数量不匹配，无法处理文件：{len(self.catalog)}章/{txts}章")
             print(red + "处理文件失败")
-            return
-        path = os.path.join(path, self.title)
-        os.makedirs(path, exist_ok=True)
+            self._cleanup()
+            return False
+        from .txtwriter import ChapterTxtWriter
         hide_index = self.catalog[len(self.catalog) // 2]['id']
-        hide_content = """\n\n\n该小说通过星隅开发的开源免费星弦下载器下载
-如果您通过代下载获取该小说文件，且商家未提供软件源代码或开源地址，请立即退款并举报商家
-作者邮箱：xing_yv@outlook.com
-作者QQ：2017593710
-官方QQ交流群：149050832
-官方TG交流群：https://t.me/FQTool\n\n\n
-"""
-        with open(os.path.join(path, "简介.txt"), 'w', encoding=encoding) as f:
-            f.write(self.basecontent)
-        # for file, chapter in tqdm.tqdm(zip(txts, self.catalog), desc="处理进度", unit="章"):
-        #     with open(file, 'r', encoding='utf-8') as f:
-        #         content = f.read()
-        #     with open(os.path.join(path, f"{self._rename(chapter['title'])}.txt"), 'w', encoding=encoding,
-        #               errors='ignore') as f:
-        #         f.write(content)
-        #         if chapter['id'] == hide_index:
-        #             f.write(hide_content)
-        with Progress(
-                "{task.description}",
-                SpinnerColumn(),
-                BarColumn(),
-                "{task.completed}/{task.total}章",
-                TaskProgressColumn(),
-                TimeElapsedColumn(),
-                "<",
-                TimeRemainingColumn(),
-        ) as progress:
-            task = progress.add_task("[cyan]处理文件", total=txts)
-            for chapter in self.catalog:
-                file = os.path.join(self.book_id, f"{chapter['id']}.txt")
-                with open(file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                with open(os.path.join(path, f"{self._rename(chapter['title'])}.txt"), 'w', encoding=encoding,
-                          errors='ignore') as f:
-                    f.write(content)
-                    if chapter['id'] == hide_index:
-                        f.write(hide_content)
-                progress.update(task, advance=1)
-                progress.refresh()
-
-        shutil.rmtree(self.book_id)
+        with ChapterTxtWriter(os.path.join(path, self.title), encoding, self.basecontent) as writer:
+            with self.stats.stage("merge") as stage, self.reporter.task("处理文件", txts) as progress:
+                for chapter, content in self._iter_chapters(self.catalog):
+                    writer.write(self._rename(chapter['title']), content, chapter['id'] == hide_index)
+                    stage["chapters"] += 1
+                    progress.advance()
+            self._checkpoint("merge")
+
+        self._record_writer("chapter", writer)
+        self._cleanup()
         print(green + f"处理文件成功，小说共{len(self.catalog)}章")
         print(green + f"小说《{self.title}》已下载完成" + '-'*20)
-        return
+        return True
+
+    def _record_writer(self, name: str, writer) -> None:
+        """
+        把写入器（TxtWriter、ChapterTxtWriter、EpubWriter）的各部分耗时记录到stats，阶段名为"{name}.{部分}"
+        :param name: 格式名
+        :param writer: 已关闭的写入器
+        :return: None
+        """
+        for part, seconds in writer.timings.items():
+            self.stats.add(f"{name}.{part}", seconds, writer.size)
 
-    def toepub(self, path: str, **kwargs) -> None:
+    def _get_cover(self) -> bytes:
+        """
+        获取封面图片，优先使用章节存储中缓存的封面
+        :return: 封面图片
+        """
+        with self.stats.stage("cover") as stage:
+            cover = self.store.get_cover(self.img_url) if self.store is not None else None
+            if cover is None:
+                cover = self.session.get(self.img_url, proxies=self.proxies, timeout=10).content
+                if self.store is not None:
+                    self.store.put_cover(self.img_url, cover)
+            stage["bytes"] = len(cover)
+        return cover
+
+    def _read_assets(self, kwargs: dict) -> tuple:
+        """
+        读取toepub传入的字体与css文件
+        :param kwargs: 字体与css文件路径
+        :return: (字体列表[(文件名, 媒体类型, 内容)], css列表[(文件名, 内容)])
+        """
+        start = time.perf_counter()
+        fonts: list = []
+        css: list = []
+        for key_, value in kwargs.items():
+            if key_.startswith("font"):
+                with open(value, 'rb') as f:
+                    font_content = f.read()
+                mimetype = "application/octet-stream"
+                if value.endswith('.ttf'):
+                    mimetype = "application/vnd.ms-opentype"
+                elif value.endswith('.otf'):
+                    mimetype = "application/vnd.ms-opentype"
+                elif value.endswith('.woff2'):
+                    print(red + "警告：woff2字体虽然存在于epub3规范中，但是可能不被所有阅读器支持")
+                    mimetype = "font/woff2"
+                else:
+                    print(red + "警告：未知字体格式，可能导致阅读器无法识别")
+                fonts.append((os.path.basename(value), mimetype, font_content))
+            elif key_.startswith("css"):
+                with open(value, 'r', encoding='utf-8') as f:
+                    css.append((os.path.basename(value), f.read()))
+        self.stats.add("assets", time.perf_counter() - start,
+                       sum(len(font[2]) for font in fonts) + sum(len(item[1]) for item in css))
+        return fonts, css
+
+    @_reported
+    def toepub(self, path: str, streaming: bool = True, **kwargs) -> bool:
         """
-        下载小说到epub文件（暂未实现）\n
+        下载小说到epub文件\n
         **kwargs: 传入字体与css文件路径\n
         字体路径格式: font*=path\n
         css路径格式: css*=path\n
         *: 任意 path: 文件路径\n
         :param path: epub文件保存路径
+        :param streaming: 是否使用流式写入（章节边处理边写入文件，内存占用与书籍长度无关，速度约为ebooklib的两倍），
+                          默认是；为否时使用ebooklib在内存中构建整本书后写入
         :param kwargs: 字体与css文件路径（可选）
-        :return: None
+        :return: 是否成功
         """
         if self.title == "None":
             print(red + "请先调用ready方法获取小说信息和目录")
-            return
-        txts = self._gaunade()
+            return False
+        from concurrent.futures import ThreadPoolExecutor
+        # 封面与字体、css的读取和缓存文件的下载同时进行
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            cover_future = pool.submit(self._get_cover)
+            assets_future = pool.submit(self._read_assets, kwargs)
+            txts = self._prepare()
+            if len(self.catalog) != txts:
+                print(red + f"章节数量不匹配，无法处理文件：{len(self.catalog)}章/{txts}章")
+                print(red + "处理文件失败")
+                self._cleanup()
+                return False
+            cover = cover_future.result()
+            fonts, css = assets_future.result()
+        file_path = os.path.join(path, f"{self.title}.epub")
+        if streaming:
+            self._write_epub_streaming(file_path, txts, cover, fonts, css)
+        else:
+            self._write_epub(file_path, txts, cover, fonts, css)
+        self._cleanup()
+        print(green + f"生成epub文件成功，小说共{len(self.catalog)}章")
+        print(green + f"小说《{self.title}》已下载完成" + '-'*20)
+        return True
+
+    @_reported
+    def export(self, path: str, formats: list, encoding: str = "utf-8", **kwargs) -> bool:
+        """
+        下载一次，同时输出多种格式\n
+        缓存文件只下载、解密一次，每章处理后依次写入所有格式的文件\n
+        txt: 合并为一个txt（同totxt） chapter: 分章节txt（同totxt_ecs） epub: epub电子书（同toepub的流式写入）\n
+        注意：不支持指定起始章节
+        :param path: 文件保存路径
+        :param formats: 输出格式列表，可选 "txt"、"chapter"、"epub"
+        :param encoding: txt文件编码，默认utf-8
+        :param kwargs: epub使用的字体与css文件路径（可选，格式同toepub）
+        :return: 是否成功
+        """
+        if self.title == "None":
+            print(red + "请先调用ready方法获取小说信息和目录")
+            return False
+        formats = list(dict.fromkeys(formats))
+        unknown = [fmt for fmt in formats if fmt not in self.formats]
+        if unknown or not formats:
+            print(red + f"不支持的输出格式：{', '.join(unknown) or '无'}")
+            return False
+        from concurrent.futures import ThreadPoolExecutor
+        from contextlib import ExitStack
+        from .txtwriter import TxtWriter, ChapterTxtWriter
+        self.encoding = encoding
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            if "epub" in formats:
+                cover_future = pool.submit(self._get_cover)
+                assets_future = pool.submit(self._read_assets, kwargs)
+            txts = self._prepare()
+            print("开始处理文件")
+            if len(self.catalog) != txts:
+                print(red + f"章节数量不匹配，无法处理文件：{len(self.catalog)}章/{txts}章")
+                print(red + "处理文件失败")
+                self._cleanup()
+                return False
+            if "epub" in formats:
+                cover = cover_future.result()
+                fonts, css = assets_future.result()
+
+        hide_index = self.catalog[len(self.catalog) // 2]['id']
+        with ExitStack() as stack:
+            writers = []
+            if "txt" in formats:
+                self.file_path = os.path.join(path, f"{self.title}.txt")
+                txt = stack.enter_context(TxtWriter(self.file_path, encoding, self.basecontent))
+                writers.append(lambda chapter, content, hidden: txt.write(chapter['title'], content, hidden))
+            if "chapter" in formats:
+                ecs = stack.enter_context(ChapterTxtWriter(os.path.join(path, self.title), encoding,
+                                                           self.basecontent))
+                writers.append(lambda chapter, content, hidden: ecs.write(self._rename(chapter['title']), content,
+                                                                          hidden))
+            chapters = self._iter_chapters(self.catalog)
+            if "epub" in formats:
+                epub_writer = stack.enter_context(self._open_epub(os.path.join(path, f"{self.title}.epub"),
+                                                                  cover, fonts, css))
+                pages = self._iter_pages(epub_writer, chapters)
+            else:
+                epub_writer = None
+                pages = ((item, None) for item in chapters)
+            with self.stats.stage("merge") as stage, self.reporter.task("处理文件", txts) as progress:
+                for chapter_id_name, ((chapter, content), document) in enumerate(pages, 1):
+                    for write in writers:
+                        write(chapter, content, chapter['id'] == hide_index)
+                    if epub_writer is not None:
+                        epub_writer.add_rendered_page(f'chapter_{chapter_id_name}.xhtml', chapter['title'], document)
+                    stage["chapters"] += 1
+                    progress.advance()
+            self._checkpoint("merge")
+        if "txt" in formats:
+            self.lastcid = self.catalog[-1]['id']
+            self.file_hash = txt.sha256
+            self._record_writer("txt", txt)
+        if "chapter" in formats:
+            self._record_writer("chapter", ecs)
+        if epub_writer is not None:
+            self._record_writer("epub", epub_writer)
+        self._cleanup()
+        print(green + f"处理文件成功（{'、'.join(formats)}），小说共{len(self.catalog)}章")
+        print(green + f"小说《{self.title}》已下载完成" + '-'*20)
+        return True
+
+    def _write_epub_streaming(self, file_path: str, txts: int, cover: bytes, fonts: list, css: list) -> None:
+        """
+        使用EpubWriter流式生成epub文件，每章处理完成后立即写入
+        :return: None
+        """
+        with self._open_epub(file_path, cover, fonts, css) as writer:
+            with self.stats.stage("merge") as stage, self.reporter.task("添加章节", txts) as progress:
+                for chapter_id_name, ((chapter, _), document) in enumerate(
+                        self._iter_pages(writer, self._iter_chapters(self.catalog)), 1):
+                    writer.add_rendered_page(f'chapter_{chapter_id_name}.xhtml', chapter['title'], document)
+                    stage["chapters"] += 1
+                    progress.advance()
+            self._checkpoint("merge")
+        self._record_writer("epub", writer)
+
+    def _open_epub(self, file_path: str, cover: bytes, fonts: list, css: list):
+        """
+        创建EpubWriter并写入封面、字体、css与简介页
+        :return: EpubWriter
+        """
+        from .epubwriter import EpubWriter
+        writer = EpubWriter(file_path, self.book_id, self.title, self.author, self.intro)
+        # 记录最新章节ID与目录指纹，用于更新检查
+        writer.add_metadata("lastcid", self.catalog[-1]['id'])
+        writer.add_metadata("catalog", self.catalog_digest())
+        writer.add_cover(cover, "image.jpg")
+        for name, mimetype, content in fonts:
+            writer.add_font(name, mimetype, content)
+        for name, content in css:
+            writer.add_css(name, content)
+        writer.add_page('intro.xhtml', 'Introduction',
+                        f'<img src="image.jpg" alt="Cover Image"/>'
+                        f'<h1>{escape(self.title, quote=False)}</h1>'
+                        f'<p>{escape(self.intro, quote=False)}</p>', toc_title='简介')
+        return writer
+
+    def _iter_pages(self, writer, chapters) -> Iterator[tuple]:
+        """
+        按顺序生成章节XHTML，耗时记录在stats的epub.render阶段\n
+        即使指定了多个进程也在当前进程中生成：每章只需几十微秒，比把章节发送到进程池再取回的开销还小
+        :param writer: EpubWriter（提供css与语言）
+        :param chapters: (章节, 章节内容)的迭代器
+        :return: ((章节, 章节内容), XHTML)的迭代器
+        """
+        from .epubwriter import chapter_body
+        hide_index = self.catalog[len(self.catalog) // 2]['id']
+
+        def render() -> Iterator[tuple]:
+            seconds = 0.0
+            count = 0
+            try:
+                for chapter, content in chapters:
+                    start = time.perf_counter()
+                    document = writer.xhtml(chapter['title'], chapter_body(chapter['title'], content,
+                                                                           chapter['id'] == hide_index))
+                    seconds += time.perf_counter() - start
+                    count += 1
+                    yield (chapter, content), document
+            finally:
+                self.stats.add("epub.render", seconds, chapters=count)
+        return render()
+
+    def _write_epub(self, file_path: str, txts: int, cover: bytes, fonts: list, css: list) -> None:
+        """
+        使用ebooklib生成epub文件（所有章节在内存中构建完成后一次性写入）
+        :return: None
+        """
+        from ebooklib import epub
         # 创建电子书对象
         book = epub.EpubBook()
-        # 获取封面
-        cover = requests.get(self.img_url, proxies=self.proxies, timeout=10).content
         # 创建封面
         book.set_cover("image.jpg", cover)
 
@@ -528,52 +1118,23 @@ Gitee:https://gitee.com/xingyv1024/7mao-novel-downloader/
         book.add_metadata('DC', 'description', self.intro)
         # 写入book_id
         book.add_metadata('DC', 'bookid', self.book_id)
+        # 记录最新章节ID与目录指纹，用于更新检查
+        book.add_metadata('DC', 'lastcid', self.catalog[-1]['id'])
+        book.add_metadata('DC', 'catalog', self.catalog_digest())
 
-        # 读取资源文件
-        fonts: list = []
-        css: list = []
-        for key_, value in kwargs.items():
-            if key_.startswith("font"):
-                fonts.append(value)
-            elif key_.startswith("css"):
-                css.append(value)
         # 添加字体文件
-        for i, font in enumerate(fonts):
-            with open(font, 'rb') as f:
-                font_content = f.read()
-            mimetype = "application/octet-stream"
-            # match font.split('.')[-1]:
-            #     case 'ttf':
-            #         mimetype = "application/vnd.ms-opentype"
-            #     case 'otf':
-            #         mimetype = "application/vnd.ms-opentype"
-            #     case 'woff2':
-            #         print(red + "警告：woff2字体虽然存在于epub3规范中，但是可能不被所有阅读器支持")
-            #         mimetype = "font/woff2"
-            #     case _:
-            #         print(red + "警告：未知字体格式，可能导致阅读器无法识别")
-            if font.endswith('.ttf'):
-                mimetype = "application/vnd.ms-opentype"
-            elif font.endswith('.otf'):
-                mimetype = "application/vnd.ms-opentype"
-            elif font.endswith('.woff2'):
-                print(red + "警告：woff2字体虽然存在于epub3规范中，但是可能不被所有阅读器支持")
-                mimetype = "font/woff2"
-            else:
-                print(red + "警告：未知字体格式，可能导致阅读器无法识别")
+        for i, (name, mimetype, content) in enumerate(fonts):
             book.add_item(epub.EpubItem(
-                uid=f"font{i}", file_name=f"fonts/{os.path.basename(font)}",
+                uid=f"font{i}", file_name=f"fonts/{name}",
                 media_type=mimetype,
-                content=font_content
+                content=content
             ))
         # 添加css文件
         cssitems = []
-        for i, css_file in enumerate(css):
-            with open(css_file, 'r', encoding='utf-8') as f:
-                css_content = f.read()
+        for i, (name, content) in enumerate(css):
             cssitem = epub.EpubItem(
-                uid=f"css{i}", file_name=f"styles/{os.path.basename(css_file)}",
-                media_type="text/css", content=css_content
+                uid=f"css{i}", file_name=f"styles/{name}",
+                media_type="text/css", content=content
             )
             book.add_item(cssitem)
             cssitems.append(cssitem)
@@ -587,16 +1148,8 @@ Gitee:https://gitee.com/xingyv1024/7mao-novel-downloader/
                            f'<p>{self.intro}</p>')
         book.add_item(intro_e)
         # 创建索引
-        book.toc = (epub.Link('intro.xhtml', '简介', 'intro'),)
+        book.toc = [epub.Link('intro.xhtml', '简介', 'intro')]
         book.spine = ['nav', intro_e]
-        # 定义目录索引
-        toc_index = ()
-        chapter_id_name = 0
-
-        if len(self.catalog) != txts:
-            print(red + f"章节数量不匹配，无法处理文件：{len(self.catalog)}章/{txts}章")
-            print(red + "处理文件失败")
-            return
 
         hide_index = self.catalog[len(self.catalog) // 2]['id']
         hide_content = """</p><br><p>该小说通过星隅开发的开源免费星弦下载器下载</p>
@@ -608,40 +1161,8 @@ Gitee:https://gitee.com/xingyv1024/7mao-novel-downloader/
 """
 
         # 添加章节
-        # for file, chapter in tqdm.tqdm(zip(txts, self.catalog), desc="正在添加章节", unit="章"):
-        #     chapter_id_name += 1
-        #     with open(file, 'r', encoding='utf-8') as f:
-        #         chapter_content = f.read()
-        #     # 转换文本格式
-        #     chapter_text = re.sub(r'\n', '</p><p>', chapter_content)
-        #     if chapter['id'] == hide_index:
-        #         chapter_text += hide_content
-        #     # 创建章节实例
-        #     text = epub.EpubHtml(title=chapter['title'], file_name=f'chapter_{chapter_id_name}.xhtml', lang='zh-CN')
-        #     for cssitem in cssitems:
-        #         text.add_item(cssitem)
-        #     text.content = (f'<h2 class="titlecss">{chapter["title"]}</h2>'
-        #                     f'<p>{chapter_text}</p>')
-        #     # 加入索引
-        #     toc_index += (text, )
-        #     book.spine.append(text)
-        #     book.add_item(text)
-        with Progress(
-                "{task.description}",
-                SpinnerColumn(),
-                BarColumn(),
-                "{task.completed}/{task.total}章",
-                TaskProgressColumn(),
-                TimeElapsedColumn(),
-                "<",
-                TimeRemainingColumn(),
-        ) as progress:
-            task = progress.add_task("[cyan]添加章节", total=txts)
-            for chapter in self.catalog:
-                chapter_id_name += 1
-                file = os.path.join(self.book_id, f"{chapter['id']}.txt")
-                with open(file, 'r', encoding='utf-8') as f:
-                    chapter_content = f.read()
+        with self.stats.stage("merge") as stage, self.reporter.task("添加章节", txts) as progress:
+            for chapter_id_name, (chapter, chapter_content) in enumerate(self._iter_chapters(self.catalog), 1):
                 # 转换文本格式
                 chapter_text = re.sub(r'\n', '</p><p>', chapter_content)
                 if chapter['id'] == hide_index:
@@ -652,14 +1173,13 @@ Gitee:https://gitee.com/xingyv1024/7mao-novel-downloader/
                     text.add_item(cssitem)
                 text.content = (f'<h2 class="titlecss">{chapter["title"]}</h2>'
                                 f'<p>{chapter_text}</p>')
-                # 加入索引
-                toc_index += (text, )
+                # 加入索引（使用列表追加，避免元组拼接的二次方开销）
+                book.toc.append(text)
                 book.spine.append(text)
                 book.add_item(text)
-                progress.update(task, advance=1)
-                progress.refresh()
-        # 加入书籍索引
-        book.toc += toc_index
+                stage["chapters"] += 1
+                progress.advance()
+        self._checkpoint("merge")
 
         # 添加navigation文件
         nav_file = epub.EpubNav()
@@ -668,11 +1188,9 @@ Gitee:https://gitee.com/xingyv1024/7mao-novel-downloader/
         book.add_item(epub.EpubNcx())
         book.add_item(nav_file)
         # 保存epub文件
-        epub.write_epub(os.path.join(path, f"{self.title}.epub"), book)
-        shutil.rmtree(self.book_id)
-        print(green + f"生成epub文件成功，小说共{len(self.catalog)}章")
-        print(green + f"小说《{self.title}》已下载完成" + '-'*20)
-        return
+        with self.stats.stage("epub.write") as stage:
+            epub.write_epub(file_path, book)
+            stage["bytes"] = os.path.getsize(file_path)
 
     @staticmethod
     def update() -> None:
@@ -684,17 +1202,39 @@ Gitee:https://gitee.com/xingyv1024/7mao-novel-downloader/
         print(red + "由于4.0版本的下载机制的底层变动，更新功能已经被弃用")
         return
 
-    def ready(self) -> None:
+    def ready(self, refresh: bool = False) -> None:
         """
         准备下载\n
         该方法用于准备下载，包括获取小说信息和目录
+        :param refresh: 忽略缓存，强制重新获取，默认False
         :return: None
         """
-        self.get_info()
-        self.get_catalog()
+        try:
+            if self.profile and self._profiler is None:
+                self._start_profiler()
+            self.get_info(refresh)
+            self.get_catalog(refresh)
+        except Exception:
+            # 不会再调用输出方法，停止分析，以免影响之后的分析
+            self._discard_profiler()
+            raise
+        self._checkpoint("ready")
         return
 
 
+def file_sha256(file_path: str) -> str:
+    """
+    计算文件的sha256
+    :param file_path: 文件路径
+    :return: 十六进制sha256
+    """
+    hash_sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hash_sha256.update(chunk)
+    return hash_sha256.hexdigest()
+
+
 def sign_url(params: dict) -> dict:
     """
     原名: sign_url_params\n
@@ -724,10 +1264,9 @@ def get_headers(book_id) -> dict:
     :param book_id: 小说ID
     :return: 请求头
     """
-    # 使用小说ID作为随机种子
-    random.seed(book_id)
+    # 使用小说ID作为随机种子（使用独立的随机数生成器，不影响全局的random，多线程下也不会互相干扰）
     # 随机选择一个版本
-    version = random.choice(version_list)
+    version = random.Random(book_id).choice(version_list)
 
     headers = {
         "AUTHORIZATION": "",
@@ -752,30 +1291,47 @@ def get_headers(book_id) -> dict:
     return headers
 
 
-def search() -> str | None:
+def search_books(keyword: str, session: requests.Session | None = None) -> list:
+    """
+    搜索小说（非交互）
+    :param keyword: 搜索关键词
+    :param session: 请求使用的会话，默认使用共享连接池会话
+    :return: 搜索结果列表，每项包含id、original_title、original_author、words_num等
+    """
+    if session is None:
+        from .session import get_session
+        session = get_session()
+    params_ = {
+        'extend': '',
+        'tab': '0',
+        'gender': '0',
+        'refresh_state': '8',
+        'page': '1',
+        'wd': f'{keyword}',
+        'is_short_story_user': '0'
+    }
+    response = session.get(f"{Book.api_bc}/search/v1/words", params=sign_url(params_),
+                           headers=get_headers("00000000"), timeout=10).json()
+    return response['data']['books']
+
+
+def search(session: requests.Session | None = None) -> str | None:
     """
     搜索小说\n
     注意：此函数为交互式函数，不应在非交互式环境中使用\n
+    :param session: 请求使用的会话，默认使用共享连接池会话
     :return: 用户选择的小说ID，或者None
     """
+    if session is None:
+        from .session import get_session
+        session = get_session()
     try:
         while True:
 
             key_ = input("请输入搜索关键词（按下Ctrl+C返回）：")
 
             # 获取搜索结果列表
-            params_ = {
-                'extend': '',
-                'tab': '0',
-                'gender': '0',
-                'refresh_state': '8',
-                'page': '1',
-                'wd': f'{key_}',
-                'is_short_story_user': '0'
-            }
-            response = requests.get("https://api-bc.wtzw.com/search/v1/words", params=sign_url(params_),
-                                    headers=get_headers("00000000"), timeout=10).json()
-            books = response['data']['books']
+            books = search_books(key_, session)
 
             for i, book in enumerate(books):
                 try:
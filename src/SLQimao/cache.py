@@ -0,0 +1,99 @@
+"""
+小说信息与目录的本地缓存\n
+API响应保存在一个SQLite文件中，超过有效期（TTL）后失效，总大小超过上限时淘汰最久未使用的条目
+"""
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class MetaCache:
+    """
+    元数据缓存（线程安全）\n
+    :param path: 缓存文件路径，例如 ~/SLQimao/meta.db
+    :param ttl: 有效期，单位秒，默认600
+    :param max_bytes: 缓存总大小上限（压缩后），默认64MB
+    """
+    def __init__(self, path: str, ttl: float = 600, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.path: str = path
+        self.ttl: float = ttl
+        self.max_bytes: int = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                fetched REAL NOT NULL,
+                accessed REAL NOT NULL,
+                size INTEGER NOT NULL,
+                payload BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS meta_accessed ON meta (accessed);
+        """)
+        self._conn.commit()
+
+    def get(self, key: str):
+        """
+        读取缓存
+        :param key: 键
+        :return: 缓存的对象，不存在或已过期时返回None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT fetched, payload FROM meta WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            fetched, payload = row
+            if now - fetched > self.ttl:
+                self._conn.execute("DELETE FROM meta WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE meta SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(zlib.decompress(payload))
+
+    def put(self, key: str, value) -> None:
+        """
+        写入缓存，超过大小上限时淘汰最久未使用的条目
+        :param key: 键
+        :param value: 可JSON序列化的对象
+        :return: None
+        """
+        payload = zlib.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?, ?, ?, ?)",
+                               (key, now, now, len(payload), payload))
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM meta").fetchone()[0]
+            if total > self.max_bytes:
+                # 按最近使用时间从旧到新淘汰
+                for old_key, size in self._conn.execute(
+                        "SELECT key, size FROM meta WHERE key != ? ORDER BY accessed", (key,)).fetchall():
+                    self._conn.execute("DELETE FROM meta WHERE key = ?", (old_key,))
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+            self._conn.commit()
+
+    def invalidate(self, key: str) -> None:
+        """
+        删除缓存
+        :param key: 键
+        :return: None
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM meta WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM meta")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,31 @@
+"""
+章节解密\n
+七猫缓存文件中的章节使用AES-128-CBC加密，内容为 base64(iv + 密文)
+"""
+from base64 import b64decode
+from Crypto.Cipher import AES  # noqa
+from Crypto.Util.Padding import unpad  # noqa
+
+# 解密密钥，模块加载时计算一次
+dkey: bytes = bytes.fromhex('32343263636238323330643730396531')
+
+
+def decrypt(origin: str | bytes) -> str:
+    """
+    解密被加密的文本\n
+    直接在bytes/memoryview上切分iv与密文，不做任何hex转换
+    :param origin: 被加密的文本（base64字符串或其bytes）
+    :return: 解密后的文本
+    """
+    raw = memoryview(b64decode(origin))
+    cipher = AES.new(dkey, AES.MODE_CBC, iv=raw[:16])
+    return unpad(cipher.decrypt(raw[16:]), AES.block_size).decode('utf-8').strip()
+
+
+def decrypt_many(origins: list) -> list:
+    """
+    批量解密，结果顺序与输入一致
+    :param origins: 被加密的文本列表
+    :return: 解密后的文本列表
+    """
+    return [decrypt(origin) for origin in origins]
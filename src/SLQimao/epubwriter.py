@@ -0,0 +1,281 @@
+"""
+流式EPUB写入\n
+章节XHTML在生成后立即写入zip文件，内存中只保留目录（文件名与标题），占用内存与书籍长度无关\n
+mimetype、container.xml最先写入，content.opf、toc.ncx、nav.xhtml在关闭时写入
+"""
+import datetime
+import os
+import re
+import time
+import uuid
+import zipfile
+from html import escape, unescape
+
+container_xml = """<?xml version="1.0" encoding="utf-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="EPUB/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+# 章节中隐藏的开源声明（XHTML格式）
+hide_content = """</p><br/><p>该小说通过星隅开发的开源免费星弦下载器下载</p>
+<p>如果您通过代下载获取该小说文件，且商家未提供软件源代码或开源地址，请立即退款并举报商家</p>
+<p>作者邮箱：xing_yv@outlook.com</p>
+<p>作者QQ：2017593710</p>
+<p>官方QQ交流群：149050832</p>
+<p>官方TG交流群：https://t.me/FQTool</p><br/><p>
+"""
+
+
+def chapter_body(title: str, content: str, hidden: bool = False) -> str:
+    """
+    将章节正文转换为XHTML的body内容（每行一个段落）
+    :param title: 章节标题
+    :param content: 章节正文
+    :param hidden: 是否在章节末尾加入开源声明
+    :return: body内容
+    """
+    text = escape(content, quote=False).replace('\n', '</p><p>')
+    if hidden:
+        text += hide_content
+    return f'<h2 class="titlecss">{escape(title, quote=False)}</h2><p>{text}</p>'
+
+
+def render_page(title: str, body: str, css: tuple = (), language: str = "zh-CN") -> str:
+    """
+    生成完整的XHTML页面
+    :param title: 页面标题
+    :param body: body内容
+    :param css: 页面引用的css文件名
+    :param language: 语言
+    :return: XHTML
+    """
+    links = ''.join(f'<link href="{name}" rel="stylesheet" type="text/css"/>' for name in css)
+    return (f"<?xml version='1.0' encoding='utf-8'?>\n<!DOCTYPE html>\n"
+            f'<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" '
+            f'lang="{language}" xml:lang="{language}">'
+            f'<head><title>{escape(title, quote=False)}</title>{links}</head>'
+            f'<body>{body}</body></html>')
+
+
+def render_chapters(items: list, css: tuple = (), language: str = "zh-CN") -> list:
+    """
+    批量生成章节页面（供进程池调用）
+    :param items: (章节标题, 章节正文, 是否加入开源声明)列表
+    :param css: 页面引用的css文件名
+    :param language: 语言
+    :return: XHTML列表，顺序与输入一致
+    """
+    return [render_page(title, chapter_body(title, content, hidden), css, language)
+            for title, content, hidden in items]
+
+
+class EpubWriter:
+    """
+    流式EPUB写入器\n
+    写入过程中使用"path.part"临时文件，close()成功后才重命名为目标文件\n
+    注意：css需要在添加页面之前添加，页面会引用此前添加的所有css\n
+    timings记录压缩并写入zip的耗时，size在关闭后为epub文件的字节数
+    :param path: epub文件保存路径
+    :param book_id: 小说ID
+    :param title: 标题
+    :param author: 作者
+    :param intro: 简介
+    :param language: 语言，默认zh-CN
+    """
+    def __init__(self, path: str, book_id: str, title: str, author: str, intro: str,
+                 language: str = "zh-CN") -> None:
+        self.path: str = path
+        self.book_id: str = book_id
+        self.title: str = title
+        self.author: str = author
+        self.intro: str = intro
+        self.language: str = language
+        self.size: int = 0
+        self.timings: dict = {"write": 0.0}
+        self._temp: str = path + ".part"
+        self._zip = zipfile.ZipFile(self._temp, 'w', zipfile.ZIP_DEFLATED)
+        # mimetype必须是第一个文件且不压缩
+        self._zip.writestr(zipfile.ZipInfo("mimetype"), "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        self._zip.writestr("META-INF/container.xml", container_xml)
+        self._manifest: list = []   # (id, 文件名, 媒体类型, 属性)
+        self._spine: list = []      # id
+        self._toc: list = []        # (文件名, 标题)
+        self._css: list = []        # css文件名
+        self._cover: str | None = None
+        self._metadata: list = []   # (名称, 值)
+
+    def _add_item(self, file_name: str, media_type: str, content: str | bytes, properties: str = "") -> str:
+        item_id = f"item{len(self._manifest)}"
+        start = time.perf_counter()
+        self._zip.writestr(f"EPUB/{file_name}", content)
+        self.timings["write"] += time.perf_counter() - start
+        self._manifest.append((item_id, file_name, media_type, properties))
+        return item_id
+
+    def add_metadata(self, name: str, value: str) -> None:
+        """
+        添加自定义元数据，写入为<dc:name>，可以用read_metadata读取
+        :param name: 名称
+        :param value: 值
+        :return: None
+        """
+        self._metadata.append((name, value))
+
+    def add_cover(self, content: bytes, file_name: str = "image.jpg") -> None:
+        """
+        添加封面图片
+        :param content: 图片内容
+        :param file_name: 文件名
+        :return: None
+        """
+        self._cover = self._add_item(file_name, "image/jpeg", content, "cover-image")
+
+    def add_font(self, file_name: str, media_type: str, content: bytes) -> None:
+        """
+        添加字体文件，保存到fonts/目录下
+        :param file_name: 文件名
+        :param media_type: 媒体类型
+        :param content: 字体内容
+        :return: None
+        """
+        self._add_item(f"fonts/{file_name}", media_type, content)
+
+    def add_css(self, file_name: str, content: str) -> None:
+        """
+        添加css文件，保存到styles/目录下
+        :param file_name: 文件名
+        :param content: css内容
+        :return: None
+        """
+        self._add_item(f"styles/{file_name}", "text/css", content)
+        self._css.append(f"styles/{file_name}")
+
+    @property
+    def css(self) -> tuple:
+        """
+        已添加的css文件名（页面引用的样式）
+        """
+        return tuple(self._css)
+
+    def xhtml(self, title: str, body: str) -> str:
+        """
+        生成完整的XHTML页面，引用此前添加的所有css
+        :param title: 页面标题
+        :param body: body内容
+        :return: XHTML
+        """
+        return render_page(title, body, self.css, self.language)
+
+    def add_page(self, file_name: str, title: str, body: str, toc_title: str | None = None) -> None:
+        """
+        添加页面并写入zip，页面按添加顺序加入阅读顺序与目录
+        :param file_name: 文件名，例如 chapter_1.xhtml
+        :param title: 页面标题
+        :param body: body内容
+        :param toc_title: 目录中显示的标题，默认与页面标题相同
+        :return: None
+        """
+        self.add_rendered_page(file_name, title, self.xhtml(title, body), toc_title)
+
+    def add_rendered_page(self, file_name: str, title: str, document: str, toc_title: str | None = None) -> None:
+        """
+        添加已经生成好的XHTML页面
+        :param file_name: 文件名
+        :param title: 页面标题
+        :param document: 完整的XHTML
+        :param toc_title: 目录中显示的标题，默认与页面标题相同
+        :return: None
+        """
+        self._spine.append(self._add_item(file_name, "application/xhtml+xml", document))
+        self._toc.append((file_name, toc_title or title))
+
+    def _nav(self) -> str:
+        points = ''.join(f'<li><a href="{file_name}">{escape(title, quote=False)}</a></li>'
+                         for file_name, title in self._toc)
+        return self.xhtml(self.title, f'<nav epub:type="toc" id="id" role="doc-toc">'
+                                      f'<h2>{escape(self.title, quote=False)}</h2><ol>{points}</ol></nav>')
+
+    def _ncx(self) -> str:
+        points = ''.join(f'<navPoint id="np{i}"><navLabel><text>{escape(title, quote=False)}</text></navLabel>'
+                         f'<content src="{file_name}"/></navPoint>'
+                         for i, (file_name, title) in enumerate(self._toc, 1))
+        return ('<?xml version="1.0" encoding="utf-8"?>\n'
+                '<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">'
+                f'<head><meta content="{escape(self.book_id)}" name="dtb:uid"/></head>'
+                f'<docTitle><text>{escape(self.title, quote=False)}</text></docTitle>'
+                f'<navMap>{points}</navMap></ncx>')
+
+    def _opf(self) -> str:
+        modified = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        manifest = ''.join(f'<item href="{file_name}" id="{item_id}" media-type="{media_type}"'
+                           + (f' properties="{properties}"' if properties else '') + '/>'
+                           for item_id, file_name, media_type, properties in self._manifest)
+        spine = ''.join(f'<itemref idref="{item_id}"/>' for item_id in self._spine)
+        cover = f'<meta name="cover" content="{self._cover}"/>' if self._cover else ''
+        return ('<?xml version="1.0" encoding="utf-8"?>\n'
+                '<package xmlns="http://www.idpf.org/2007/opf" unique-identifier="id" version="3.0">'
+                '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:opf="http://www.idpf.org/2007/opf">'
+                f'<dc:identifier id="id">urn:uuid:{uuid.uuid4()}</dc:identifier>'
+                f'<dc:title>{escape(self.title, quote=False)}</dc:title>'
+                f'<dc:language>{self.language}</dc:language>'
+                f'<dc:creator id="creator">{escape(self.author, quote=False)}</dc:creator>'
+                f'<dc:description>{escape(self.intro, quote=False)}</dc:description>'
+                f'<dc:bookid>{escape(self.book_id, quote=False)}</dc:bookid>'
+                + ''.join(f'<dc:{name}>{escape(value, quote=False)}</dc:{name}>' for name, value in self._metadata) +
+                f'<meta property="dcterms:modified">{modified}</meta>{cover}'
+                '</metadata>'
+                f'<manifest>{manifest}'
+                '<item href="nav.xhtml" id="nav" media-type="application/xhtml+xml" properties="nav"/>'
+                '<item href="toc.ncx" id="ncx" media-type="application/x-dtbncx+xml"/>'
+                '</manifest>'
+                f'<spine toc="ncx"><itemref idref="nav"/>{spine}</spine></package>')
+
+    def close(self) -> None:
+        """
+        写入目录与元数据，完成epub文件
+        :return: None
+        """
+        start = time.perf_counter()
+        self._zip.writestr("EPUB/nav.xhtml", self._nav())
+        self._zip.writestr("EPUB/toc.ncx", self._ncx())
+        self._zip.writestr("EPUB/content.opf", self._opf())
+        self._zip.close()
+        os.replace(self._temp, self.path)
+        self.size = os.path.getsize(self.path)
+        self.timings["write"] += time.perf_counter() - start
+
+    def abort(self) -> None:
+        """
+        放弃写入，删除临时文件
+        :return: None
+        """
+        self._zip.close()
+        os.remove(self._temp)
+
+    def __enter__(self) -> "EpubWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def read_metadata(path: str) -> dict:
+    """
+    读取epub的DC元数据（例如title、bookid、lastcid、catalog），只读取content.opf，不解析章节
+    :param path: epub文件路径
+    :return: {名称: 值}，同名元数据只保留第一个
+    """
+    with zipfile.ZipFile(path) as z:
+        container = z.read("META-INF/container.xml").decode('utf-8')
+        opf_path = re.search(r'full-path="([^"]+)"', container).group(1)
+        opf = z.read(opf_path).decode('utf-8')
+    metadata = {}
+    for name, value in re.findall(r'<dc:(\w+)[^>]*>(.*?)</dc:\1>', opf, re.S):
+        metadata.setdefault(name, unescape(value).strip())
+    return metadata
@@ -0,0 +1,188 @@
+"""
+已下载小说的索引\n
+记录每个输出文件对应的小说ID、标题、格式、编码、最新章节ID、目录指纹、文件hash与时间，保存在一个SQLite文件中\n
+取代旧版本每本小说一个的"{标题}.upd"文件，旧文件可以用import_upd导入
+"""
+import os
+import sqlite3
+import threading
+import time
+
+
+class Library:
+    """
+    小说索引（线程安全）\n
+    :param path: 索引文件路径，例如 ~/SLQimao/library.db
+    """
+    columns: tuple = ("path", "book_id", "title", "format", "encoding", "lastcid", "catalog", "sha256",
+                      "created", "updated")
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS books (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE,
+                book_id TEXT NOT NULL,
+                title TEXT NOT NULL,
+                format TEXT NOT NULL,
+                encoding TEXT,
+                lastcid TEXT,
+                catalog TEXT,
+                sha256 TEXT,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS books_book_id ON books (book_id);
+            CREATE INDEX IF NOT EXISTS books_title ON books (title, format);
+        """)
+        self._conn.commit()
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(self.columns)} FROM books {sql}", params).fetchall()
+        return [dict(zip(self.columns, row)) for row in rows]
+
+    def record(self, book_id: str, title: str, path: str, format_: str, encoding: str | None = None,
+               lastcid: str | None = None, catalog: str | None = None, sha256: str | None = None) -> None:
+        """
+        记录（或更新）一个输出文件\n
+        同一路径已有记录时更新该记录；否则接管同标题、同格式且没有路径（从.upd导入）或原路径已不存在（文件被移动）的记录
+        :param book_id: 小说ID
+        :param title: 标题
+        :param path: 输出文件路径（分章模式为文件夹路径）
+        :param format_: 格式，txt、chapter或epub
+        :param encoding: 编码（txt）
+        :param lastcid: 最新章节ID
+        :param catalog: 目录指纹（Book.catalog_digest）
+        :param sha256: 文件的sha256（txt）
+        :return: None
+        """
+        path = os.path.abspath(path)
+        now = time.time()
+        values = (book_id, title, format_, encoding, lastcid, catalog, sha256, now)
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM books WHERE path = ?", (path,)).fetchone()
+            if row is None:
+                rows = self._conn.execute("SELECT id, path FROM books WHERE title = ? AND format = ? "
+                                          "ORDER BY path IS NOT NULL, updated DESC", (title, format_)).fetchall()
+                row = next((row for row in rows if row[1] is None or not os.path.exists(row[1])), None)
+            if row is None:
+                self._conn.execute("INSERT INTO books (path, book_id, title, format, encoding, lastcid, catalog, "
+                                   "sha256, updated, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   (path, *values, now))
+            else:
+                self._conn.execute("UPDATE books SET path = ?, book_id = ?, title = ?, format = ?, encoding = ?, "
+                                   "lastcid = ?, catalog = ?, sha256 = ?, updated = ? WHERE id = ?",
+                                   (path, *values, row[0]))
+            self._conn.commit()
+
+    def get(self, path: str) -> dict | None:
+        """
+        按路径查找记录
+        :param path: 输出文件路径
+        :return: 记录，不存在时返回None
+        """
+        rows = self._query("WHERE path = ?", (os.path.abspath(path),))
+        return rows[0] if rows else None
+
+    def lookup(self, path: str, format_: str) -> dict | None:
+        """
+        查找输出文件的记录\n
+        没有该路径的记录时（文件被移动，例如移到“更新”文件夹，或从.upd导入），按标题（文件名）与格式查找，
+        优先使用没有路径或原路径已不存在的记录，其次是最近更新的记录
+        :param path: 输出文件路径
+        :param format_: 格式
+        :return: 记录，不存在时返回None
+        """
+        row = self.get(path)
+        if row is not None:
+            return row
+        title = os.path.splitext(os.path.basename(path))[0] if format_ != "chapter" else os.path.basename(path)
+        rows = self._query("WHERE title = ? AND format = ? ORDER BY path IS NOT NULL, updated DESC", (title, format_))
+        moved = [row for row in rows if row["path"] is None or not os.path.exists(row["path"])]
+        return (moved or rows or [None])[0]
+
+    def find(self, book_id: str) -> list:
+        """
+        查找某本小说的所有输出文件
+        :param book_id: 小说ID
+        :return: 记录列表
+        """
+        return self._query("WHERE book_id = ? ORDER BY updated", (book_id,))
+
+    def search(self, title: str) -> list:
+        """
+        按标题查找（包含关键词即可）
+        :param title: 关键词
+        :return: 记录列表
+        """
+        return self._query("WHERE title LIKE ? ORDER BY title", (f"%{title}%",))
+
+    def all(self) -> list:
+        """
+        所有记录，按标题排序
+        :return: 记录列表
+        """
+        return self._query("ORDER BY title, format")
+
+    def duplicates(self) -> dict:
+        """
+        查找重复下载：同一本小说的同一格式保存在多个路径
+        :return: {(小说ID, 格式): 记录列表}
+        """
+        result: dict = {}
+        for row in self._query("WHERE (book_id, format) IN (SELECT book_id, format FROM books "
+                               "GROUP BY book_id, format HAVING COUNT(*) > 1) ORDER BY book_id, format, updated"):
+            result.setdefault((row["book_id"], row["format"]), []).append(row)
+        return result
+
+    def remove(self, path: str) -> None:
+        """
+        删除记录
+        :param path: 输出文件路径
+        :return: None
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM books WHERE path = ?", (os.path.abspath(path),))
+            self._conn.commit()
+
+    def import_upd(self, folder: str) -> int:
+        """
+        导入旧版本的"{标题}.upd"文件（txt模式），已有同标题txt记录的文件不会被读取，可以在每次启动时调用\n
+        .upd文件中没有保存路径，导入的记录在第一次按标题查找并更新后才会记录路径
+        :param folder: .upd文件所在的文件夹（程序数据文件夹）
+        :return: 导入的数量
+        """
+        if not os.path.isdir(folder):
+            return 0
+        titles = {file[:-len(".upd")]: file for file in os.listdir(folder) if file.endswith(".upd")}
+        with self._lock:
+            existing = {row[0] for row in self._conn.execute("SELECT title FROM books WHERE format = 'txt'")}
+        rows = []
+        for title, file in titles.items():
+            if title in existing:
+                continue
+            try:
+                with open(os.path.join(folder, file), 'r', encoding='utf-8') as f:
+                    lines = [line.strip() for line in f.readlines()]
+                # 时间、小说ID、最新章节ID、编码、sha256（新版本）、目录指纹（新版本）
+                updated = time.mktime(time.strptime(lines[0], "%Y-%m-%d %H:%M:%S"))
+                rows.append((lines[1], title, "txt", lines[3], lines[2],
+                             lines[5] if len(lines) >= 6 else None, lines[4] if len(lines) >= 5 else None,
+                             updated, updated))
+            except (OSError, ValueError, IndexError, UnicodeDecodeError):
+                continue
+        with self._lock:
+            self._conn.executemany("INSERT INTO books (book_id, title, format, encoding, lastcid, catalog, "
+                                   "sha256, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+        return len(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
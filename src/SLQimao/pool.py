@@ -0,0 +1,53 @@
+"""
+共享进程池\n
+解密使用的进程池在同一个进程内共享，首次使用时创建、程序退出时关闭，
+同时下载多本小说时子进程总数不超过processes，也不必为每次输出重新启动子进程\n
+已有其他线程运行时（例如批量模式的下载线程）使用forkserver（不支持时使用spawn）创建子进程，
+避免fork复制其他线程持有的锁导致子进程死锁
+"""
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+_shared: ProcessPoolExecutor | None = None
+_size: int = 0
+_lock = threading.Lock()
+
+
+def _context():
+    if threading.active_count() == 1:
+        return multiprocessing.get_context()
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def get_pool(processes: int) -> ProcessPoolExecutor:
+    """
+    获取共享进程池，首次调用时创建\n
+    需要的进程数多于现有进程池时创建更大的进程池替换它，旧进程池完成已提交的任务后关闭
+    :param processes: 需要的进程数
+    :return: 共享进程池
+    """
+    global _shared, _size
+    with _lock:
+        if _shared is None or processes > _size:
+            old, _shared, _size = _shared, ProcessPoolExecutor(max_workers=processes, mp_context=_context()), processes
+            if old is not None:
+                old.shutdown(wait=False)
+        return _shared
+
+
+def shutdown() -> None:
+    """
+    关闭共享进程池（程序退出时自动调用），之后再使用时会重新创建
+    :return: None
+    """
+    global _shared, _size
+    with _lock:
+        old, _shared, _size = _shared, None, 0
+    if old is not None:
+        old.shutdown(wait=True, cancel_futures=True)
+
+
+atexit.register(shutdown)
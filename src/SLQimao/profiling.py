@@ -0,0 +1,154 @@
+"""
+性能分析\n
+Profiler在一本小说的完整处理过程（ready → 下载、解密 → 写入）中同时运行cProfile与tracemalloc，
+在各阶段结束时保存内存快照，结束后把CPU分析结果与内存占用最多的分配位置写入文件\n
+通常不需要直接使用：创建Book时指定profile=True（命令行模式使用--profile）即可，结果保存在输出文件旁边\n
+同一进程中同时只能有一个Profiler在运行：tracemalloc是进程级的，Python 3.12起cProfile（基于sys.monitoring）也是进程级的，
+第二个同时启用的cProfile会出错，因此其他Profiler的start会引发ProfilerBusy
+"""
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+# 正在运行的Profiler数量（0或1），_started为tracemalloc是否由Profiler启动（启动前已在运行的不会被停止）
+_lock = threading.Lock()
+_active = 0
+_started = False
+
+
+class ProfilerBusy(RuntimeError):
+    """已有其他性能分析正在进行"""
+
+
+class Profiler:
+    """
+    CPU与内存分析器\n
+    注意：进程池中的解密不在CPU分析结果中；Python 3.12之前cProfile只分析调用start的线程（线程池中的封面下载不在结果中），
+    3.12起分析所有线程；tracemalloc统计整个进程的内存，分析期间同时处理的其他小说也会计入
+    :param top: 报告中列出的函数与分配位置数量，默认30
+    :param frames: tracemalloc为每次分配保存的调用栈帧数，默认10
+    """
+    def __init__(self, top: int = 30, frames: int = 10) -> None:
+        self.top: int = top
+        self.frames: int = frames
+        self.checkpoints: list = []     # (阶段名, 经过的秒数, 当前内存, 峰值内存, 快照)
+        self._profile: cProfile.Profile | None = None
+        self._start: float = 0.0
+
+    def start(self) -> None:
+        """
+        开始分析，已有其他Profiler（或其他使用cProfile的工具）正在运行时引发ProfilerBusy，此时不会改变任何状态
+        :return: None
+        """
+        global _active, _started
+        with _lock:
+            if _active:
+                raise ProfilerBusy("已有其他性能分析正在进行")
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start(self.frames)
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError as e:
+                # Python 3.12+: Another profiling tool is already active
+                if started:
+                    tracemalloc.stop()
+                raise ProfilerBusy(str(e)) from e
+            _active, _started = 1, started
+        tracemalloc.reset_peak()
+        self._start = time.perf_counter()
+        self._profile = profile
+        self.checkpoint("start")
+
+    def checkpoint(self, name: str) -> None:
+        """
+        在阶段结束时保存内存快照
+        :param name: 阶段名
+        :return: None
+        """
+        if self._profile is None:
+            return
+        # 过滤在生成报告时进行，CPU分析结果中take_snapshot的耗时来自这里
+        # （不在此暂停cProfile：在嵌套调用中暂停再恢复会使外层函数的累计耗时不准确）
+        current, peak = tracemalloc.get_traced_memory()
+        self.checkpoints.append((name, time.perf_counter() - self._start, current, peak, tracemalloc.take_snapshot()))
+
+    def stop(self, folder: str, name: str) -> list:
+        """
+        停止分析并写入结果文件：\n
+        {name}.prof（cProfile原始数据，可用pstats或snakeviz查看）\n
+        {name}.profile.txt（按累计耗时与自身耗时排序的函数）\n
+        {name}.memory.txt（各阶段的内存占用、内存最多时的分配位置与各阶段的内存增长）
+        :param folder: 保存文件夹
+        :param name: 文件名（不含扩展名）
+        :return: 写入的文件路径列表
+        """
+        if self._profile is None:
+            return []
+        self._profile.disable()
+        self.checkpoint("end")
+        profile = self._release()
+
+        os.makedirs(folder, exist_ok=True)
+        base = os.path.join(folder, name)
+        profile.dump_stats(f"{base}.prof")
+        with open(f"{base}.profile.txt", 'w', encoding='utf-8') as f:
+            for key, title in (("cumulative", "按累计耗时排序"), ("tottime", "按自身耗时排序")):
+                stream = io.StringIO()
+                pstats.Stats(profile, stream=stream).sort_stats(key).print_stats(self.top)
+                f.write(f"===== {title} =====\n{stream.getvalue()}\n")
+        with open(f"{base}.memory.txt", 'w', encoding='utf-8') as f:
+            f.write(self._memory_report())
+        self.checkpoints = []
+        return [f"{base}.prof", f"{base}.profile.txt", f"{base}.memory.txt"]
+
+    def discard(self) -> None:
+        """
+        停止分析，不写入结果（例如获取信息失败时），之后可以启动新的分析
+        :return: None
+        """
+        if self._profile is None:
+            return
+        self._profile.disable()
+        self._release()
+        self.checkpoints = []
+
+    def _release(self) -> cProfile.Profile:
+        # 释放cProfile，停止由start启动的tracemalloc
+        global _active, _started
+        profile, self._profile = self._profile, None
+        with _lock:
+            _active = 0
+            if _started:
+                tracemalloc.stop()
+                _started = False
+        return profile
+
+    def _memory_report(self) -> str:
+        filters = (tracemalloc.Filter(False, tracemalloc.__file__),
+                   tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                   tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"))
+        self.checkpoints = [(name, elapsed, current, peak, snapshot.filter_traces(filters))
+                            for name, elapsed, current, peak, snapshot in self.checkpoints]
+        lines = ["===== 各阶段内存占用 =====", f"{'阶段':<12}{'时间（秒）':>12}{'当前（MB）':>14}{'峰值（MB）':>14}"]
+        for name, elapsed, current, peak, _ in self.checkpoints:
+            lines.append(f"{name:<12}{elapsed:>14.3f}{current / 1048576:>16.2f}{peak / 1048576:>16.2f}")
+
+        # 内存占用最多的时刻（例如ebooklib写入epub之前）的分配位置
+        name, _, current, _, snapshot = max(self.checkpoints, key=lambda checkpoint: checkpoint[2])
+        lines += ["", f"===== 内存占用最多的阶段（{name}，{current / 1048576:.2f} MB）的分配位置 ====="]
+        lines += [str(stat) for stat in snapshot.statistics("lineno")[:self.top]]
+        lines += ["", f"===== 内存占用最多的阶段（{name}）的分配调用栈 ====="]
+        for stat in snapshot.statistics("traceback")[:min(self.top, 10)]:
+            lines.append(f"{stat.size / 1024:.1f} KiB，{stat.count}次分配")
+            lines += [f"    {line}" for line in stat.traceback.format()]
+
+        for (before, *_, old), (after, *_, new) in zip(self.checkpoints, self.checkpoints[1:]):
+            lines += ["", f"===== 内存增长：{before} → {after} ====="]
+            lines += [str(stat) for stat in new.compare_to(old, "lineno")[:self.top]]
+        return "\n".join(lines) + "\n"
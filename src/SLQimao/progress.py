@@ -0,0 +1,112 @@
+"""
+进度报告\n
+Book通过ProgressReporter报告下载与合并进度，可以替换为自己的实现\n
+RichReporter按时间间隔节流刷新终端，NullReporter不做任何事（批量、非交互模式使用）
+"""
+import time
+
+
+class ProgressReporter:
+    """
+    进度报告接口\n
+    使用方式: with reporter.task("描述", total, unit): reporter.advance(n)
+    """
+    def start(self, description: str, total: int, unit: str = "章", completed: int = 0) -> None:
+        """
+        开始一个任务
+        :param description: 任务描述
+        :param total: 总量
+        :param unit: 单位，"B"表示字节（显示为下载进度），其他值按数量显示
+        :param completed: 已完成的量（例如断点续传时已下载的字节数）
+        :return: None
+        """
+
+    def advance(self, amount: int = 1) -> None:
+        """
+        报告进度
+        :param amount: 本次完成的量
+        :return: None
+        """
+
+    def finish(self) -> None:
+        """
+        结束当前任务
+        :return: None
+        """
+
+    def task(self, description: str, total: int, unit: str = "章", completed: int = 0) -> "ProgressReporter":
+        self.start(description, total, unit, completed)
+        return self
+
+    def __enter__(self) -> "ProgressReporter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.finish()
+
+
+class NullReporter(ProgressReporter):
+    """
+    不显示任何进度
+    """
+
+
+class RichReporter(ProgressReporter):
+    """
+    使用rich在终端显示进度条\n
+    进度先在内存中累加，距离上次刷新超过interval秒时才更新终端，避免渲染成为瓶颈
+    :param interval: 最短刷新间隔，单位秒，默认0.1
+    """
+    def __init__(self, interval: float = 0.1) -> None:
+        self.interval: float = interval
+        self._progress = None
+        self._task = None
+        self._pending: int = 0
+        self._last: float = 0
+
+    def start(self, description: str, total: int, unit: str = "章", completed: int = 0) -> None:
+        from rich.progress import (
+            Progress,
+            BarColumn,
+            TimeElapsedColumn,
+            TimeRemainingColumn,
+            SpinnerColumn,
+            TaskProgressColumn,
+            DownloadColumn
+        )
+        self.finish()
+        self._progress = Progress(
+            "{task.description}",
+            SpinnerColumn(),
+            BarColumn(),
+            DownloadColumn() if unit == "B" else "{task.completed}/{task.total}" + unit,
+            TaskProgressColumn(),
+            TimeElapsedColumn(),
+            "<",
+            TimeRemainingColumn(),
+            auto_refresh=False,
+        )
+        self._progress.start()
+        self._task = self._progress.add_task(f"[cyan]{description}", total=total, completed=completed)
+        self._pending = 0
+        self._last = time.monotonic()
+
+    def advance(self, amount: int = 1) -> None:
+        self._pending += amount
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self._flush()
+            self._last = now
+
+    def _flush(self) -> None:
+        self._progress.update(self._task, advance=self._pending)
+        self._pending = 0
+        self._progress.refresh()
+
+    def finish(self) -> None:
+        if self._progress is None:
+            return
+        self._flush()
+        self._progress.stop()
+        self._progress = None
+        self._task = None
@@ -0,0 +1,73 @@
+"""
+下载限速\n
+使用令牌桶算法限制下载带宽，同一个限速器被多个下载同时使用时共享带宽预算
+"""
+import threading
+import time
+
+# 下载时每次读取的数据块大小
+chunk_size = 64 * 1024
+
+
+class TokenBucket:
+    """
+    令牌桶限速器（线程安全）\n
+    每消耗1字节需要1个令牌，令牌以rate字节/秒的速度补充，最多积攒burst个\n
+    :param rate: 限速，单位字节/秒，None或0表示不限速
+    :param burst: 令牌桶容量，默认为1秒的流量
+    """
+    def __init__(self, rate: float | None = None, burst: float | None = None) -> None:
+        self._lock = threading.Lock()
+        self.rate: float | None = None
+        self.burst: float = 0
+        self._tokens: float = 0
+        self._last: float = time.monotonic()
+        self.set_rate(rate, burst)
+
+    @property
+    def unlimited(self) -> bool:
+        return not self.rate
+
+    def set_rate(self, rate: float | None, burst: float | None = None) -> None:
+        """
+        修改限速
+        :param rate: 限速，单位字节/秒，None或0表示不限速
+        :param burst: 令牌桶容量，默认为1秒的流量
+        :return: None
+        """
+        with self._lock:
+            self.rate = rate if rate and rate > 0 else None
+            self.burst = burst if burst is not None else (self.rate or 0)
+            self._tokens = min(self._tokens, self.burst)
+            self._last = time.monotonic()
+
+    def consume(self, amount: int) -> None:
+        """
+        消耗令牌，令牌不足时阻塞等待\n
+        允许令牌暂时为负（预支），之后的调用者会相应地等待更久，因此总速率不会超过限速
+        :param amount: 字节数
+        :return: None
+        """
+        if self.unlimited:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+# 全局限速器，所有未单独指定限速器的下载共享
+limiter = TokenBucket()
+
+
+def set_bandwidth(rate: float | None) -> None:
+    """
+    设置全局下载限速
+    :param rate: 限速，单位字节/秒，None或0表示不限速
+    :return: None
+    """
+    limiter.set_rate(rate)
@@ -0,0 +1,447 @@
+"""
+常驻服务\n
+在本地HTTP接口上接收下载任务，所有任务共用进程内的连接池会话、缓存与线程池，不再为每次下载重新启动程序\n
+接口（请求与响应均为JSON，结果文件除外）:
+    POST /jobs                      提交任务，{"books": [ID或链接, ...], "manifest": "每行一个ID或链接",
+                                    "formats": ["txt", "chapter", "epub"], "encoding": "utf-8", "output": "保存路径",
+                                    "refresh": false}
+                                    books（只有一本时也可以用book）与manifest至少提供一个，
+                                    formats默认["txt"]（也可以是逗号分隔的字符串）
+    GET  /jobs                      所有任务的状态
+    GET  /jobs/{任务ID}              任务状态，每本小说的状态、输出文件与分阶段统计（Book.report）
+    GET  /jobs/{任务ID}/result      下载输出文件，参数book（小说ID）与format，只有一本/一种格式时可省略；
+                                    分章节txt打包为zip返回
+    GET  /health                    服务状态
+安全：output只能是保存路径（服务的output）下的文件夹（相对路径相对于保存路径）；默认只监听本机地址，
+监听其他地址时必须设置token，之后每个请求都要带上请求头"Authorization: Bearer {token}"；
+POST请求必须使用"Content-Type: application/json"，服务不返回CORS头，浏览器中其他网站的页面无法提交任务；
+没有设置token时只接受Host为本机地址（或监听地址）的请求，防止DNS重绑定，带Origin的请求必须来自服务自身
+用法:
+    service = DownloadService("output", workers=4)
+    service.serve_forever()         # 或service.start()在后台线程中运行
+"""
+import hmac
+import ipaddress
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, quote
+from .book import Book
+
+
+class Job:
+    """
+    下载任务，每本小说一个条目\n
+    条目状态：queued（等待）、running（下载中）、done（完成）、failed（失败）、cancelled（服务停止时尚未开始，已取消）\n
+    任务状态：所有条目都结束后，全部完成为done，有失败的为failed，否则（有取消的）为cancelled
+    :param books: 小说ID列表
+    :param formats: 输出格式列表（见Book.formats）
+    :param encoding: txt文件编码
+    :param output: 保存路径
+    :param refresh: 是否忽略小说信息与目录缓存
+    """
+    def __init__(self, books: list, formats: list, encoding: str, output: str, refresh: bool = False) -> None:
+        self.id: str = uuid.uuid4().hex[:12]
+        self.formats: list = formats
+        self.encoding: str = encoding
+        self.output: str = output
+        self.refresh: bool = refresh
+        self.created: float = time.time()
+        self.finished: float | None = None
+        self.books: list = [{"book_id": book_id, "state": "queued", "title": None, "files": {}, "error": None,
+                             "report": None} for book_id in books]
+
+    @property
+    def state(self) -> str:
+        states = {entry["state"] for entry in self.books}
+        if states <= {"done"}:
+            return "done"
+        if states <= {"done", "failed", "cancelled"}:
+            return "failed" if "failed" in states else "cancelled"
+        if states == {"queued"}:
+            return "queued"
+        return "running"
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "state": self.state, "formats": self.formats, "encoding": self.encoding,
+                "output": os.path.abspath(self.output), "created": self.created, "finished": self.finished,
+                "books": [dict(entry, files=dict(entry["files"])) for entry in self.books]}
+
+
+class DownloadService:
+    """
+    常驻下载服务（线程安全）\n
+    同一本小说的任务依次执行，避免同时写入同一个文件
+    :param output: 保存路径，任务指定的output必须在此文件夹下
+    :param workdir: 临时文件夹，每本小说使用其中以小说ID命名的子文件夹，默认为系统临时文件夹下的SLQimao
+    :param workers: 同时下载的小说数量，默认4
+    :param new_book: 创建Book的函数，参数为(小说ID, 临时文件夹)，默认使用流式模式、不显示进度条
+    :param resolve: 把链接或ID转换为小说ID的函数，无法识别时返回None，默认只接受数字ID
+    :param on_success: 每种格式输出成功后调用，参数为(Book, 格式, 保存路径)，例如记录到小说索引
+    :param epub_assets: epub使用的字体与css文件路径（格式同Book.toepub的kwargs）
+    :param refresh: 任务默认是否忽略小说信息与目录缓存，默认False
+    :param host: 监听地址，默认127.0.0.1
+    :param port: 监听端口，默认52512，0为随机端口
+    :param max_jobs: 保留的任务数量上限，超过时删除最早完成的任务，默认1000
+    :param token: 访问令牌，设置后每个请求都要带上"Authorization: Bearer {token}"，监听非本机地址时必须设置
+    :raises ValueError: 监听非本机地址但没有设置token
+    """
+    def __init__(self, output: str = ".", workdir: str | None = None, workers: int = 4, new_book=None,
+                 resolve=None, on_success=None, epub_assets: dict | None = None, refresh: bool = False,
+                 host: str = "127.0.0.1", port: int = 52512, max_jobs: int = 1000,
+                 token: str | None = None) -> None:
+        if not token and not is_loopback(host):
+            raise ValueError(f"监听非本机地址（{host}）时必须设置访问令牌")
+        self.output: str = output
+        self.token: str | None = token
+        self.workdir: str = workdir or os.path.join(tempfile.gettempdir(), "SLQimao")
+        self.new_book = new_book or (lambda book_id, workdir_: Book(book_id, workdir=workdir_, quiet=True,
+                                                                     stream=True))
+        self.resolve = resolve or (lambda text: text if text.isdigit() else None)
+        self.on_success = on_success
+        self.epub_assets: dict = epub_assets or {}
+        self.refresh: bool = refresh
+        self.max_jobs: int = max_jobs
+        self.jobs: dict = {}            # 任务ID -> Job，按提交顺序
+        self._lock = threading.Lock()
+        self._book_locks: dict = {}     # 小说ID -> [锁, 使用该锁的任务数]，没有任务使用时删除
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="download")
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self.url: str = f"http://{host}:{self._server.server_address[1]}"
+        # 没有设置token时接受的Host（不含端口）
+        self._hosts: set = {"localhost", "127.0.0.1", "::1", host.lower().strip("[]")}
+        self._thread: threading.Thread | None = None
+
+    def submit(self, books: list, formats: list | None = None, encoding: str = "utf-8", output: str | None = None,
+               refresh: bool | None = None) -> Job:
+        """
+        提交任务
+        :param books: 小说ID或链接列表
+        :param formats: 输出格式列表，默认["txt"]，"normal"等同于"txt"
+        :param encoding: txt文件编码，默认utf-8
+        :param output: 保存路径，必须在服务的保存路径下，相对路径相对于服务的保存路径，默认使用服务的保存路径
+        :param refresh: 是否忽略小说信息与目录缓存，默认使用服务的设置
+        :return: 任务
+        :raises ValueError: 参数无效
+        """
+        book_ids = []
+        for text in books:
+            book_id = self.resolve(str(text).strip())
+            if not book_id:
+                raise ValueError(f"无法识别的内容：{text}")
+            book_ids.append(book_id)
+        book_ids = list(dict.fromkeys(book_ids))
+        if not book_ids:
+            raise ValueError("请提供小说ID或链接")
+        formats = list(dict.fromkeys("txt" if fmt == "normal" else fmt for fmt in (formats or ["txt"])))
+        unknown = [fmt for fmt in formats if fmt not in Book.formats]
+        if unknown:
+            raise ValueError(f"不支持的输出格式：{', '.join(unknown)}（可选{', '.join(Book.formats)}）")
+        try:
+            "测试".encode(encoding)
+        except LookupError:
+            raise ValueError(f"无效的编码：{encoding}")
+        job = Job(book_ids, formats, encoding, self._output(output), self.refresh if refresh is None else refresh)
+        with self._lock:
+            self.jobs[job.id] = job
+            self._prune()
+        for entry in job.books:
+            self._executor.submit(self._run, job, entry).add_done_callback(partial(self._cancelled, job, entry))
+        return job
+
+    def _cancelled(self, job: Job, entry: dict, future) -> None:
+        # 服务停止时取消的下载不会再运行，标记为已取消
+        if future.cancelled():
+            entry["error"] = "服务已停止"
+            entry["state"] = "cancelled"
+            self._finish(job)
+
+    def _finish(self, job: Job) -> None:
+        with self._lock:
+            if job.finished is None and job.state in ("done", "failed", "cancelled"):
+                job.finished = time.time()
+
+    def _output(self, output: str | None) -> str:
+        # 解析任务的保存路径（包括符号链接），不允许离开服务的保存路径
+        root = os.path.realpath(self.output)
+        if not output:
+            return root
+        path = os.path.realpath(os.path.join(root, output))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"保存路径必须在{root}下：{output}")
+        return path
+
+    def _prune(self) -> None:
+        # 删除最早完成的任务（调用时已持有锁）
+        for job_id in [job.id for job in self.jobs.values() if job.finished is not None]:
+            if len(self.jobs) <= self.max_jobs:
+                break
+            del self.jobs[job_id]
+
+    @contextmanager
+    def _book_lock(self, book_id: str):
+        # 同一本小说的任务依次执行，锁在没有任务使用时删除
+        with self._lock:
+            entry = self._book_locks.setdefault(book_id, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._book_locks[book_id]
+
+    def _run(self, job: Job, entry: dict) -> None:
+        book_id = entry["book_id"]
+        workdir = os.path.join(self.workdir, book_id)
+        with self._book_lock(book_id):
+            entry["state"] = "running"
+            try:
+                os.makedirs(job.output, exist_ok=True)
+                os.makedirs(workdir, exist_ok=True)
+                novel = self.new_book(book_id, workdir)
+                novel.ready(job.refresh)
+                entry["title"] = novel.title
+                if not novel.export(job.output, job.formats, job.encoding, **self.epub_assets):
+                    raise RuntimeError("处理文件失败")
+                files = {"txt": os.path.join(job.output, f"{novel.title}.txt"),
+                         "chapter": os.path.join(job.output, novel.title),
+                         "epub": os.path.join(job.output, f"{novel.title}.epub")}
+                entry["files"] = {fmt: os.path.abspath(files[fmt]) for fmt in job.formats}
+                if self.on_success is not None:
+                    for fmt in job.formats:
+                        self.on_success(novel, fmt, job.output)
+                entry["report"] = novel.report()
+                entry["state"] = "done"
+                # 下载失败时保留临时文件夹，下次可以从断点继续下载
+                shutil.rmtree(workdir, ignore_errors=True)
+            except Exception as e:
+                entry["error"] = str(e)
+                entry["state"] = "failed"
+        self._finish(job)
+
+    def get(self, job_id: str) -> Job | None:
+        """
+        :param job_id: 任务ID
+        :return: 任务，不存在时返回None
+        """
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def result(self, job: Job, book_id: str | None = None, format_: str | None = None) -> str:
+        """
+        查找输出文件
+        :param job: 任务
+        :param book_id: 小说ID，任务只有一本小说时可省略
+        :param format_: 格式，任务只有一种格式时可省略
+        :return: 文件路径（分章节txt为文件夹路径）
+        :raises KeyError: 找不到对应的小说或格式
+        :raises LookupError: 该小说尚未下载完成
+        """
+        if book_id is None and len(job.books) != 1:
+            raise KeyError("任务包含多本小说，请指定book参数")
+        if format_ is None and len(job.formats) != 1:
+            raise KeyError("任务包含多种格式，请指定format参数")
+        format_ = "txt" if format_ == "normal" else (format_ or job.formats[0])
+        entry = next((entry for entry in job.books if book_id is None or entry["book_id"] == book_id), None)
+        if entry is None or format_ not in job.formats:
+            raise KeyError("任务中没有该小说或格式")
+        if entry["state"] != "done":
+            raise LookupError(f"小说{entry['book_id']}尚未下载完成（{entry['state']}）")
+        return entry["files"][format_]
+
+    def status(self) -> dict:
+        with self._lock:
+            states = [job.state for job in self.jobs.values()]
+        return {"status": "ok", "jobs": len(states), "queued": states.count("queued"),
+                "running": states.count("running")}
+
+    def _handler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _headers(self, status: int, length: int, content_type: str, headers: dict | None = None) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(length))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+
+            def _send(self, status: int, body: bytes, content_type: str, headers: dict | None = None) -> None:
+                self._headers(status, len(body), content_type, headers)
+                self.wfile.write(body)
+
+            def _send_file(self, f, content_type: str, headers: dict | None = None) -> None:
+                # 边读边发送，不把整个文件读入内存
+                self._headers(200, os.fstat(f.fileno()).st_size, content_type, headers)
+                shutil.copyfileobj(f, self.wfile)
+
+            def _json(self, data: dict | list, status: int = 200) -> None:
+                self._send(status, json.dumps(data, ensure_ascii=False).encode('utf-8'),
+                           "application/json; charset=utf-8")
+
+            def _error(self, status: int, message: str) -> None:
+                self._json({"error": message}, status)
+
+            def _reject(self, status: int, message: str) -> bool:
+                # 未读取的请求体会影响同一连接上的下一个请求
+                self.close_connection = True
+                self._error(status, message)
+                return False
+
+            def _authorized(self) -> bool:
+                host = self.headers.get("Host", "")
+                origin = self.headers.get("Origin")
+                if origin is not None and urlsplit(origin).netloc != host:
+                    return self._reject(403, "不接受跨站请求")
+                if not service.token:
+                    if urlsplit(f"//{host}").hostname not in service._hosts:
+                        return self._reject(403, f"无效的Host：{host}")
+                    return True
+                if hmac.compare_digest(self.headers.get("Authorization", "").encode('utf-8'),
+                                       f"Bearer {service.token}".encode('utf-8')):
+                    return True
+                return self._reject(401, "未授权")
+
+            def do_GET(self) -> None:
+                if not self._authorized():
+                    return
+                url = urlsplit(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                parts = [part for part in url.path.split("/") if part]
+                if parts == ["health"]:
+                    self._json(service.status())
+                elif parts == ["jobs"]:
+                    with service._lock:
+                        jobs = list(service.jobs.values())
+                    self._json([job.to_dict() for job in jobs])
+                elif len(parts) in (2, 3) and parts[0] == "jobs":
+                    job = service.get(parts[1])
+                    if job is None:
+                        self._error(404, f"任务{parts[1]}不存在")
+                    elif len(parts) == 2:
+                        self._json(job.to_dict())
+                    elif parts[2] == "result":
+                        self._result(job, query.get("book"), query.get("format"))
+                    else:
+                        self._error(404, "not found")
+                else:
+                    self._error(404, "not found")
+
+            def do_POST(self) -> None:
+                if not self._authorized():
+                    return
+                if urlsplit(self.path).path.rstrip("/") != "/jobs":
+                    self._reject(404, "not found")
+                    return
+                if self.headers.get_content_type() != "application/json":
+                    # 浏览器不经预检就能跨站发送表单与纯文本请求，JSON请求需要预检，而服务不返回CORS头
+                    self._reject(415, "请求的Content-Type必须是application/json")
+                    return
+                try:
+                    data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                    if not isinstance(data, dict):
+                        raise ValueError("请求内容必须是JSON对象")
+                    books = data.get("books", data.get("book", []))
+                    books = [books] if isinstance(books, str) else list(books)
+                    books += [line for line in data.get("manifest", "").splitlines() if line.strip()]
+                    formats = data.get("formats", data.get("format"))
+                    if isinstance(formats, str):
+                        formats = [fmt.strip() for fmt in formats.split(",") if fmt.strip()]
+                    job = service.submit(books, formats, data.get("encoding", "utf-8"), data.get("output"),
+                                         data.get("refresh"))
+                except (ValueError, TypeError, AttributeError) as e:
+                    self._error(400, str(e))
+                    return
+                self._json(job.to_dict(), 202)
+
+            def _result(self, job: Job, book_id: str | None, format_: str | None) -> None:
+                try:
+                    path = service.result(job, book_id, format_)
+                except KeyError as e:
+                    self._error(404, e.args[0])
+                    return
+                except LookupError as e:
+                    self._error(409, str(e))
+                    return
+                if os.path.isdir(path):
+                    # 分章节txt：打包为zip（写入临时文件，不在内存中构建）
+                    name = os.path.basename(path) + ".zip"
+                    with tempfile.TemporaryFile() as f:
+                        with zipfile.ZipFile(f, 'w', zipfile.ZIP_DEFLATED) as z:
+                            for file in sorted(os.listdir(path)):
+                                z.write(os.path.join(path, file), file)
+                        f.seek(0)
+                        self._send_file(f, "application/zip",
+                                        {"Content-Disposition": f"attachment; filename*=UTF-8''{quote(name)}"})
+                else:
+                    name = os.path.basename(path)
+                    content_type = "application/epub+zip" if path.endswith(".epub") else "text/plain"
+                    with open(path, 'rb') as f:
+                        self._send_file(f, content_type,
+                                        {"Content-Disposition": f"attachment; filename*=UTF-8''{quote(name)}"})
+
+        return Handler
+
+    def serve_forever(self) -> None:
+        """
+        在当前线程中运行服务，直到调用stop（或按Ctrl+C）
+        :return: None
+        """
+        self._server.serve_forever()
+
+    def start(self) -> "DownloadService":
+        """
+        在后台线程中运行服务
+        :return: 服务本身
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, wait: bool = True) -> None:
+        """
+        停止服务，取消尚未开始的下载（状态为cancelled）
+        :param wait: 是否等待正在进行的下载完成，默认True
+        :return: None
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def __enter__(self) -> "DownloadService":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def is_loopback(host: str) -> bool:
+    """
+    监听地址是否只能从本机访问
+    :param host: 地址或主机名
+    :return: 是否为本机地址
+    """
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback if host else False
+    except (OSError, ValueError):
+        return False
@@ -0,0 +1,68 @@
+"""
+HTTP连接池会话\n
+所有API请求共享同一个requests.Session，复用TCP/TLS连接（keep-alive），避免每次请求重新握手
+"""
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# 各API域名的默认连接池大小
+pool_sizes: dict = {
+    "api-bc.wtzw.com": 10,
+    "api-ks.wtzw.com": 10,
+}
+
+_shared = None
+_lock = threading.Lock()
+
+
+def new_session(pool_connections: int = 10, pool_maxsize: int = 10, hosts: dict | None = None) -> requests.Session:
+    """
+    创建一个带连接池的会话\n
+    注意：并发使用时，pool_maxsize应不小于线程数，否则多出的连接会在使用后被丢弃
+    :param pool_connections: 缓存的连接池（域名）数量
+    :param pool_maxsize: 未单独指定的域名，每个域名保持的最大连接数
+    :param hosts: 单独指定连接数的域名，格式为 {域名: 最大连接数}，默认使用pool_sizes
+    :return: 会话
+    """
+    if hosts is None:
+        hosts = pool_sizes
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # 按域名挂载独立的适配器（requests会选择前缀最长的适配器）
+    for host, size in hosts.items():
+        session.mount(f"https://{host}", HTTPAdapter(pool_connections=1, pool_maxsize=size))
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    获取共享会话，首次调用时创建
+    :return: 共享会话
+    """
+    global _shared
+    if _shared is None:
+        with _lock:
+            if _shared is None:
+                _shared = new_session()
+    return _shared
+
+
+def configure(pool_connections: int = 10, pool_maxsize: int = 10, hosts: dict | None = None) -> requests.Session:
+    """
+    使用新的连接池参数替换共享会话\n
+    已经创建的Book对象仍使用旧会话
+    :param pool_connections: 缓存的连接池（域名）数量
+    :param pool_maxsize: 每个域名保持的最大连接数
+    :param hosts: 单独指定连接数的域名
+    :return: 新的共享会话
+    """
+    global _shared
+    session = new_session(pool_connections, pool_maxsize, hosts)
+    with _lock:
+        old, _shared = _shared, session
+    if old is not None:
+        old.close()
+    return session
@@ -0,0 +1,143 @@
+"""
+分阶段耗时统计\n
+Book在获取信息、下载、解压、解密、合并、编码、计算hash、写入更新元数据等阶段记录耗时、字节数与章节数，保存在book.stats中\n
+批量下载时可以用StatsLog把每本小说的统计逐行写入JSON-lines文件
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class BookStats:
+    """
+    一本小说的分阶段统计（线程安全）\n
+    同名阶段多次记录时累加，阶段按首次记录的顺序排列\n
+    merge（合并循环）包含读取、解密与写入各格式的时间，decrypt、txt.encode等阶段是它的一部分
+    :param book_id: 小说ID
+    """
+    def __init__(self, book_id: str) -> None:
+        self.book_id: str = book_id
+        self.stages: dict = {}      # 阶段名 -> {"seconds", "calls", "bytes", "chapters"}
+        self.outputs: list = []     # 每次调用输出方法的结果
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float = 0.0, bytes_: int = 0, chapters: int = 0, calls: int = 1) -> None:
+        """
+        记录一个阶段
+        :param name: 阶段名
+        :param seconds: 耗时，单位秒
+        :param bytes_: 处理的字节数
+        :param chapters: 处理的章节数
+        :param calls: 调用次数
+        :return: None
+        """
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = {"seconds": 0.0, "calls": 0, "bytes": 0, "chapters": 0}
+            stage["seconds"] += seconds
+            stage["calls"] += calls
+            stage["bytes"] += bytes_
+            stage["chapters"] += chapters
+
+    @contextmanager
+    def stage(self, name: str, bytes_: int = 0, chapters: int = 0):
+        """
+        记录with块的耗时，块内可以修改返回的字典补充字节数与章节数
+        :param name: 阶段名
+        :param bytes_: 字节数
+        :param chapters: 章节数
+        :return: {"bytes": 字节数, "chapters": 章节数}
+        """
+        counts = {"bytes": bytes_, "chapters": chapters}
+        start = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            self.add(name, time.perf_counter() - start, counts["bytes"], counts["chapters"])
+
+    def timed(self, name: str, items) -> Iterator:
+        """
+        记录从迭代器中取出每一项所用的时间（即上游生成该项的耗时），每项计为一章
+        :param name: 阶段名
+        :param items: 迭代器
+        :return: 原样返回各项的迭代器
+        """
+        items = iter(items)
+        seconds = 0.0
+        count = 0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                finally:
+                    seconds += time.perf_counter() - start
+                count += 1
+                yield item
+        finally:
+            self.add(name, seconds, chapters=count)
+
+    def output(self, method: str, success: bool, seconds: float) -> None:
+        """
+        记录一次输出方法的调用
+        :param method: 方法名，例如totxt
+        :param success: 是否成功
+        :param seconds: 总耗时，单位秒
+        :return: None
+        """
+        with self._lock:
+            self.outputs.append({"method": method, "success": success, "seconds": seconds})
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stages = {}
+            self.outputs = []
+
+    def to_dict(self) -> dict:
+        """
+        :return: {"book_id", "stages": {阶段名: {"seconds", "calls", "bytes", "chapters"}}, "outputs": [...]}
+        """
+        with self._lock:
+            return {
+                "book_id": self.book_id,
+                "stages": {name: dict(stage, seconds=round(stage["seconds"], 6))
+                           for name, stage in self.stages.items()},
+                "outputs": [dict(output, seconds=round(output["seconds"], 6)) for output in self.outputs],
+            }
+
+
+class StatsLog:
+    """
+    JSON-lines统计文件（线程安全），每行一条记录，以追加方式写入\n
+    :param path: 文件路径
+    """
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, record: dict) -> None:
+        """
+        写入一条记录（立即刷新到文件）
+        :param record: 记录
+        :return: None
+        """
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self) -> "StatsLog":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
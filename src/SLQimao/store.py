@@ -0,0 +1,196 @@
+"""
+已解密章节的本地存储\n
+所有章节保存在同一个SQLite文件中（zlib压缩），以(章节ID, content_md5)为键\n
+章节的content_md5变化时，旧内容自动失效；超过有效期（TTL）未使用的小说与封面会被删除，
+总大小超过上限时按小说淘汰最久未使用的
+"""
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class ChapterStore:
+    """
+    章节存储（线程安全）\n
+    :param path: 存储文件路径，例如 ~/SLQimao/chapters.db
+    :param ttl: 有效期（自最后一次使用起），单位秒，默认30天
+    :param max_bytes: 存储总大小上限（压缩后，含封面），默认1GB
+    """
+    # 每次查询的最大参数数量（SQLite默认限制为999）
+    batch_size: int = 400
+
+    def __init__(self, path: str, ttl: float = 30 * 86400, max_bytes: int = 1024 * 1024 * 1024) -> None:
+        self.path: str = path
+        self.ttl: float = ttl
+        self.max_bytes: int = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chapters (
+                id TEXT PRIMARY KEY,
+                md5 TEXT NOT NULL,
+                book_id TEXT NOT NULL,
+                content BLOB NOT NULL,
+                size INTEGER NOT NULL DEFAULT 0,
+                accessed REAL NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS chapters_book ON chapters (book_id);
+            CREATE TABLE IF NOT EXISTS covers (
+                url TEXT PRIMARY KEY,
+                content BLOB NOT NULL,
+                size INTEGER NOT NULL DEFAULT 0,
+                accessed REAL NOT NULL DEFAULT 0
+            );
+        """)
+        self._upgrade()
+        self._conn.commit()
+        self.prune()
+
+    def _upgrade(self) -> None:
+        # 旧版本的存储没有size与accessed列，补上后视为刚刚使用过
+        for table in ("chapters", "covers"):
+            columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if "size" not in columns:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+                self._conn.execute(f"UPDATE {table} SET size = length(content)")
+            if "accessed" not in columns:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN accessed REAL NOT NULL DEFAULT 0")
+                self._conn.execute(f"UPDATE {table} SET accessed = ?", (time.time(),))
+
+    def _batches(self, chapters: list):
+        for i in range(0, len(chapters), self.batch_size):
+            yield chapters[i:i + self.batch_size]
+
+    def missing(self, chapters: list) -> int:
+        """
+        统计未缓存（或content_md5已变化）的章节数量
+        :param chapters: 目录中的章节列表
+        :return: 未缓存的章节数
+        """
+        found = 0
+        with self._lock:
+            for batch in self._batches(chapters):
+                rows = self._conn.execute(
+                    f"SELECT id, md5 FROM chapters WHERE id IN ({','.join('?' * len(batch))})",
+                    [chapter['id'] for chapter in batch]).fetchall()
+                stored = dict(rows)
+                found += sum(1 for chapter in batch if stored.get(chapter['id']) == chapter['content_md5'])
+        return len(chapters) - found
+
+    def get_many(self, chapters: list) -> dict:
+        """
+        读取已缓存的章节内容，content_md5不一致的章节视为未缓存
+        :param chapters: 目录中的章节列表
+        :return: {章节ID: 章节内容}
+        """
+        result = {}
+        now = time.time()
+        with self._lock:
+            for batch in self._batches(chapters):
+                placeholders = ','.join('?' * len(batch))
+                ids = [chapter['id'] for chapter in batch]
+                rows = self._conn.execute(
+                    f"SELECT id, md5, content FROM chapters WHERE id IN ({placeholders})", ids).fetchall()
+                md5s = {chapter['id']: chapter['content_md5'] for chapter in batch}
+                for cid, md5, content in rows:
+                    if md5s[cid] == md5:
+                        result[cid] = zlib.decompress(content).decode('utf-8')
+                self._conn.execute(f"UPDATE chapters SET accessed = ? WHERE id IN ({placeholders})", [now] + ids)
+            self._conn.commit()
+        return result
+
+    def put_many(self, book_id: str, items: list) -> None:
+        """
+        保存章节内容，已存在的同ID章节会被覆盖，超过大小上限时淘汰最久未使用的其他小说
+        :param book_id: 小说ID
+        :param items: (章节, 章节内容)列表
+        :return: None
+        """
+        now = time.time()
+        rows = []
+        for chapter, content in items:
+            payload = zlib.compress(content.encode('utf-8'), 1)
+            rows.append((chapter['id'], chapter['content_md5'], book_id, payload, len(payload), now))
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO chapters VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._evict(keep=book_id)
+            self._conn.commit()
+
+    def _evict(self, keep: str | None = None) -> None:
+        # 总大小超过上限时，按小说最后一次使用的时间从旧到新整本删除（正在写入的小说除外）
+        total = self._conn.execute(
+            "SELECT (SELECT COALESCE(SUM(size), 0) FROM chapters) + (SELECT COALESCE(SUM(size), 0) FROM covers)"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for book_id, size in self._conn.execute(
+                "SELECT book_id, SUM(size) FROM chapters WHERE book_id IS NOT ? "
+                "GROUP BY book_id ORDER BY MAX(accessed)", (keep,)).fetchall():
+            self._conn.execute("DELETE FROM chapters WHERE book_id = ?", (book_id,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def prune(self) -> None:
+        """
+        删除超过有效期未使用的小说与封面，总大小超过上限时淘汰最久未使用的小说（打开存储时自动调用）
+        :return: None
+        """
+        expired = time.time() - self.ttl
+        with self._lock:
+            # 整本删除：只要有一章仍在有效期内，这本小说就保留
+            self._conn.execute("DELETE FROM chapters WHERE book_id IN "
+                               "(SELECT book_id FROM chapters GROUP BY book_id HAVING MAX(accessed) < ?)",
+                               (expired,))
+            self._conn.execute("DELETE FROM covers WHERE accessed < ?", (expired,))
+            self._evict()
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM chapters")
+            self._conn.execute("DELETE FROM covers")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+
+    def remove_book(self, book_id: str) -> None:
+        """
+        删除某本小说的所有章节
+        :param book_id: 小说ID
+        :return: None
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM chapters WHERE book_id = ?", (book_id,))
+            self._conn.commit()
+
+    def get_cover(self, url: str) -> bytes | None:
+        """
+        读取已缓存的封面
+        :param url: 封面链接
+        :return: 封面图片，未缓存时返回None
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM covers WHERE url = ?", (url,)).fetchone()
+            if row:
+                self._conn.execute("UPDATE covers SET accessed = ? WHERE url = ?", (time.time(), url))
+                self._conn.commit()
+        return row[0] if row else None
+
+    def put_cover(self, url: str, content: bytes) -> None:
+        """
+        保存封面
+        :param url: 封面链接
+        :param content: 封面图片
+        :return: None
+        """
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO covers VALUES (?, ?, ?, ?)",
+                               (url, content, len(content), time.time()))
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,149 @@
+"""
+txt写入\n
+TxtWriter将所有章节合并为一个txt文件，ChapterTxtWriter每章保存为一个txt文件\n
+与EpubWriter相同，章节在处理后立即写入，Book可以在一次遍历中同时向多个写入器输出
+"""
+import codecs
+import hashlib
+import os
+import time
+
+# 章节中隐藏的开源声明
+hide_content = """\n\n\n该小说通过星隅开发的开源免费星弦下载器下载
+如果您通过代下载获取该小说文件，且商家未提供软件源代码或开源地址，请立即退款并举报商家
+作者邮箱：xing_yv@outlook.com
+作者QQ：2017593710
+官方QQ交流群：149050832
+官方TG交流群：https://t.me/FQTool\n\n\n
+"""
+
+
+class TxtWriter:
+    """
+    合并为一个txt文件\n
+    写入过程中使用"file_path.part"临时文件，close()成功后才重命名为目标文件，中途出错不会留下不完整的文件\n
+    写入的同时计算文件的sha256，关闭后可以从sha256属性获取，无需重新读取文件\n
+    size为已写入的字节数，timings记录编码、计算hash与写入文件各自的耗时
+    :param file_path: txt文件路径
+    :param encoding: 编码
+    :param basecontent: 文件开头的小说信息
+    """
+    def __init__(self, file_path: str, encoding: str, basecontent: str) -> None:
+        self.file_path: str = file_path
+        self.encoding: str = encoding
+        self.sha256: str | None = None
+        self.size: int = 0
+        self.timings: dict = {"encode": 0.0, "hash": 0.0, "write": 0.0}
+        self._temp: str = file_path + ".part"
+        self._hash = hashlib.sha256()
+        # 与文本模式的open相同：增量编码（BOM只写一次），忽略无法编码的字符，换行符转换为系统换行符
+        self._encoder = codecs.getincrementalencoder(encoding)(errors='ignore')
+        self._file = open(self._temp, 'wb')
+        self._write(basecontent)
+
+    def _write(self, text: str, final: bool = False) -> None:
+        if os.linesep != '\n':
+            text = text.replace('\n', os.linesep)
+        start = time.perf_counter()
+        data = self._encoder.encode(text, final)
+        encoded = time.perf_counter()
+        self._hash.update(data)
+        hashed = time.perf_counter()
+        self._file.write(data)
+        self.timings["encode"] += encoded - start
+        self.timings["hash"] += hashed - encoded
+        self.timings["write"] += time.perf_counter() - hashed
+        self.size += len(data)
+
+    def write(self, title: str, content: str, hidden: bool = False) -> None:
+        """
+        写入一章
+        :param title: 章节标题
+        :param content: 章节内容
+        :param hidden: 是否在章节末尾加入开源声明
+        :return: None
+        """
+        self._write(f"\n\n\n{title}\n\n{content}")
+        if hidden:
+            self._write(hide_content)
+
+    def close(self) -> None:
+        """
+        完成写入，重命名为目标文件（已关闭时不做任何事）
+        :return: None
+        """
+        if self._file.closed:
+            return
+        self._write('', final=True)
+        self._file.close()
+        os.replace(self._temp, self.file_path)
+        self.sha256 = self._hash.hexdigest()
+
+    def abort(self) -> None:
+        """
+        放弃写入，删除临时文件（已关闭时不做任何事）
+        :return: None
+        """
+        if self._file.closed:
+            return
+        self._file.close()
+        os.remove(self._temp)
+
+    def __enter__(self) -> "TxtWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class ChapterTxtWriter:
+    """
+    分章节保存，每章一个txt文件，简介保存为"简介.txt"\n
+    size为已写入的字节数，timings记录写入（含编码）的耗时
+    :param folder: 保存文件夹，不存在时自动创建
+    :param encoding: 编码
+    :param basecontent: 小说信息
+    """
+    def __init__(self, folder: str, encoding: str, basecontent: str) -> None:
+        self.folder: str = folder
+        self.encoding: str = encoding
+        self.size: int = 0
+        self.timings: dict = {"write": 0.0}
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, "简介.txt"), 'w', encoding=encoding) as f:
+            f.write(basecontent)
+            self.size += f.tell()
+
+    def write(self, name: str, content: str, hidden: bool = False) -> None:
+        """
+        写入一章
+        :param name: 文件名（不含扩展名，需已去除非法字符）
+        :param content: 章节内容
+        :param hidden: 是否在章节末尾加入开源声明
+        :return: None
+        """
+        start = time.perf_counter()
+        with open(os.path.join(self.folder, f"{name}.txt"), 'w', encoding=self.encoding, errors='ignore') as f:
+            f.write(content)
+            if hidden:
+                f.write(hide_content)
+            self.size += f.tell()
+        self.timings["write"] += time.perf_counter() - start
+
+    def close(self) -> None:
+        pass
+
+    def abort(self) -> None:
+        pass
+
+    def __enter__(self) -> "ChapterTxtWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
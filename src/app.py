@@ -22,25 +22,36 @@ import time
 from sys import exit
 import platform
 from SLQimao import book
-from SLQimao import clear_screen, red, yellow, green, nullproxies
+from SLQimao import ratelimit
+from SLQimao.store import ChapterStore
+from SLQimao.cache import MetaCache
+from SLQimao.library import Library
+from SLQimao import clear_screen, red, yellow, green, nullproxies, init_console
 import SLQimao
-import requests
 from packaging import version
 import re
 import json
-import hashlib
-from ebooklib import epub
 import sys
 import atexit
 import shutil
+import threading
 
 
 class MainProgram:
     def __init__(self):
+        init_console()
         self.__version__: str = "v4.0.2"                     # 主程序版本
         self.mode: str = ""                                     # 模式
         self.book_id: str = "None"                              # 书籍ID（单本）
         self.books: list = []                                   # 书籍ID（批量）
+        self.workers: int = 4                                   # 批量模式同时下载数量
+        self.processes: int = 0                                 # 解密进程数（0为不使用进程池）
+        self.batch_mode: str = "normal"                         # 批量模式下每本小说的输出模式
+        self.formats: list = []                                 # 多格式模式的输出格式（见Book.formats）
+        self.refresh: bool = False                              # 忽略小说信息与目录缓存
+        self.quiet: bool = False                                # 不显示进度条
+        self.stats_log = None                                   # 分阶段统计文件（JSON-lines，非交互模式--stats）
+        self.profile: bool = False                              # 性能分析（非交互模式--profile）
         self.encoding: str = "utf-8"                            # 编码
         self.path: str = ""                                     # 保存路径
         self.user_folder: str = os.path.expanduser("~")         # 用户文件夹
@@ -49,6 +60,11 @@ class MainProgram:
         os.makedirs(self.data_folder, exist_ok=True)
         self.__rename_old_folder()                              # 重命名旧数据文件夹
         self.eula_path: str = os.path.join(self.data_folder, "eulan.txt")       # EULA文件路径
+        self.temp_folder: str = os.path.join(self.data_folder, "temp")          # 临时文件夹（批量模式）
+        self.store = ChapterStore(os.path.join(self.data_folder, "chapters.db"))  # 已解密章节存储
+        self.cache = MetaCache(os.path.join(self.data_folder, "meta.db"))       # 小说信息与目录缓存
+        self.library = Library(os.path.join(self.data_folder, "library.db"))   # 已下载小说的索引
+        self.library.import_upd(self.data_folder)                               # 导入旧版本的.upd文件
         self.config_path: str = os.path.join(self.data_folder, "config.json")   # 配置文件路径
         self.eula_url: str = "https://gitee.com/xingyv1024/7mao-novel-downloader/raw/main/EULA.md"
         # EULA地址
@@ -56,6 +72,8 @@ class MainProgram:
         # 开源许可证地址
         self.license_url_zh: str = "https://gitee.com/xingyv1024/7mao-novel-downloader/raw/main/LICENSE-ZH.md"
         # 开源许可证中文地址
+        self.release_api_url: str = "https://gitee.com/api/v5/repos/xingyv1024/7mao-novel-downloader/releases/latest"
+        # 最新发行版API地址
         self.start_id: str = "None"                             # 起始章节ID
         self.sock = None                                        # 占位端口
         self.update = False                                     # 更新模式标志
@@ -69,7 +87,8 @@ class MainProgram:
         if hasattr(sys, '_MEIPASS'):
             # noinspection PyProtectedMember
             return os.path.join(sys._MEIPASS, relative_path)
-        return os.path.join(os.path.abspath("assets"), relative_path)
+        # 以程序文件所在目录为准，非交互模式可能在任意目录下运行
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", relative_path)
 
     def __rename_old_folder(self):
         old_data_folder = os.path.join(self.user_folder, "qimao_data")
@@ -112,6 +131,8 @@ class MainProgram:
                 input("按Enter键继续...")
 
     def __check_eula(self):
+        import requests
+
         def agree_eula():
             # noinspection PyBroadException
             try:
@@ -238,10 +259,7 @@ eula_date:
                 return 1
             else:
                 return 0
-        owner = "xingyv1024"
-        repo = "7mao-novel-downloader"
-        api_url = f"https://gitee.com/api/v5/repos/{owner}/{repo}/releases/latest"
-
+        import requests
         print("正在检查更新...")
         print(f"当前版本: {self.__version__}")
 
@@ -254,7 +272,7 @@ eula_date:
         # noinspection PyBroadException
         try:
             # 发送GET请求以获取最新的发行版信息
-            response = requests.get(api_url, timeout=5, proxies=nullproxies)
+            response = requests.get(self.release_api_url, timeout=5, proxies=nullproxies)
 
             if response.status_code != 200:
                 print(f"请求失败，状态码：{response.status_code}")
@@ -361,7 +379,8 @@ QQ： 外1群：149050832  外2群：667146297
             print("7. 查看贡献（赞助）者名单")
             print("8. 撤回同意/重置默认路径")
             print("9. 查看详细版本信息")
-            choice = input("请输入您的选择（1~9）:（默认“1”）\n")
+            print("10. 进入多格式模式（下载一次，同时输出多种格式）")
+            choice = input("请输入您的选择（1~10）:（默认“1”）\n")
 
             # 通过用户选择，决定模式，给mode赋值
             if not choice:
@@ -388,6 +407,11 @@ QQ： 外1群：149050832  外2群：667146297
                 print("您已进入EPUB模式，将输出epub电子书文件。\n")
                 # print("EPUB模式正在开发中，敬请期待\n")
                 break
+            elif choice == '10':
+                self.mode = "multi"
+                clear_screen()
+                print("您已进入多格式模式，小说只下载一次，同时输出您选择的所有格式。\n")
+                break
             elif choice == '5':
                 clear_screen()
                 print("""作者：星隅（shing-yu）
@@ -425,6 +449,7 @@ gitee地址:https://gitee.com/xingyv1024/7mao-novel-downloader
             elif choice == '7':
                 clear_screen()
                 contributors_url = 'https://gitee.com/xingyv1024/7mao-novel-downloader/raw/main/CONTRIBUTORS.md'
+                import requests
                 try:
                     contributors = requests.get(contributors_url, timeout=5, proxies=nullproxies)
 
@@ -524,6 +549,15 @@ None
                     print("请重新在urls.txt中写入链接/ID")
                     continue
                 break
+            # 选择同时下载数量
+            while True:
+                workers = input(f"请输入同时下载的小说数量(默认:{self.workers})：")
+                if not workers:
+                    break
+                if workers.isdigit() and int(workers) > 0:
+                    self.workers = int(workers)
+                    break
+                print("输入无效，请重新输入。")
         else:
             # 输入链接/ID
             while True:
@@ -547,6 +581,9 @@ None
                     if self.mode == "epub":
                         print(yellow + "EPUB模式不支持指定起始章节")
                         input("按Enter键继续...")
+                    elif self.mode == "multi":
+                        print(yellow + "多格式模式不支持指定起始章节")
+                        input("按Enter键继续...")
                     elif self.mode == "chapter":
                         print(yellow + "分章模式不支持指定起始章节ID，请手动删除不需要的章节文件")
                         input("按Enter键继续...")
@@ -562,9 +599,13 @@ None
                             else:
                                 print("无效的输入，请重新输入")
 
+        # 选择输出格式
+        if self.mode == "multi":
+            self.__get_formats()
+
         # 选择编码
         while True:
-            if self.mode == "epub":
+            if self.mode == "epub" or (self.mode == "multi" and self.formats == ["epub"]):
                 break
             txt_encoding_num = input("请输入保存文件所使用的编码(默认:1)：1 -> utf-8 | 2 -> gb2312 | 3-> 输入编码\n")
 
@@ -593,7 +634,7 @@ None
                 break
             else:
                 print("输入无效，请重新输入。")
-        if self.mode != "epub":
+        if self.mode != "epub" and not (self.mode == "multi" and self.formats == ["epub"]):
             print(f"您选择的编码是：{self.encoding}")
 
         # 询问保存路径
@@ -624,6 +665,18 @@ None
                 print("输入无效，请重新输入。")
                 continue
 
+    def __get_formats(self):
+        # 多格式模式：选择输出格式，可多选
+        names = {'1': "txt", '2': "chapter", '3': "epub"}
+        while True:
+            choice = input("请选择输出格式，可多选（例如“13”）(默认:13)：1 -> 整本txt | 2 -> 分章txt | 3 -> epub\n")
+            if not choice:
+                choice = "13"
+            if all(c in names for c in choice):
+                self.formats = list(dict.fromkeys(names[c] for c in choice))
+                break
+            print("输入无效，请重新输入。")
+
     def __get_path(self, custom):
         if custom:
             import tkinter as tk
@@ -652,7 +705,7 @@ None
                 else:
                     with open(self.config_path, "r") as c:
                         config = json.load(c)
-                    config["path"][f"{self.mode}"] = path
+                    config.setdefault("path", {})[f"{self.mode}"] = path
                     with open(self.config_path, "w") as c:
                         json.dump(config, c)
             root.destroy()
@@ -667,7 +720,7 @@ None
             else:
                 with open(self.config_path, "r") as c:
                     config = json.load(c)
-                if f"{self.mode}" in config["path"]:
+                if f"{self.mode}" in config.get("path", {}):
                     return config["path"][f"{self.mode}"]
                 else:
                     if self.mode == "batch" or self.mode == "chapter":
@@ -675,18 +728,58 @@ None
                     else:
                         return "."  # 默认路径为程序所在文件夹
 
-    def __batch_ready(self):
-        with open('urls.txt', 'r', encoding='utf-8') as f:
+    def __configure_http(self):
+        # 连接池大小不小于线程数，保证每个线程都能复用连接
+        from SLQimao import session as http
+        os.makedirs(self.temp_folder, exist_ok=True)
+        http.configure(pool_maxsize=max(self.workers, 10),
+                       hosts={host: max(self.workers, size) for host, size in http.pool_sizes.items()})
+
+    def __record(self, novel: book.Book, format_: str, path: str):
+        # 把下载完成的文件记录到小说索引
+        file_path = {"txt": os.path.join(path, f"{novel.title}.txt"),
+                     "chapter": os.path.join(path, novel.title),
+                     "epub": os.path.join(path, f"{novel.title}.epub")}[format_]
+        self.library.record(novel.book_id, novel.title, file_path, format_,
+                            encoding=novel.encoding if format_ != "epub" else None,
+                            lastcid=novel.catalog[-1]["id"], catalog=novel.catalog_digest(),
+                            sha256=novel.file_hash if format_ == "txt" and novel.file_hash != "None" else None)
+
+    def __new_book(self, book_id: str, **kwargs) -> book.Book:
+        # 使用程序的公共设置创建Book对象
+        kwargs.setdefault("quiet", self.quiet)
+        return book.Book(book_id, stream=True, processes=self.processes, store=self.store, cache=self.cache,
+                         stats_log=self.stats_log, profile=self.profile, **kwargs)
+
+    def __read_config(self) -> dict:
+        # 读取配置文件，不存在时返回空配置
+        if not os.path.exists(self.config_path):
+            return {}
+        with open(self.config_path, "r") as c:
+            return json.load(c)
+
+    def __read_manifest(self, path: str) -> list | None:
+        # 读取每行一个链接/ID的清单文件，存在无法识别的内容时返回None
+        books = []
+        with open(path, 'r', encoding='utf-8') as f:
             urls = f.readlines()
         for i, url in enumerate(urls):
+            url = url.strip()
             if not url:
                 # 跳过空行
                 continue
             book_id = self.__deal_url(url)
             if not book_id:
                 print(red + f"无法识别的内容：第{i + 1}行，{url}")
-                return False
-            self.books.append(book_id)
+                return None
+            books.append(book_id)
+        return books
+
+    def __batch_ready(self):
+        books = self.__read_manifest('urls.txt')
+        if books is None:
+            return False
+        self.books = books
         if not self.books:
             print(red + "urls.txt内容为空，请检查")
             return False
@@ -730,80 +823,134 @@ None
             if not novel_files:
                 print("没有可更新的文件")
                 return
+            from concurrent.futures import ThreadPoolExecutor, as_completed
+            # 第一步：读取每个文件记录的小说ID与目录信息（txt的hash校验可能需要用户确认，逐个进行）
+            entries = []
             for novel_file in novel_files:
-                update(os.path.join(novel_folder, novel_file), novel_file.endswith(".epub"))
+                entry = track(os.path.join(novel_folder, novel_file), novel_file.endswith(".epub"))
+                if entry is not None:
+                    entries.append(entry)
+            if not entries:
+                return
+            self.__configure_http()
+            # 第二步：并发获取所有小说的目录，只保留有变化的小说
+            changed = []
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {executor.submit(check, entry, self.workers > 1): entry for entry in entries}
+                for future in as_completed(futures):
+                    entry = futures[future]
+                    try:
+                        novel = future.result()
+                    except Exception as e:
+                        print(red + f"小说{entry['name']}获取目录失败！Error: {e}")
+                        continue
+                    if novel is None:
+                        print(f"{entry['name']} 已是最新，不需要更新。")
+                    else:
+                        changed.append((entry, novel))
+            print(f"共{len(entries)}本，{len(changed)}本有更新")
+            # 第三步：只下载有变化的小说
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {executor.submit(renew, entry, novel): entry for entry, novel in changed}
+                for future in as_completed(futures):
+                    entry = futures[future]
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(red + f"小说{entry['name']}更新失败！Error: {e}")
+                        continue
+                    print(green + f"{entry['name']} 已更新完成。")
 
-        def update(file_path: str, m_epub):
-            novel_name = None
+        def track(file_path: str, m_epub) -> dict | None:
+            # 从小说索引读取文件记录的更新信息，无法更新时返回None
             try:
+                row = self.library.lookup(file_path, "epub" if m_epub else "txt")
                 if m_epub is True:
-                    # 根据元信息获取小说id
-                    epubo = epub.read_epub(file_path, options={"ignore_ncx": True})
-                    novel_name = epubo.title
-                    book_id = epubo.get_metadata("DC", "bookid")[0][0]
-                    novel = book.Book(book_id)
-                    novel.ready()
-                    novel.toepub(os.path.dirname(file_path), font=self.font_file,
-                                 css1=self.css1_file, css2=self.css2_file)
-                    return
+                    if row is not None:
+                        return {"path": file_path, "epub": True, "name": row["title"], "book_id": row["book_id"],
+                                "lastcid": row["lastcid"], "digest": row["catalog"], "encoding": "utf-8"}
+                    from SLQimao.epubwriter import read_metadata
+                    # 不在索引中时，根据元信息获取小说id
+                    metadata = read_metadata(file_path)
+                    if "bookid" not in metadata:
+                        print(f"{os.path.basename(file_path)} 不是通过此工具下载，无法更新")
+                        return None
+                    # 旧版本生成的epub没有记录目录信息，总是重新下载
+                    return {"path": file_path, "epub": True, "name": metadata.get("title", file_path),
+                            "book_id": metadata["bookid"], "lastcid": metadata.get("lastcid"),
+                            "digest": metadata.get("catalog"), "encoding": "utf-8"}
 
                 txt_file = os.path.basename(file_path)
+                if row is None:
+                    print(f"{txt_file} 不是通过此工具下载，无法更新")
+                    return None
 
-                upd_file_path = os.path.join(self.data_folder, txt_file.replace(".txt", ".upd"))
-                novel_name = txt_file.replace(".txt", "")
-
-                if os.path.exists(upd_file_path):
-
-                    print(f"正在尝试更新: {novel_name}")
-                    # 读取用于更新的文件元数据
-                    with open(upd_file_path, 'r') as file:
-                        lines = file.readlines()
-
-                    # 保存上次更新时间和上次章节id到变量
-                    last_update_time = lines[0].strip()
-                    self.book_id = self.__deal_url(lines[1].strip())
-                    last_chapter_id = lines[2].strip()
-                    encoding = lines[3].strip()
-                    if len(lines) >= 5:
-                        save_sha256 = lines[4].strip()
-                        skip_hash = 0
+                novel_name = row["title"]
+                print(f"正在检查: {novel_name}")
+                if row["sha256"]:
+                    if book.file_sha256(file_path) != row["sha256"]:
+                        print(red + f"{novel_name} hash校验未通过！")
+                        while True:
+                            upd_choice = input(f"这往往意味着文件已被修改，是否继续更新？(yes/no):")
+                            if upd_choice == "yes":
+                                break
+                            elif upd_choice == "no":
+                                print(red + "更新已取消")
+                                return None
+                            else:
+                                print("输入错误，请重新输入")
                     else:
-                        print(yellow + "此小说可能由老版本下载，跳过hash校验")
-                        save_sha256 = None
-                        skip_hash = 1
-                    hash_sha256 = hashlib.sha256()
-                    with open(file_path, "rb") as f:
-                        for chunk in iter(lambda: f.read(4096), b""):
-                            hash_sha256.update(chunk)
-                    fact_sha256 = hash_sha256.hexdigest()
-                    if skip_hash == 0:
-                        if fact_sha256 != save_sha256:
-                            print(red + "hash校验未通过！")
-                            while True:
-                                upd_choice = input(f"这往往意味着文件已被修改，是否继续更新？(yes/no):")
-                                if upd_choice == "yes":
-                                    break
-                                elif upd_choice == "no":
-                                    print(red + "更新已取消")
-                                    return
-                                else:
-                                    print("输入错误，请重新输入")
-                        else:
-                            print(green + "hash校验通过！")
-                    print(f"上次更新时间{last_update_time}")
-                    novel = book.Book(self.book_id)
-                    novel.ready()
-                    if novel.catalog[-1]["id"] == last_chapter_id:
-                        print(f"{novel_name} 已是最新，不需要更新。\n")
-                        return
-                    novel.totxt(os.path.dirname(file_path), encoding)
-                    print(f"{novel_name} 已更新完成。\n")
-                    novel.write_update(self.data_folder)
+                        print(green + "hash校验通过！")
                 else:
-                    print(f"{txt_file} 不是通过此工具下载，无法更新")
+                    print(yellow + "此小说可能由老版本下载，跳过hash校验")
+                print(f"上次更新时间{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row['updated']))}")
+                return {"path": file_path, "epub": False, "name": novel_name, "book_id": row["book_id"],
+                        "lastcid": row["lastcid"], "digest": row["catalog"], "encoding": row["encoding"]}
             except Exception as e:
-                print(red + f"小说{novel_name}更新失败！Error: {e}")
+                print(red + f"读取{os.path.basename(file_path)}的更新信息失败！Error: {e}")
+                return None
+
+        def check(entry: dict, quiet: bool = False) -> book.Book | None:
+            # 只获取目录（忽略缓存），与记录的目录指纹或最新章节ID比较，有变化时返回Book对象
+            # 每本小说使用独立的临时目录，避免并发时文件互相覆盖
+            novel = self.__new_book(entry["book_id"], workdir=os.path.join(self.temp_folder, entry["book_id"]),
+                                    quiet=self.quiet or quiet)
+            novel.get_catalog(refresh=True)
+            if entry["digest"]:
+                return novel if novel.catalog_digest() != entry["digest"] else None
+            if entry["lastcid"]:
+                return novel if novel.catalog[-1]["id"] != entry["lastcid"] else None
+            return novel
+
+        def renew(entry: dict, novel: book.Book) -> None:
+            # 下载有变化的小说并覆盖原文件
+            os.makedirs(novel.workdir, exist_ok=True)
+            novel.get_info()
+            path = os.path.dirname(entry["path"])
+            if entry["epub"]:
+                success = novel.toepub(path, streaming=True, font=self.font_file,
+                                       css1=self.css1_file, css2=self.css2_file)
+            else:
+                success = novel.totxt(path, entry["encoding"])
+            if not success:
+                raise RuntimeError("处理文件失败")
+            self.__record(novel, "epub" if entry["epub"] else "txt", path)
+            shutil.rmtree(novel.workdir, ignore_errors=True)
+
+        def update(file_path: str, m_epub):
+            entry = track(file_path, m_epub)
+            if entry is None:
                 return
+            os.makedirs(self.temp_folder, exist_ok=True)
+            try:
+                novel = check(entry)
+                if novel is None:
+                    print(f"{entry['name']} 已是最新，不需要更新。\n")
+                    return
+                renew(entry, novel)
+                print(f"{entry['name']} 已更新完成。\n")
+            except Exception as e:
+                print(red + f"小说{entry['name']}更新失败！Error: {e}")
 
         # 请用户选择更新模式
         while True:
@@ -819,44 +966,125 @@ None
             else:
                 print("无效的选择，请重新输入。")
 
-    def __download(self):
+    def __download(self) -> bool:
         os.makedirs(self.path, exist_ok=True)
 
         def normal():
             try:
-                novel = book.Book(self.book_id)
-                novel.ready()
-                novel.totxt(self.path, self.encoding, self.start_id)
-                novel.write_update(self.data_folder)
+                novel = self.__new_book(self.book_id)
+                novel.ready(self.refresh)
+                if not novel.totxt(self.path, self.encoding, self.start_id):
+                    return False
+                self.__record(novel, "txt", self.path)
+                return True
             except Exception as e:
                 print(red + f"下载失败！Error: {e}")
+                return False
+
+        titles: dict = {}                   # 批量模式：标题 -> 使用该标题保存的小说ID
+        titles_lock = threading.Lock()
+
+        def batch_one(book_id: str) -> str:
+            # 每本小说使用独立的临时目录，避免并发时文件互相覆盖
+            # 下载失败时保留目录，下次运行可以从断点继续下载
+            workdir = os.path.join(self.temp_folder, book_id)
+            os.makedirs(workdir, exist_ok=True)
+            novel = self.__new_book(book_id, workdir=workdir, quiet=self.quiet or self.workers > 1)
+            novel.ready(self.refresh)
+            # 同一批次中重名的小说会同时写入同一个文件，后开始的在文件名中加上小说ID
+            with titles_lock:
+                if titles.setdefault(novel.title, book_id) != book_id:
+                    print(yellow + f"《{novel.title}》与同一批次中的其他小说重名，保存为《{novel.title}({book_id})》")
+                    novel.title = f"{novel.title}({book_id})"
+                    titles[novel.title] = book_id
+            if self.batch_mode == "multi":
+                success = novel.export(self.path, self.formats, self.encoding, font=self.font_file,
+                                       css1=self.css1_file, css2=self.css2_file)
+                formats = self.formats
+            elif self.batch_mode == "chapter":
+                success = novel.totxt_ecs(self.path, self.encoding)
+                formats = ["chapter"]
+            elif self.batch_mode == "epub":
+                success = novel.toepub(self.path, streaming=True, font=self.font_file, css1=self.css1_file, css2=self.css2_file)
+                formats = ["epub"]
+            else:
+                success = novel.totxt(self.path, self.encoding)
+                formats = ["txt"]
+            if not success:
+                raise RuntimeError("处理文件失败")
+            for format_ in formats:
+                self.__record(novel, format_, self.path)
+            shutil.rmtree(workdir, ignore_errors=True)
+            return novel.title
 
         def batch():
-            for book_id in self.books:
-                try:
-                    novel = book.Book(book_id)
-                    novel.ready()
-                    novel.totxt(self.path, self.encoding)
-                    novel.write_update(self.data_folder)
-                except Exception as e:
-                    print(red + f"下载失败！跳过此小说！Error: {e}")
-                    continue
+            from concurrent.futures import ThreadPoolExecutor, as_completed
+            self.__configure_http()
+            # 去除重复的书籍ID，防止多个线程同时写入同一文件
+            books = list(dict.fromkeys(self.books))
+            succeeded: list = []
+            failed: list = []
+            start_time = time.time()
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {executor.submit(batch_one, book_id): book_id for book_id in books}
+                for future in as_completed(futures):
+                    book_id = futures[future]
+                    try:
+                        title = future.result()
+                    except Exception as e:
+                        print(red + f"下载失败！跳过此小说！ID：{book_id} Error: {e}")
+                        failed.append((book_id, e))
+                        continue
+                    succeeded.append(book_id)
+                    print(green + f"[{len(succeeded) + len(failed)}/{len(books)}] 《{title}》下载完成")
+            # 汇总结果
+            print("批量下载结束" + '-'*20)
+            print(f"共{len(books)}本，耗时{time.time() - start_time:.1f}秒")
+            print(green + f"成功：{len(succeeded)}本")
+            if failed:
+                print(red + f"失败：{len(failed)}本")
+                for book_id, e in failed:
+                    print(red + f"  {book_id}: {e}")
+            return not failed
 
         def chapter():
             try:
-                novel = book.Book(self.book_id)
-                novel.ready()
-                novel.totxt_ecs(self.path, self.encoding)
+                novel = self.__new_book(self.book_id)
+                novel.ready(self.refresh)
+                if not novel.totxt_ecs(self.path, self.encoding):
+                    return False
+                self.__record(novel, "chapter", self.path)
+                return True
             except Exception as e:
                 print(red + f"下载失败！Error: {e}")
+                return False
 
         def epub_():
             try:
-                novel = book.Book(self.book_id)
-                novel.ready()
-                novel.toepub(self.path, font=self.font_file, css1=self.css1_file, css2=self.css2_file)
+                novel = self.__new_book(self.book_id)
+                novel.ready(self.refresh)
+                if not novel.toepub(self.path, streaming=True, font=self.font_file, css1=self.css1_file,
+                                    css2=self.css2_file):
+                    return False
+                self.__record(novel, "epub", self.path)
+                return True
             except Exception as e:
                 print(red + f"下载失败！Error: {e}")
+                return False
+
+        def multi():
+            try:
+                novel = self.__new_book(self.book_id)
+                novel.ready(self.refresh)
+                if not novel.export(self.path, self.formats, self.encoding, font=self.font_file,
+                                    css1=self.css1_file, css2=self.css2_file):
+                    return False
+                for format_ in self.formats:
+                    self.__record(novel, format_, self.path)
+                return True
+            except Exception as e:
+                print(red + f"下载失败！Error: {e}")
+                return False
 
         # match self.mode:
         #     case "normal":
@@ -868,19 +1096,239 @@ None
         #     case "epub":
         #         epub_()
         if self.mode == "normal":
-            normal()
+            return normal()
         elif self.mode == "batch":
-            batch()
+            return batch()
         elif self.mode == "chapter":
-            chapter()
+            return chapter()
         elif self.mode == "epub":
-            epub_()
+            return epub_()
+        elif self.mode == "multi":
+            return multi()
+        return False
+
+    def __apply_config(self):
+        config = self.__read_config()
+        # 下载限速（字节/秒），在配置文件中设置"bandwidth"，0或不设置为不限速
+        ratelimit.set_bandwidth(config.get("bandwidth"))
+        # 解密进程数，在配置文件中设置"processes"，大于1时使用多进程解密
+        self.processes = config.get("processes", 0)
+        # 小说信息与目录缓存的有效期（秒），在配置文件中设置"meta_ttl"
+        self.cache.ttl = config.get("meta_ttl", self.cache.ttl)
+        # 已解密章节存储，在配置文件中设置"store": false关闭；"store_ttl"为未使用多久（秒）后删除，
+        # "store_max_bytes"为总大小上限（字节），超过时按小说淘汰最久未使用的
+        if not config.get("store", True):
+            self.__disable_store()
+        elif self.store is not None:
+            self.store.ttl = config.get("store_ttl", self.store.ttl)
+            self.store.max_bytes = config.get("store_max_bytes", self.store.max_bytes)
+            self.store.prune()
+
+    def __disable_store(self):
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def __eula_agreed(self) -> bool:
+        # 只读取本地的同意记录，不联网获取EULA
+        if not os.path.exists(self.eula_path):
+            return False
+        with open(self.eula_path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        return len(lines) > 3 and lines[3] == "yes"
+
+    def __latest_version(self, result: dict):
+        # 获取最新发行版版本号，结果写入result["tag_name"]，失败时忽略
+        # noinspection PyBroadException
+        try:
+            import requests
+            response = requests.get(self.release_api_url, timeout=5, proxies=nullproxies)
+            result["tag_name"] = response.json()["tag_name"]
+        except Exception:
+            pass
+
+    def run_headless(self, argv: list) -> int:
+        """
+        非交互模式：从命令行参数读取模式、链接/ID、编码和保存路径后直接下载\n
+        不占用端口、不显示菜单，使用本地记录的EULA同意状态，检查更新在后台进行且不阻塞下载
+        :param argv: 命令行参数
+        :return: 退出码，0为全部成功
+        """
+        import argparse
+        parser = argparse.ArgumentParser(prog="app.py", description="星弦小说下载器七猫版（非交互模式）")
+        parser.add_argument("books", nargs="*", help="小说链接或ID，可以有多个")
+        parser.add_argument("-m", "--mode", default="normal",
+                            help="输出模式：normal 整本txt，chapter 分章txt，epub 电子书（默认normal）；"
+                                 "用逗号分隔多个模式（例如normal,epub）时只下载一次，同时输出多种格式")
+        parser.add_argument("-f", "--manifest", help="每行一个链接/ID的清单文件（与批量模式的urls.txt格式相同）")
+        parser.add_argument("-e", "--encoding", default="utf-8", help="txt文件编码（默认utf-8）")
+        parser.add_argument("-o", "--output", help="保存路径（默认使用该模式的默认保存路径）")
+        parser.add_argument("-w", "--workers", type=int, default=self.workers,
+                            help=f"同时下载的小说数量（默认{self.workers}）")
+        parser.add_argument("--start", help="起始章节ID（仅单本normal模式）")
+        parser.add_argument("--refresh", action="store_true", help="忽略小说信息与目录缓存")
+        parser.add_argument("--progress", action="store_true", help="显示进度条（默认不显示）")
+        parser.add_argument("--no-update-check", action="store_true", help="不检查更新")
+        parser.add_argument("--stats", metavar="文件",
+                            help="把每本小说各阶段的耗时、字节数与章节数追加写入JSON-lines文件")
+        parser.add_argument("--profile", action="store_true",
+                            help="性能分析：记录每本小说从获取信息到写入文件的CPU耗时与内存分配，结果保存在输出文件旁边")
+        parser.add_argument("--list", nargs="?", const="", metavar="关键词",
+                            help="列出已下载的小说（可按标题关键词或小说ID筛选）后退出")
+        parser.add_argument("--duplicates", action="store_true", help="列出重复下载的小说后退出")
+        parser.add_argument("--no-store", action="store_true",
+                            help="不使用已解密章节存储（不读取也不保存章节，也可以在配置文件中设置\"store\": false）")
+        parser.add_argument("--clear-store", action="store_true", help="清空已解密章节存储后退出")
+        parser.add_argument("--serve", nargs="?", const="127.0.0.1:52512", metavar="地址:端口",
+                            help="常驻服务模式：在本地HTTP接口上接收下载任务（默认127.0.0.1:52512），按Ctrl+C退出")
+        parser.add_argument("--token", default=os.environ.get("SLQIMAO_TOKEN"),
+                            help="常驻服务的访问令牌（也可以用环境变量SLQIMAO_TOKEN设置），监听非本机地址时必须设置")
+        args = parser.parse_args(argv)
+
+        if args.list is not None or args.duplicates:
+            return self.__show_library(args.list, args.duplicates)
+        if args.clear_store:
+            self.store.clear()
+            print(green + "已清空章节存储")
+            return 0
+
+        if not self.__eula_agreed():
+            print(red + "您尚未同意最终用户许可协议（EULA），请先以交互模式运行一次程序并同意")
+            return 2
+        try:
+            "测试".encode(args.encoding)
+        except LookupError:
+            parser.error(f"无效的编码：{args.encoding}")
+        if args.workers < 1:
+            parser.error("同时下载的小说数量至少为1")
+        if args.serve is not None:
+            host, _, port = args.serve.rpartition(":")
+            if not port.isdigit():
+                parser.error(f"无效的地址：{args.serve}")
+            from SLQimao.service import is_loopback
+            if not is_loopback(host or "127.0.0.1"):
+                if not args.token:
+                    parser.error(f"监听非本机地址（{host}）时必须用--token设置访问令牌")
+                print(red + f"警告：服务监听{host}，其他设备可以访问，请确保令牌不被泄露")
+            self.__apply_config()
+            if args.no_store:
+                self.__disable_store()
+            self.workers = args.workers
+            self.refresh = args.refresh
+            return self.__serve(host or "127.0.0.1", int(port), args.output, args.token)
+        formats = {"normal": "txt", "chapter": "chapter", "epub": "epub"}
+        modes = list(dict.fromkeys(m.strip() for m in args.mode.split(",") if m.strip()))
+        if not modes or any(m not in formats for m in modes):
+            parser.error(f"无效的输出模式：{args.mode}（可选normal、chapter、epub）")
+        if len(modes) > 1:
+            self.formats = [formats[m] for m in modes]
+            args.mode = "multi"
+        books = []
+        for url in args.books:
+            book_id = self.__deal_url(url.strip())
+            if not book_id:
+                parser.error(f"无法识别的内容：{url}")
+            books.append(book_id)
+        if args.manifest:
+            manifest = self.__read_manifest(args.manifest)
+            if manifest is None:
+                return 2
+            books += manifest
+        if not books:
+            parser.error("请提供小说链接/ID或清单文件")
+
+        # 在后台检查更新，下载结束后再提示
+        latest: dict = {}
+        if not args.no_update_check and not any(s in self.__version__ for s in ('dev', 'alpha', 'beta')):
+            threading.Thread(target=self.__latest_version, args=(latest,), daemon=True).start()
+
+        self.__apply_config()
+        if args.no_store:
+            self.__disable_store()
+        self.encoding = args.encoding
+        self.workers = args.workers
+        self.refresh = args.refresh
+        self.quiet = not args.progress
+        self.profile = args.profile
+        if self.profile and self.workers > 1 and len(books) > 1:
+            # 内存分析是进程级的，同时下载多本时结果会混在一起
+            print(yellow + "性能分析模式下每次只下载一本小说")
+            self.workers = 1
+        if len(books) == 1:
+            self.mode = args.mode
+            self.book_id = books[0]
+            self.start_id = args.start or "None"
+        else:
+            self.mode = "batch"
+            self.batch_mode = args.mode
+            self.books = books
+        self.path = args.output or self.__get_path(custom=False)
+        if args.stats:
+            from SLQimao.stats import StatsLog
+            self.stats_log = StatsLog(args.stats)
+        try:
+            success = self.__download()
+        finally:
+            if self.stats_log is not None:
+                self.stats_log.close()
+
+        if "tag_name" in latest and version.parse(self.__version__) < version.parse(latest["tag_name"]):
+            print(yellow + f"检测到新版本{latest['tag_name']}，请到 "
+                           f"https://gitee.com/xingyv1024/7mao-novel-downloader/releases/latest 下载最新版")
+        return 0 if success else 1
+
+    def __serve(self, host: str, port: int, output: str | None, token: str | None) -> int:
+        # 常驻服务模式：共用连接池、缓存与线程池处理通过HTTP提交的任务，不检查更新、不占用单实例端口
+        from SLQimao.service import DownloadService
+        self.quiet = True
+        self.mode = "batch"
+        self.__configure_http()
+        try:
+            service = DownloadService(output or self.__get_path(custom=False), workdir=self.temp_folder,
+                                      workers=self.workers, resolve=self.__deal_url, on_success=self.__record,
+                                      new_book=lambda book_id, workdir: self.__new_book(book_id, workdir=workdir),
+                                      epub_assets={"font": self.font_file, "css1": self.css1_file,
+                                                   "css2": self.css2_file},
+                                      refresh=self.refresh, host=host, port=port, token=token)
+        except OSError as e:
+            print(red + f"无法监听{host}:{port}：{e}")
+            return 2
+        print(green + f"服务已启动：{service.url}（同时下载{self.workers}本），按Ctrl+C退出")
+        try:
+            service.serve_forever()
+        except KeyboardInterrupt:
+            print(yellow + "正在停止服务，等待进行中的下载完成")
+        finally:
+            service.stop()
+        return 0
+
+    def __show_library(self, keyword: str | None, duplicates: bool) -> int:
+        # 非交互模式：列出小说索引中的记录
+        def show(rows: list):
+            for row in rows:
+                updated = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row["updated"]))
+                print(f"{row['book_id']:<10} {row['format']:<7} {updated}  {row['title']}  "
+                      f"{row['path'] or '（路径未知，由.upd导入）'}")
+
+        if keyword is not None:
+            rows = self.library.find(keyword) if keyword.isdigit() else (
+                self.library.search(keyword) if keyword else self.library.all())
+            show(rows)
+            print(f"共{len(rows)}条记录")
+        if duplicates:
+            groups = self.library.duplicates()
+            for (book_id, format_), rows in groups.items():
+                print(yellow + f"{book_id}（{format_}）保存了{len(rows)}份：")
+                show(rows)
+            print(f"共{len(groups)}本小说存在重复下载")
+        return 0
 
     def run(self):
         self.__check_instance()
         self.__check_eula()
         self.__check_update()
         self.__clear_old()
+        self.__apply_config()
         while True:
             self.__give_menu()
             try:
@@ -901,10 +1349,17 @@ None
 
 
 if __name__ == "__main__":
+    # 打包后的程序使用多进程解密时需要
+    from multiprocessing import freeze_support
+    freeze_support()
+
     def free_port():
         # 退出时释放端口
         if main.sock:
             main.sock.close()
     atexit.register(free_port)
     main = MainProgram()
+    if len(sys.argv) > 1:
+        # 带参数运行时使用非交互模式
+        exit(main.run_headless(sys.argv[1:]))
     main.run()
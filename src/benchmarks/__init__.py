@@ -0,0 +1,4 @@
+"""
+性能基准测试\n
+在src目录下以模块方式运行，例如: python -m benchmarks.bench_decrypt
+"""
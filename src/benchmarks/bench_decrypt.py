@@ -0,0 +1,56 @@
+"""
+章节解密基准测试\n
+对比旧版Book._decrypt（hex往返转换、每次重建密钥）与crypto.decrypt/decrypt_many\n
+用法（在src目录下）: python -m benchmarks.bench_decrypt [-n 章节数] [-s 每章字符数] [-r 重复次数]
+"""
+import argparse
+import timeit
+from base64 import b64decode
+from Crypto.Cipher import AES  # noqa
+from Crypto.Util.Padding import unpad  # noqa
+from SLQimao.crypto import decrypt, decrypt_many
+from benchmarks import synthetic
+
+
+def legacy_decrypt(origin: str) -> str:
+    # 4.0.2版本Book._decrypt的原始实现
+    txt = b64decode(origin)
+    iv = txt[:16].hex()
+    data = txt[16:].hex()
+    dkey = bytes.fromhex('32343263636238323330643730396531')
+    iv = bytes.fromhex(iv)
+    cipher = AES.new(dkey, AES.MODE_CBC, iv=iv)
+    decrypted = unpad(cipher.decrypt(bytes.fromhex(data)), AES.block_size)
+    decrypted = decrypted.decode('utf-8').strip()
+    return decrypted
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="章节解密基准测试")
+    parser.add_argument("-n", "--chapters", type=int, default=2000, help="章节数")
+    parser.add_argument("-s", "--size", type=int, default=3000, help="每章字符数")
+    parser.add_argument("-r", "--repeat", type=int, default=7, help="重复次数（取最小值）")
+    args = parser.parse_args()
+
+    data = synthetic.chapters(args.chapters, args.size)
+    data_bytes = [d.encode() for d in data]
+    # 结果必须一致
+    assert [legacy_decrypt(d) for d in data] == decrypt_many(data) == decrypt_many(data_bytes)
+
+    cases = {
+        "legacy Book._decrypt": lambda: [legacy_decrypt(d) for d in data],
+        "crypto.decrypt": lambda: [decrypt(d) for d in data],
+        "crypto.decrypt_many": lambda: decrypt_many(data),
+        "crypto.decrypt_many(bytes)": lambda: decrypt_many(data_bytes),
+    }
+    print(f"{args.chapters}章 x {args.size}字，重复{args.repeat}次取最小值")
+    baseline = None
+    for name, func in cases.items():
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        if baseline is None:
+            baseline = best
+        print(f"{name:<28} {best * 1000:9.2f} ms  {best / args.chapters * 1e6:8.2f} us/章  x{baseline / best:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+epub生成基准测试\n
+在合成的小说（默认3000章）上对比：ebooklib逐章构建（toepub(streaming=False)）与EpubWriter流式写入（toepub的默认方式）\n
+章节内容直接从内存提供，不包含下载与解密的时间\n
+用法（在src目录下）: python -m benchmarks.bench_epub [-n 章节数] [-s 每章字符数] [-r 重复次数]
+"""
+import argparse
+import os
+import tempfile
+import time
+import warnings
+from SLQimao.book import Book
+from benchmarks import synthetic
+
+
+def make_book(texts: list, workdir: str) -> Book:
+    book = Book("0", workdir=workdir, quiet=True)
+    book.title = "合成小说"
+    book.author = "benchmark"
+    book.intro = "synthetic"
+    book.catalog = [{"id": str(i), "title": f"第{i + 1}章 标题", "content_md5": f"{i:032x}"}
+                    for i in range(len(texts))]
+    # 章节内容直接从内存提供
+    book._iter_chapters = lambda chapters: zip(chapters, texts)
+    return book
+
+
+def run(texts: list, streaming: bool, workdir: str) -> float:
+    book = make_book(texts, workdir)
+    file_path = os.path.join(workdir, f"{book.title}.epub")
+    start = time.perf_counter()
+    if streaming:
+        book._write_epub_streaming(file_path, len(texts), b"cover", [], [])
+    else:
+        book._write_epub(file_path, len(texts), b"cover", [], [])
+    elapsed = time.perf_counter() - start
+    os.remove(file_path)
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="epub生成基准测试")
+    parser.add_argument("-n", "--chapters", type=int, default=3000, help="章节数")
+    parser.add_argument("-s", "--size", type=int, default=3000, help="每章字符数")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="重复次数（取最小值）")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore")
+
+    texts = [synthetic.chapter_text(args.size, seed=i) for i in range(args.chapters)]
+    cases = {
+        "ebooklib": False,
+        "EpubWriter": True,
+    }
+    print(f"{args.chapters}章 x {args.size}字，重复{args.repeat}次取最小值")
+    baseline = None
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, streaming in cases.items():
+            best = min(run(texts, streaming, workdir) for _ in range(args.repeat))
+            if baseline is None:
+                baseline = best
+            print(f"{name:<24} {best * 1000:9.2f} ms  {best / args.chapters * 1e6:8.2f} us/章  x{baseline / best:.2f}")
+
+
+if __name__ == "__main__":
+    main()
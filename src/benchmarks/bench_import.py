@@ -0,0 +1,85 @@
+"""
+导入耗时基准测试\n
+使用 python -X importtime 测量导入各模块的耗时，并检查导入时没有加载较慢的依赖\n
+存在被提前导入的依赖，或耗时超过 --max-ms 时以非0退出码结束，可用于防止启动速度退化\n
+用法（在src目录下）: python -m benchmarks.bench_import [-r 重复次数] [--max-ms 上限] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# 被测模块
+modules = ["SLQimao", "SLQimao.book", "app"]
+# 只应在用到时才导入的依赖
+deferred = ["requests", "urllib3", "rich", "ebooklib", "Crypto", "colorama",
+            "concurrent.futures", "multiprocessing", "sqlite3", "zipfile"]
+# 允许导入sqlite3的模块（app在启动时打开章节存储与缓存）
+allowed = {"app": {"sqlite3"}}
+
+src = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def importtime(statement: str) -> list:
+    """
+    运行 python -X importtime 并解析输出
+    :param statement: 执行的语句
+    :return: [(模块名, 缩进层级, 累计耗时us)]
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            cwd=src, capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), (len(name) - len(name.lstrip())) // 2, int(cumulative)))
+    return rows
+
+
+def measure(module: str, repeat: int) -> dict:
+    """
+    测量导入某个模块的耗时与新加载的模块
+    :param module: 模块名
+    :param repeat: 重复次数
+    :return: 测量结果
+    """
+    baseline = {name for name, _, _ in importtime("pass")}
+    times = []
+    loaded = set()
+    for _ in range(repeat):
+        rows = importtime(f"import {module}")
+        times.append(sum(cumulative for name, level, cumulative in rows if level == 0 and name not in baseline))
+        loaded = {name for name, _, _ in rows} - baseline
+    early = sorted(dep for dep in deferred if dep in loaded and dep not in allowed.get(module, set()))
+    return {
+        "module": module,
+        "median_ms": statistics.median(times) / 1000,
+        "min_ms": min(times) / 1000,
+        "modules_loaded": len(loaded),
+        "eager_heavy_imports": early,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="导入耗时基准测试")
+    parser.add_argument("-r", "--repeat", type=int, default=7, help="重复次数（取中位数）")
+    parser.add_argument("--max-ms", type=float, default=None, help="导入耗时上限（毫秒），超过时以非0退出码结束")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    args = parser.parse_args()
+
+    results = [measure(module, args.repeat) for module in modules]
+    failed = [r for r in results if r["eager_heavy_imports"] or (args.max_ms and r["median_ms"] > args.max_ms)]
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        for r in results:
+            print(f"{r['module']:<14} 中位数 {r['median_ms']:7.2f} ms  最小 {r['min_ms']:7.2f} ms  "
+                  f"新加载模块 {r['modules_loaded']:4d}  提前导入: {', '.join(r['eager_heavy_imports']) or '无'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+离线端到端压力测试\n
+启动本地替身服务器（benchmarks/standin.py），用Book下载一批合成小说，分别测试每种输出模式\n
+报告每分钟处理的小说数、吞吐量（MB/s）以及各阶段（ready、下载、输出）的延迟\n
+吞吐量分两种：下载吞吐量 = 缓存文件字节数 / 各本transfer阶段（BookStats）耗时之和，即单个下载连接的平均速度；
+端到端吞吐量 = 缓存文件字节数 / 整轮的墙钟时间（包括ready、解密与写入）\n
+用法（在src目录下）: python -m benchmarks.bench_load [-b 小说数] [-n 章节数] [-s 每章字符数] [-w 同时下载数]
+                    [-m 模式 ...] [-p 解密进程数] [--latency 秒] [--json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from SLQimao import session as http
+from SLQimao.book import Book
+from benchmarks.standin import StandinServer
+
+# 输出模式: Book的输出方法
+modes: dict = {
+    "normal": lambda book, path: book.totxt(path),
+    "chapter": lambda book, path: book.totxt_ecs(path),
+    "epub": lambda book, path: book.toepub(path, streaming=True),
+    "multi": lambda book, path: book.export(path, ["txt", "chapter", "epub"]),
+}
+stages: tuple = ("ready", "download", "write", "total")
+
+
+def run_book(book_id: str, mode: str, workdir: str, processes: int) -> dict:
+    timings = {}
+    start = time.perf_counter()
+    book = Book(book_id, workdir=workdir, quiet=True, stream=True, processes=processes)
+    book.ready()
+    timings["ready"] = time.perf_counter() - start
+    mark = time.perf_counter()
+    book._prepare()
+    timings["download"] = time.perf_counter() - mark
+    mark = time.perf_counter()
+    if not modes[mode](book, os.path.join(workdir, "output")):
+        raise RuntimeError(f"{book_id}处理失败")
+    timings["write"] = time.perf_counter() - mark
+    timings["total"] = time.perf_counter() - start
+    transfer = book.stats.to_dict()["stages"].get("transfer", {"seconds": 0.0, "bytes": 0})
+    return {"timings": timings, "transfer_seconds": transfer["seconds"], "transfer_bytes": transfer["bytes"]}
+
+
+def summarize(values: list) -> dict:
+    values = sorted(values)
+    return {
+        "mean": statistics.fmean(values),
+        "p50": values[len(values) // 2],
+        "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+        "max": values[-1],
+    }
+
+
+def run_mode(server: StandinServer, mode: str, book_ids: list, workers: int, processes: int) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        os.makedirs(os.path.join(workdir, "output"))
+        start = time.perf_counter()
+        # Book的提示信息输出到stderr，保持stdout中的报告（JSON）干净
+        with contextlib.redirect_stdout(sys.stderr), ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda book_id: run_book(book_id, mode, workdir, processes), book_ids))
+        wall = time.perf_counter() - start
+    zip_bytes = sum(len(server.book(book_id)["zip"]) for book_id in book_ids)
+    transfer_bytes = sum(result["transfer_bytes"] for result in results)
+    transfer_seconds = sum(result["transfer_seconds"] for result in results)
+    return {
+        "mode": mode,
+        "books": len(book_ids),
+        "seconds": wall,
+        "books_per_min": len(book_ids) / wall * 60,
+        "transfer_mb_per_s": transfer_bytes / transfer_seconds / 1e6 if transfer_seconds else None,
+        "end_to_end_mb_per_s": zip_bytes / wall / 1e6,
+        "latency": {stage: summarize([result["timings"][stage] for result in results]) for stage in stages},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="离线端到端压力测试")
+    parser.add_argument("-b", "--books", type=int, default=8, help="每种模式下载的小说数")
+    parser.add_argument("-n", "--chapters", type=int, default=300, help="每本小说的章节数")
+    parser.add_argument("-s", "--size", type=int, default=3000, help="每章字符数")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="同时下载的小说数")
+    parser.add_argument("-m", "--modes", nargs="+", choices=list(modes), default=list(modes), help="输出模式")
+    parser.add_argument("-p", "--processes", type=int, default=0, help="解密进程数（同Book的processes）")
+    parser.add_argument("--latency", type=float, default=0, help="替身服务器每个请求的额外延迟，单位秒")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出结果")
+    args = parser.parse_args()
+
+    api = (Book.api_bc, Book.api_ks)
+    http.configure(pool_maxsize=max(args.workers, 10))
+    with StandinServer(chapters=args.chapters, size=args.size, latency=args.latency) as server:
+        Book.api_bc = Book.api_ks = server.url
+        try:
+            reports = []
+            for i, mode in enumerate(args.modes):
+                # 每种模式使用不同的小说，提前生成数据，生成时间不计入结果
+                book_ids = [str(100000 + i * args.books + j) for j in range(args.books)]
+                for book_id in book_ids:
+                    server.book(book_id)
+                reports.append(run_mode(server, mode, book_ids, args.workers, args.processes))
+        finally:
+            Book.api_bc, Book.api_ks = api
+
+    if args.json:
+        print(json.dumps({"config": vars(args), "results": reports}, ensure_ascii=False, indent=2))
+        return
+    print(f"{args.books}本 x {args.chapters}章 x {args.size}字，同时下载{args.workers}本，"
+          f"解密进程{args.processes}，请求延迟{args.latency}秒")
+    for report in reports:
+        transfer = report["transfer_mb_per_s"]
+        print(f"\n[{report['mode']}] 耗时{report['seconds']:.2f}秒  {report['books_per_min']:.1f}本/分钟  "
+              f"下载{f'{transfer:.2f} MB/s' if transfer is not None else '-'}  "
+              f"端到端{report['end_to_end_mb_per_s']:.2f} MB/s")
+        for stage in stages:
+            latency = report["latency"][stage]
+            print(f"  {stage:<9} 平均{latency['mean'] * 1000:9.1f} ms  p50{latency['p50'] * 1000:9.1f} ms  "
+                  f"p95{latency['p95'] * 1000:9.1f} ms  最大{latency['max'] * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
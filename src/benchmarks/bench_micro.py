@@ -0,0 +1,270 @@
+"""
+逐章节、逐请求路径的微基准测试\n
+覆盖Book._decrypt、Book._sign/sign_url、Book._get_headers/get_headers、Book._rename，以及totxt、totxt_ecs、toepub的合并循环\n
+输入由synthetic固定种子生成，每项重复多次，报告最小值、中位数、平均值与标准差，可以输出JSON并对比两个版本\n
+合并循环通过公开的totxt、totxt_ecs、toepub测试：章节来自预先解密好的文件（每次调用前链接到该版本读取的位置，
+这部分耗时单独记为stage_files），封面来自本地替身服务器，因此同一份测试代码也能测试旧版本\n
+用法（在src目录下）:
+    python -m benchmarks.bench_micro [-n 章节数] [-s 每章字符数] [-r 重复次数] [-k 名称 ...] [--json 文件]
+    python -m benchmarks.bench_micro --compare 旧.json 新.json [--threshold 0.1]
+    python -m benchmarks.bench_micro --rev v4.0.2      # 用当前的测试代码分别测试指定版本与工作区，并对比
+对比时某项的最小值变慢超过threshold（默认10%），且两次测试各轮结果的范围不重叠（排除波动）才视为退化，退出码为1
+"""
+import argparse
+import contextlib
+import inspect
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import timeit
+from SLQimao import book as book_module
+from SLQimao.book import Book
+from benchmarks import synthetic
+from benchmarks.standin import StandinServer
+
+params: dict = {"id": "1234567", "source": 1, "type": 2, "is_vip": 1}
+min_rounds: int = 5     # 判断差异是否显著所需的最少轮数
+
+
+def make_book(texts: list, workdir: str, cover: str) -> tuple:
+    """
+    创建合并循环使用的Book，只使用各版本都有的构造参数、属性与方法\n
+    _gaunade（下载、解压、解密，各版本都有）替换为把预先解密好的章节文件链接到该版本读取的文件夹，
+    文件在合并结束后由Book自己删除
+    :param texts: 各章内容
+    :param workdir: 工作文件夹（同时是当前工作目录，旧版本使用相对路径）
+    :param cover: 封面链接
+    :return: (Book, 准备章节文件的函数, 章节文件夹)
+    """
+    supported = inspect.signature(Book).parameters
+    book = Book("1234567", **{key: value for key, value in {"workdir": workdir, "quiet": True}.items()
+                              if key in supported})
+    book.title = "合成小说"
+    book.author = "benchmark"
+    book.intro = "synthetic"
+    book.basecontent = f"{book.title}\n作者：{book.author}\n简介：{book.intro}\n"
+    book.img_url = cover
+    book.catalog = [{"id": str(i), "title": f"第{i + 1}章 标题", "content_md5": f"{i:032x}"}
+                    for i in range(len(texts))]
+    source = os.path.join(workdir, "extracted")
+    os.makedirs(source)
+    names = [f"{chapter['id']}.txt" for chapter in book.catalog]
+    for name, text in zip(names, texts):
+        with open(os.path.join(source, name), 'w', encoding='utf-8') as f:
+            f.write(text)
+    folder = getattr(book, "folder", book.book_id)
+
+    def stage() -> int:
+        os.makedirs(folder, exist_ok=True)
+        for name_ in names:
+            os.link(os.path.join(source, name_), os.path.join(folder, name_))
+        return len(names)
+
+    book._gaunade = stage
+    return book, stage, folder
+
+
+def cases(chapters: int, size: int, workdir: str, cover: str) -> dict:
+    """
+    生成测试项
+    :param chapters: 章节数
+    :param size: 每章字符数
+    :param workdir: 合并循环的输出文件夹
+    :param cover: 封面链接
+    :return: {名称: (函数, 每次调用的操作数)}
+    """
+    data = synthetic.chapters(chapters, size)
+    texts = [synthetic.chapter_text(size, seed=i) for i in range(chapters)]
+    titles = [f"第{i + 1}章 {'是/否？' if i % 2 else '标题'}:\"{i}\"<*>|" for i in range(chapters)]
+    book, stage, folder = make_book(texts, workdir, cover)
+    book_ids = [str(1000000 + i) for i in range(100)]
+    books = [Book(book_id) for book_id in book_ids]
+    epub = {"streaming": True} if "streaming" in inspect.signature(Book.toepub).parameters else {}
+    return {
+        "decrypt": (lambda: [Book._decrypt(d) for d in data], chapters),
+        "sign": (lambda: book._sign(dict(params)), 1),
+        "sign_url": (lambda: book_module.sign_url(dict(params)), 1),
+        "get_headers": (lambda: [b._get_headers() for b in books], len(books)),
+        "get_headers_func": (lambda: [book_module.get_headers(book_id) for book_id in book_ids], len(book_ids)),
+        "rename": (lambda: [Book._rename(title) for title in titles], chapters),
+        "stage_files": (lambda: (stage(), shutil.rmtree(folder)), chapters),
+        "merge_txt": (lambda: book.totxt(workdir), chapters),
+        "merge_chapter": (lambda: book.totxt_ecs(workdir), chapters),
+        "merge_epub": (lambda: book.toepub(workdir, **epub), chapters),
+    }
+
+
+def measure(func, ops: int, repeat: int) -> dict:
+    """
+    测试一项：先用autorange确定每轮调用次数（每轮至少0.2秒），再重复repeat轮
+    :return: 统计结果，时间单位为秒/操作
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = [t / number / ops for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "ops": ops,
+        "number": number,
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "times": times,
+    }
+
+
+def revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(book_module.__file__)).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> dict:
+    results = {}
+    errors = {}
+    # 旧版本把章节解压到当前工作目录下，切换到临时文件夹
+    with tempfile.TemporaryDirectory() as workdir, contextlib.chdir(workdir), StandinServer() as server:
+        for name, (func, ops) in cases(args.chapters, args.size, workdir,
+                                       f"{server.url}/cover/1234567.jpg").items():
+            if args.keyword and not any(k in name for k in args.keyword):
+                continue
+            try:
+                # Book的提示信息会影响计时，丢弃
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    results[name] = measure(func, ops, args.repeat)
+            except Exception as e:
+                # 旧版本可能缺少某些方法，记录错误并继续
+                errors[name] = f"{type(e).__name__}: {e}"
+    return {
+        "label": args.label or revision(),
+        "python": platform.python_version(),
+        "config": {"chapters": args.chapters, "size": args.size, "repeat": args.repeat},
+        "results": results,
+        "errors": errors,
+    }
+
+
+def show(report: dict) -> None:
+    config = report["config"]
+    print(f"[{report['label']}] {config['chapters']}章 x {config['size']}字，重复{config['repeat']}轮，"
+          f"Python {report['python']}")
+    for name, result in report["results"].items():
+        print(f"  {name:<18} 中位数{result['median'] * 1e6:10.2f} us  最小{result['min'] * 1e6:10.2f} us  "
+              f"标准差{result['stdev'] / result['median'] * 100:5.1f}%")
+    for name, error in report["errors"].items():
+        print(f"  {name:<18} 失败: {error}")
+
+
+def significant(before: dict, after: dict) -> bool:
+    """
+    两次测试的差异是否超出波动范围：各轮结果的范围不重叠（各7轮时偶然不重叠的概率约为0.06%）\n
+    任一方少于min_rounds轮时无法判断，视为不显著；没有各轮结果的旧JSON只能按最小值判断，总是视为显著
+    :param before: 旧结果中的一项
+    :param after: 新结果中的一项
+    :return: 是否显著
+    """
+    if "times" not in before or "times" not in after:
+        return True
+    if min(len(before["times"]), len(after["times"])) < min_rounds:
+        return False
+    return min(after["times"]) > max(before["times"]) or max(after["times"]) < min(before["times"])
+
+
+def compare(old: dict, new: dict, threshold: float) -> bool:
+    """
+    对比两次测试结果（按最小值，受系统干扰最少）\n
+    变慢超过threshold且差异显著（见significant）才视为退化，超过threshold但不显著的标为波动
+    :param old: 旧结果
+    :param new: 新结果
+    :param threshold: 允许的变慢比例
+    :return: 是否没有退化
+    """
+    print(f"{old['label']} -> {new['label']}（变慢超过{threshold:.0%}且超出波动范围视为退化）")
+    if old["config"] != new["config"]:
+        print(f"注意：两次测试的参数不同：{old['config']} / {new['config']}")
+    passed = True
+    for name in [*old["results"], *(name for name in new["results"] if name not in old["results"])]:
+        if name not in old["results"] or name not in new["results"]:
+            print(f"  {name:<18} 只存在于{'新' if name in new['results'] else '旧'}结果中")
+            continue
+        before, after = old["results"][name]["min"], new["results"][name]["min"]
+        ratio = after / before
+        slower = ratio > 1 + threshold
+        regressed = slower and significant(old["results"][name], new["results"][name])
+        passed = passed and not regressed
+        print(f"  {name:<18} {before * 1e6:10.2f} us -> {after * 1e6:10.2f} us  x{ratio:.2f}"
+              f"{'  退化' if regressed else '  波动' if slower else ''}")
+    return passed
+
+
+def run_revision(rev: str, argv: list) -> dict:
+    """
+    用当前的测试代码测试指定版本：从git导出该版本的SLQimao包，在子进程中优先导入
+    :param rev: git版本
+    :param argv: 传给子进程的测试参数
+    :return: 测试结果
+    """
+    src = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as temp:
+        archive = os.path.join(temp, "rev.tar")
+        with open(archive, 'wb') as f:
+            subprocess.run(["git", "archive", f"{rev}:src", "SLQimao"], stdout=f, check=True, cwd=os.path.dirname(src))
+        with tarfile.open(archive) as tar:
+            tar.extractall(temp, filter="data")
+        output = os.path.join(temp, "result.json")
+        # 子进程的工作目录（sys.path的第一项）是导出的文件夹，SLQimao来自该版本，benchmarks来自当前工作区
+        env = dict(os.environ, PYTHONPATH=src)
+        subprocess.run([sys.executable, "-m", "benchmarks.bench_micro", *argv, "--label", rev, "--json", output],
+                       check=True, cwd=temp, env=env)
+        with open(output, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="逐章节、逐请求路径的微基准测试")
+    parser.add_argument("-n", "--chapters", type=int, default=500, help="章节数")
+    parser.add_argument("-s", "--size", type=int, default=3000, help="每章字符数")
+    parser.add_argument("-r", "--repeat", type=int, default=7, help="重复轮数")
+    parser.add_argument("-k", "--keyword", nargs="+", help="只运行名称包含关键词的测试项")
+    parser.add_argument("--json", metavar="文件", help="把结果写入JSON文件（-表示输出到stdout）")
+    parser.add_argument("--label", help="结果的标签，默认为当前git版本")
+    parser.add_argument("--compare", nargs=2, metavar=("旧", "新"), help="对比两个JSON结果文件")
+    parser.add_argument("--rev", help="测试指定的git版本和当前工作区，并对比")
+    parser.add_argument("--threshold", type=float, default=0.1, help="对比时允许的变慢比例，默认0.1")
+    args = parser.parse_args()
+
+    if args.compare:
+        reports = []
+        for file in args.compare:
+            with open(file, 'r', encoding='utf-8') as f:
+                reports.append(json.load(f))
+        sys.exit(0 if compare(*reports, args.threshold) else 1)
+    if args.rev:
+        argv = ["-n", str(args.chapters), "-s", str(args.size), "-r", str(args.repeat)]
+        if args.keyword:
+            argv += ["-k", *args.keyword]
+        old = run_revision(args.rev, argv)
+        new = run(args)
+        show(new)
+        sys.exit(0 if compare(old, new, args.threshold) else 1)
+
+    report = run(args)
+    if args.json == "-":
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    show(report)
+
+
+if __name__ == "__main__":
+    main()
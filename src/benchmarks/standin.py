@@ -0,0 +1,143 @@
+"""
+本地替身服务器\n
+在127.0.0.1上模拟七猫的小说信息、目录、缓存下载、搜索接口与缓存zip文件，小说内容由synthetic生成（固定种子）\n
+用于离线测试与压力测试：把Book.api_bc和Book.api_ks指向server.url即可\n
+用法:
+    with StandinServer(chapters=50) as server:
+        Book.api_bc = Book.api_ks = server.url
+"""
+import io
+import json
+import hashlib
+import re
+import threading
+import time
+import zipfile
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from benchmarks import synthetic
+
+
+class StandinServer:
+    """
+    替身服务器，在后台线程中运行\n
+    :param chapters: 每本小说的章节数
+    :param size: 每章字符数
+    :param latency: 每个请求的额外延迟，单位秒
+    """
+    def __init__(self, chapters: int = 50, size: int = 3000, latency: float = 0) -> None:
+        self.chapters: int = chapters
+        self.size: int = size
+        self.latency: float = latency
+        self.requests: list = []        # (接口, 小说ID)，按请求顺序记录
+        self._books: dict = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.url: str = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def book(self, book_id: str) -> dict:
+        """
+        获取（首次访问时生成）一本小说的数据
+        :param book_id: 小说ID
+        :return: {"info": 小说信息, "catalog": 目录, "zip": 缓存文件内容}
+        """
+        with self._lock:
+            if book_id not in self._books:
+                self._books[book_id] = self._generate(book_id)
+            return self._books[book_id]
+
+    def _generate(self, book_id: str) -> dict:
+        catalog = []
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as z:
+            for i in range(self.chapters):
+                chapter_id = f"{book_id}{i:05d}"
+                text = synthetic.chapter_text(self.size, seed=int(book_id) * 100003 + i)
+                catalog.append({"id": chapter_id, "content_md5": hashlib.md5(text.encode('utf-8')).hexdigest(),
+                                "index": str(i + 1), "title": f"第{i + 1}章 标题{i + 1}",
+                                "words": str(len(text)), "chapter_sort": i + 1})
+                z.writestr(f"{chapter_id}.txt", synthetic.encrypt(text, iv=bytes([i % 256]) * 16))
+        info = {"title": f"替身小说{book_id}", "author": "替身作者", "intro": "离线测试用的合成小说",
+                "words_num": str(self.chapters * self.size), "book_tag_list": [{"title": "测试"}],
+                "image_link": f"{self.url}/cover/{book_id}.jpg"}
+        return {"info": info, "catalog": catalog, "zip": buffer.getvalue()}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str, headers: dict | None = None) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _json(self, data: dict) -> None:
+                self._send(200, json.dumps({"data": data}, ensure_ascii=False).encode('utf-8'), "application/json")
+
+            def do_GET(self) -> None:
+                url = urlsplit(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                if server.latency:
+                    time.sleep(server.latency)
+                if url.path == "/api/v1/reader/detail":
+                    server.requests.append(("detail", query["id"]))
+                    self._json(server.book(query["id"])["info"])
+                elif url.path == "/api/v1/chapter/chapter-list":
+                    server.requests.append(("chapter-list", query["id"]))
+                    self._json({"id": query["id"], "chapter_lists": server.book(query["id"])["catalog"]})
+                elif url.path == "/api/v1/book/download":
+                    server.requests.append(("download", query["id"]))
+                    self._json({"link": f"{server.url}/zip/{query['id']}.zip"})
+                elif url.path == "/search/v1/words":
+                    server.requests.append(("search", query["wd"]))
+                    self._json({"books": [{"id": str(10000 + i), "original_title": f"{query['wd']}{i}",
+                                           "original_author": "替身作者", "words_num": "1000"} for i in range(3)]})
+                elif match := re.fullmatch(r"/zip/(\d+)\.zip", url.path):
+                    server.requests.append(("zip", match.group(1)))
+                    self._zip(server.book(match.group(1))["zip"])
+                elif match := re.fullmatch(r"/cover/(\d+)\.jpg", url.path):
+                    server.requests.append(("cover", match.group(1)))
+                    self._send(200, b"\xff\xd8\xff\xe0standin-cover", "image/jpeg")
+                else:
+                    self._send(404, b"not found", "text/plain")
+
+            def _zip(self, data: bytes) -> None:
+                # 支持断点续传（Range）
+                headers = {"ETag": f'"{hashlib.md5(data).hexdigest()}"', "Accept-Ranges": "bytes"}
+                match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+                if match:
+                    start = int(match.group(1))
+                    if start >= len(data):
+                        self._send(416, b"", "application/zip", {"Content-Range": f"bytes */{len(data)}"})
+                        return
+                    headers["Content-Range"] = f"bytes {start}-{len(data) - 1}/{len(data)}"
+                    self._send(206, data[start:], "application/zip", headers)
+                else:
+                    self._send(200, data, "application/zip", headers)
+
+        return Handler
+
+    def start(self) -> "StandinServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StandinServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,54 @@
+"""
+生成基准测试使用的合成数据\n
+使用固定的随机种子，保证每次运行的输入完全相同\n
+不导入SLQimao，密钥在此保留一份，用bench_micro --rev测试旧版本时输入也不随被测版本变化
+"""
+import os
+import random
+from base64 import b64encode
+from Crypto.Cipher import AES  # noqa
+from Crypto.Util.Padding import pad  # noqa
+
+# 七猫缓存文件的加密密钥（同SLQimao.crypto.dkey）
+dkey: bytes = bytes.fromhex('32343263636238323330643730396531')
+
+
+def chapter_text(size: int, seed: int = 0) -> str:
+    """
+    生成指定大小（字符数）的章节正文
+    :param size: 字符数
+    :param seed: 随机种子
+    :return: 章节正文
+    """
+    rng = random.Random(seed)
+    chars = "的一是不了在人有我他这个们中来上大为和国地到以说时要就出会可也你对生能而子那得于着下自之年过发后作里"
+    lines = []
+    length = 0
+    while length < size:
+        line = ''.join(rng.choice(chars) for _ in range(rng.randint(20, 120))) + "。"
+        lines.append(line)
+        length += len(line) + 1
+    return '\n'.join(lines)[:size]
+
+
+def encrypt(text: str, iv: bytes | None = None) -> str:
+    """
+    按七猫缓存文件的格式加密文本：base64(iv + AES-CBC密文)
+    :param text: 明文
+    :param iv: 初始向量，默认随机
+    :return: 密文
+    """
+    if iv is None:
+        iv = os.urandom(16)
+    cipher = AES.new(dkey, AES.MODE_CBC, iv=iv)
+    return b64encode(iv + cipher.encrypt(pad(text.encode('utf-8'), AES.block_size))).decode()
+
+
+def chapters(count: int, size: int = 3000) -> list:
+    """
+    生成一组加密后的章节
+    :param count: 章节数
+    :param size: 每章字符数
+    :return: 加密后的章节列表
+    """
+    return [encrypt(chapter_text(size, seed=i), iv=bytes([i % 256]) * 16) for i in range(count)]
@@ -9,7 +9,7 @@ process.logfile = sys.stdout
 process.expect('按Enter键继续...')
 process.sendline('')
 # mode 1 test
-process.expect('请输入您的选择（1~9）:（默认“1”）')
+process.expect('请输入您的选择（1~10）:（默认“1”）')
 process.sendline('1')
 process.expect('请输入链接/ID，或输入s以进入搜索模式：')
 process.sendline(test_book_url)
@@ -19,17 +19,22 @@ process.sendline('')
 time.sleep(10)
 process.sendcontrol('c')
 # mode 2 test
-process.expect('请输入您的选择（1~9）:（默认“1”）')
+process.expect('请输入您的选择（1~10）:（默认“1”）')
 process.sendline('2')
 input('urls.txt准备好后按Enter键继续测试')
+process.expect('完成后请按Enter键继续:')
 process.sendline('')
+process.expect('请输入同时下载的小说数量')
 process.sendline('')
+process.expect('请输入保存文件所使用的编码')
+process.sendline('')
+process.expect('是否自行选择保存路径')
 process.sendline('')
 # process.expect('按Enter键退出程序（按Ctrl+C重新开始）...')
 time.sleep(10)
 process.sendcontrol('c')
 # mode 3 test
-process.expect('请输入您的选择（1~9）:（默认“1”）')
+process.expect('请输入您的选择（1~10）:（默认“1”）')
 process.sendline('3')
 process.expect('请输入链接/ID，或输入s以进入搜索模式：')
 process.sendline(test_book_url)
@@ -39,7 +44,7 @@ process.sendline('')
 time.sleep(10)
 process.sendcontrol('c')
 # mode 4 test
-process.expect('请输入您的选择（1~9）:（默认“1”）')
+process.expect('请输入您的选择（1~10）:（默认“1”）')
 process.sendline('4')
 process.expect('请输入链接/ID，或输入s以进入搜索模式：')
 process.sendline(test_book_url)
@@ -48,7 +53,7 @@ process.sendline('')
 time.sleep(10)
 process.sendcontrol('c')
 # mode 6 test
-process.expect('请输入您的选择（1~9）:（默认“1”）')
+process.expect('请输入您的选择（1~10）:（默认“1”）')
 process.sendline('6')
 process.expect('请选择更新模式:1 -> 单个更新 2-> 批量更新')
 process.sendline('1')
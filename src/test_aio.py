@@ -0,0 +1,106 @@
+"""
+AsyncBook测试（离线，使用benchmarks/standin.py的本地替身服务器）\n
+用法（在src目录下）: python -m unittest test_aio
+"""
+import asyncio
+import os
+import tempfile
+import unittest
+import zipfile
+from SLQimao import aio
+from SLQimao.book import Book
+from benchmarks import synthetic
+from benchmarks.standin import StandinServer
+
+
+class AsyncBookTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = StandinServer(chapters=20, size=500).start()
+        cls.api = (Book.api_bc, Book.api_ks)
+        Book.api_bc = Book.api_ks = cls.server.url
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        Book.api_bc, Book.api_ks = cls.api
+        cls.server.stop()
+
+    def setUp(self) -> None:
+        self.temp = tempfile.TemporaryDirectory()
+        self.dir = self.temp.name
+        self.server.requests.clear()
+
+    def tearDown(self) -> None:
+        self.temp.cleanup()
+
+    def requests(self, kind: str, book_id: str) -> int:
+        return self.server.requests.count((kind, book_id))
+
+    def test_ready(self) -> None:
+        book = aio.AsyncBook("101", workdir=self.dir)
+        asyncio.run(book.ready())
+        self.assertEqual(book.title, "替身小说101")
+        self.assertEqual(len(book.catalog), 20)
+        self.assertEqual(book.catalog[0]["id"], "10100000")
+
+    def test_totxt(self) -> None:
+        async def run() -> tuple:
+            book = aio.AsyncBook("102", workdir=self.dir, stream=True)
+            await book.ready()
+            return book, await book.totxt(self.dir)
+        book, success = asyncio.run(run())
+        self.assertTrue(success)
+        with open(book.file_path, encoding="utf-8") as f:
+            content = f.read()
+        self.assertIn(synthetic.chapter_text(500, seed=102 * 100003 + 19), content)
+        self.assertEqual(book.lastcid, "10200019")
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "102.zip")))
+
+    def test_concurrent_books(self) -> None:
+        ids = [str(200 + i) for i in range(5)]
+
+        async def run() -> list:
+            books = [aio.AsyncBook(book_id, workdir=self.dir, stream=True) for book_id in ids]
+            await asyncio.gather(*(book.ready() for book in books))
+            return await asyncio.gather(*(book.toepub(self.dir) for book in books))
+        self.assertEqual(asyncio.run(run()), [True] * 5)
+        for book_id in ids:
+            self.assertEqual(self.requests("zip", book_id), 1)
+            with zipfile.ZipFile(os.path.join(self.dir, f"替身小说{book_id}.epub")) as z:
+                self.assertEqual(z.namelist()[0], "mimetype")
+                self.assertIn("EPUB/chapter_20.xhtml", z.namelist())
+
+    def test_download_once(self) -> None:
+        async def run() -> tuple:
+            book = aio.AsyncBook("103", workdir=self.dir, stream=True)
+            await book.ready()
+            count = await book.download()
+            return count, await book.export(self.dir, ["txt", "chapter"])
+        self.assertEqual(asyncio.run(run()), (20, True))
+        self.assertEqual(self.requests("zip", "103"), 1)
+        self.assertEqual(len(os.listdir(os.path.join(self.dir, "替身小说103"))), 21)
+
+    def test_profile(self) -> None:
+        async def run() -> tuple:
+            async with aio.AsyncBook("104", workdir=self.dir, stream=True, profile=True) as book:
+                executor = book.executor
+                await book.ready()
+                checkpoints = [checkpoint[0] for checkpoint in book._profiler.checkpoints]
+                return book, executor, checkpoints, await book.totxt(self.dir)
+        book, executor, checkpoints, success = asyncio.run(run())
+        self.assertTrue(success)
+        # 专用线程在离开async with时关闭
+        self.assertIsNone(book.executor)
+        with self.assertRaises(RuntimeError):
+            executor.submit(print)
+        self.assertEqual(checkpoints, ["start", "ready"])
+        self.assertIsNone(book._profiler)
+        self.assertTrue(os.path.exists(os.path.join(self.dir, "替身小说104.totxt.prof")))
+
+    def test_search(self) -> None:
+        books = asyncio.run(aio.search("关键词"))
+        self.assertEqual([book["original_title"] for book in books], ["关键词0", "关键词1", "关键词2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
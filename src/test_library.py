@@ -0,0 +1,80 @@
+"""
+小说索引测试（离线，使用benchmarks/standin.py的本地替身服务器）\n
+用法（在src目录下）: python -m unittest test_library
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from SLQimao import book
+from SLQimao.book import Book
+from SLQimao.library import Library
+from benchmarks.standin import StandinServer
+
+
+class LibraryTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = StandinServer(chapters=10, size=300).start()
+        self.api = (Book.api_bc, Book.api_ks)
+        Book.api_bc = Book.api_ks = self.server.url
+        self.temp = tempfile.TemporaryDirectory()
+        self.dir = self.temp.name
+        self.library = Library(os.path.join(self.dir, "library.db"))
+
+    def tearDown(self) -> None:
+        self.library.close()
+        Book.api_bc, Book.api_ks = self.api
+        self.server.stop()
+        self.temp.cleanup()
+
+    def download(self, book_id: str, path: str, encoding: str = "utf-8") -> Book:
+        # 与程序下载完成后的记录方式相同
+        workdir = os.path.join(self.dir, "temp", book_id)
+        os.makedirs(workdir, exist_ok=True)
+        os.makedirs(path, exist_ok=True)
+        novel = Book(book_id, workdir=workdir, quiet=True, stream=True)
+        novel.ready(refresh=True)
+        self.assertTrue(novel.totxt(path, encoding))
+        self.library.record(novel.book_id, novel.title, novel.file_path, "txt", encoding=novel.encoding,
+                            lastcid=novel.catalog[-1]["id"], catalog=novel.catalog_digest(), sha256=novel.file_hash)
+        return novel
+
+    def test_update_moved_file(self) -> None:
+        novel = self.download("401", os.path.join(self.dir, "output"))
+        # 按提示把文件移到“更新”文件夹
+        folder = os.path.join(self.dir, "更新")
+        os.makedirs(folder, exist_ok=True)
+        moved = shutil.move(novel.file_path, os.path.join(folder, os.path.basename(novel.file_path)))
+        row = self.library.lookup(moved, "txt")
+        self.assertIsNotNone(row)
+        self.assertEqual(row["book_id"], "401")
+        self.assertEqual(book.file_sha256(moved), row["sha256"])
+
+        # 小说新增章节后更新
+        self.server.chapters = 12
+        self.server._books.clear()
+        renewed = self.download(row["book_id"], folder, row["encoding"])
+        self.assertNotEqual(renewed.catalog_digest(), row["catalog"])
+        rows = self.library.find("401")
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["path"], os.path.abspath(moved))
+        self.assertEqual(rows[0]["lastcid"], "40100011")
+        self.assertEqual(self.library.lookup(moved, "txt")["sha256"], book.file_sha256(moved))
+
+    def test_lookup_unknown(self) -> None:
+        self.download("402", os.path.join(self.dir, "output"))
+        self.assertIsNone(self.library.lookup(os.path.join(self.dir, "更新", "别的小说.txt"), "txt"))
+        self.assertIsNone(self.library.lookup(os.path.join(self.dir, "更新", "替身小说402.txt"), "epub"))
+
+    def test_copy_keeps_original(self) -> None:
+        novel = self.download("403", os.path.join(self.dir, "output"))
+        copy = os.path.join(self.dir, "副本", os.path.basename(novel.file_path))
+        os.makedirs(os.path.dirname(copy), exist_ok=True)
+        shutil.copy(novel.file_path, copy)
+        self.assertEqual(self.library.lookup(copy, "txt")["path"], os.path.abspath(novel.file_path))
+        self.download("403", os.path.dirname(copy))
+        self.assertEqual(len(self.library.find("403")), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
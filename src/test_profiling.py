@@ -0,0 +1,83 @@
+"""
+性能分析测试（离线，使用benchmarks/standin.py的本地替身服务器）\n
+用法（在src目录下）: python -m unittest test_profiling
+"""
+import os
+import sys
+import tempfile
+import tracemalloc
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from SLQimao import profiling
+from SLQimao.book import Book
+from benchmarks.standin import StandinServer
+
+
+class ProfilingTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = StandinServer(chapters=10, size=300).start()
+        cls.api = (Book.api_bc, Book.api_ks)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        Book.api_bc, Book.api_ks = cls.api
+        cls.server.stop()
+
+    def setUp(self) -> None:
+        Book.api_bc = Book.api_ks = self.server.url
+        self.temp = tempfile.TemporaryDirectory()
+        self.dir = self.temp.name
+
+    def tearDown(self) -> None:
+        self.temp.cleanup()
+
+    def assertStopped(self, book: Book) -> None:
+        self.assertIsNone(book._profiler)
+        self.assertIsNone(sys.getprofile())
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(profiling._active, 0)
+
+    def totxt(self, book_id: str) -> None:
+        book = Book(book_id, workdir=self.dir, quiet=True, stream=True, profile=True)
+        book.ready()
+        self.assertTrue(book.totxt(self.dir))
+        self.assertStopped(book)
+        self.assertTrue(os.path.exists(os.path.join(self.dir, f"替身小说{book_id}.totxt.prof")))
+
+    def test_ready_failure(self) -> None:
+        # 获取信息失败后不能影响下一本小说的分析
+        Book.api_bc = Book.api_ks = "http://127.0.0.1:9"
+        book = Book("501", workdir=self.dir, quiet=True, stream=True, profile=True)
+        with self.assertRaises(Exception):
+            book.ready()
+        self.assertStopped(book)
+        Book.api_bc = Book.api_ks = self.server.url
+        self.totxt("502")
+
+    def test_prepare_failure(self) -> None:
+        book = Book("503", workdir=self.dir, quiet=True, stream=True, profile=True)
+        book.ready()
+        self.assertIsNotNone(book._profiler)
+        Book.api_bc = "http://127.0.0.1:9"
+        with self.assertRaises(Exception):
+            book._prepare()
+        self.assertStopped(book)
+        Book.api_bc = self.server.url
+        self.totxt("504")
+
+    def test_concurrent(self) -> None:
+        # 同一进程中同时只分析一本小说，另一本照常下载
+        books = [Book(book_id, workdir=self.dir, quiet=True, stream=True, profile=True) for book_id in ("505", "506")]
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(Book.ready, books))
+            self.assertEqual(sum(book._profiler is not None for book in books), 1)
+            self.assertEqual(list(pool.map(lambda book: book.totxt(self.dir), books)), [True, True])
+        for book in books:
+            self.assertStopped(book)
+        self.assertEqual(len([name for name in os.listdir(self.dir) if name.endswith(".prof")]), 1)
+        self.totxt("507")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+"""
+DownloadService测试（离线，使用benchmarks/standin.py的本地替身服务器）\n
+用法（在src目录下）: python -m unittest test_service
+"""
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+import requests
+from SLQimao.book import Book
+from SLQimao.service import DownloadService
+from benchmarks import synthetic
+from benchmarks.standin import StandinServer
+
+
+class DownloadServiceTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = StandinServer(chapters=20, size=500).start()
+        cls.api = (Book.api_bc, Book.api_ks)
+        Book.api_bc = Book.api_ks = cls.server.url
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        Book.api_bc, Book.api_ks = cls.api
+        cls.server.stop()
+
+    def setUp(self) -> None:
+        self.temp = tempfile.TemporaryDirectory()
+        self.dir = self.temp.name
+        self.recorded = []
+        self.service = DownloadService(os.path.join(self.dir, "output"), workdir=os.path.join(self.dir, "temp"),
+                                       workers=2, port=0,
+                                       on_success=lambda book, format_, path: self.recorded.append(
+                                           (book.book_id, format_))).start()
+
+    def tearDown(self) -> None:
+        self.service.stop()
+        self.temp.cleanup()
+
+    def submit(self, data: dict) -> dict:
+        response = requests.post(f"{self.service.url}/jobs", json=data, timeout=5)
+        self.assertEqual(response.status_code, 202, response.text)
+        return response.json()
+
+    def wait(self, job_id: str) -> dict:
+        for _ in range(200):
+            job = requests.get(f"{self.service.url}/jobs/{job_id}", timeout=5).json()
+            if job["state"] in ("done", "failed"):
+                return job
+            time.sleep(0.05)
+        self.fail(f"任务{job_id}未完成")
+
+    def test_txt(self) -> None:
+        job = self.wait(self.submit({"book": "301"})["id"])
+        self.assertEqual(job["state"], "done")
+        self.assertEqual(job["books"][0]["title"], "替身小说301")
+        self.assertIn("merge", job["books"][0]["report"]["stages"])
+        response = requests.get(f"{self.service.url}/jobs/{job['id']}/result", timeout=5)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(synthetic.chapter_text(500, seed=301 * 100003 + 19), response.content.decode("utf-8"))
+        self.assertEqual(response.headers["Content-Length"], str(len(response.content)))
+        self.assertEqual(self.recorded, [("301", "txt")])
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "temp", "301")))
+        self.assertEqual(self.service._book_locks, {})
+
+    def test_manifest_formats(self) -> None:
+        job = self.wait(self.submit({"manifest": "302\n\n303\n", "formats": "normal,chapter,epub"})["id"])
+        self.assertEqual(job["state"], "done")
+        self.assertEqual([entry["book_id"] for entry in job["books"]], ["302", "303"])
+        self.assertEqual(self.server.requests.count(("zip", "302")), 1)
+        result = f"{self.service.url}/jobs/{job['id']}/result"
+        response = requests.get(result, params={"book": "303", "format": "chapter"}, timeout=5)
+        with zipfile.ZipFile(io.BytesIO(response.content)) as z:
+            self.assertEqual(len(z.namelist()), 21)
+        response = requests.get(result, params={"book": "302", "format": "epub"}, timeout=5)
+        with zipfile.ZipFile(io.BytesIO(response.content)) as z:
+            self.assertEqual(z.namelist()[0], "mimetype")
+        self.assertEqual(requests.get(result, params={"book": "302"}, timeout=5).status_code, 404)
+        self.assertEqual(sorted(self.recorded), [(book_id, format_) for book_id in ("302", "303")
+                                                 for format_ in ("chapter", "epub", "txt")])
+
+    def test_invalid(self) -> None:
+        for data in ({}, {"books": ["abc"]}, {"book": "304", "formats": ["pdf"]},
+                     {"book": "304", "encoding": "nope"}):
+            response = requests.post(f"{self.service.url}/jobs", json=data, timeout=5)
+            self.assertEqual(response.status_code, 400, data)
+            self.assertIn("error", response.json())
+        self.assertEqual(requests.get(f"{self.service.url}/jobs/missing", timeout=5).status_code, 404)
+        self.assertEqual(requests.get(f"{self.service.url}/health", timeout=5).json()["jobs"], 0)
+
+    def test_output(self) -> None:
+        outside = os.path.join(self.dir, "outside")
+        for output in ("../..", "../outside", outside, "a/../../outside"):
+            response = requests.post(f"{self.service.url}/jobs", json={"book": "305", "output": output}, timeout=5)
+            self.assertEqual(response.status_code, 400, output)
+        self.assertEqual(self.service.jobs, {})
+        job = self.wait(self.submit({"book": "305", "output": "子文件夹"})["id"])
+        self.assertEqual(job["output"], os.path.join(os.path.realpath(self.service.output), "子文件夹"))
+        self.assertTrue(os.path.exists(os.path.join(job["output"], "替身小说305.txt")))
+        self.assertFalse(os.path.exists(outside))
+
+    def test_token(self) -> None:
+        with self.assertRaises(ValueError):
+            DownloadService(self.dir, host="0.0.0.0", port=0)
+        service = DownloadService(self.dir, host="0.0.0.0", port=0, token="secret").start()
+        try:
+            url = f"http://127.0.0.1:{service.url.rsplit(':', 1)[1]}"
+            self.assertEqual(requests.get(f"{url}/health", timeout=5).status_code, 401)
+            response = requests.post(f"{url}/jobs", json={"book": "306"}, timeout=5,
+                                     headers={"Authorization": "Bearer wrong"})
+            self.assertEqual(response.status_code, 401)
+            response = requests.get(f"{url}/health", headers={"Authorization": "Bearer secret"}, timeout=5)
+            self.assertEqual(response.status_code, 200)
+        finally:
+            service.stop()
+
+    def test_cross_origin(self) -> None:
+        url = f"{self.service.url}/jobs"
+        # 表单与纯文本请求浏览器可以跨站直接发送
+        for headers in ({"Content-Type": "application/x-www-form-urlencoded"}, {"Content-Type": "text/plain"}):
+            response = requests.post(url, data='{"book": "307"}', headers=headers, timeout=5)
+            self.assertEqual(response.status_code, 415)
+        response = requests.post(url, json={"book": "307"}, headers={"Origin": "http://evil.example"}, timeout=5)
+        self.assertEqual(response.status_code, 403)
+        # DNS重绑定：Host不是本机地址
+        port = self.service.url.rsplit(":", 1)[1]
+        response = requests.get(f"{self.service.url}/health", headers={"Host": f"evil.example:{port}"}, timeout=5)
+        self.assertEqual(response.status_code, 403)
+        response = requests.get(f"http://localhost:{port}/health", headers={"Origin": f"http://localhost:{port}"},
+                                timeout=5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.service.jobs, {})
+
+    def test_cancel(self) -> None:
+        # 服务停止时尚未开始的下载标记为已取消
+        gate = threading.Event()
+
+        def new_book(book_id: str, workdir: str) -> Book:
+            gate.wait(5)
+            return Book(book_id, workdir=workdir, quiet=True, stream=True)
+        service = DownloadService(os.path.join(self.dir, "output"), workdir=os.path.join(self.dir, "temp"),
+                                  workers=1, port=0, new_book=new_book).start()
+        job = service.submit(["308", "309", "310"])
+        for _ in range(100):
+            if job.books[0]["state"] == "running":
+                break
+            time.sleep(0.01)
+        service.stop(wait=False)
+        self.assertEqual([entry["state"] for entry in job.books[1:]], ["cancelled", "cancelled"])
+        gate.set()
+        for _ in range(200):
+            if job.finished is not None:
+                break
+            time.sleep(0.05)
+        self.assertEqual(job.books[0]["state"], "done")
+        self.assertEqual(job.state, "cancelled")
+        self.assertEqual(service._book_locks, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+ChapterStore测试（离线）\n
+用法（在src目录下）: python -m unittest test_store
+"""
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from SLQimao.store import ChapterStore
+
+
+def chapters(book_id: str, count: int) -> list:
+    return [({'id': f"{book_id}-{i}", 'content_md5': f"md5-{i}"}, f"{book_id}第{i}章" + os.urandom(500).hex())
+            for i in range(count)]
+
+
+class ChapterStoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp.name, "chapters.db")
+
+    def tearDown(self) -> None:
+        self.temp.cleanup()
+
+    def test_max_bytes(self) -> None:
+        # 超过大小上限时整本淘汰最久未使用的小说，正在写入的小说保留
+        store = ChapterStore(self.path)
+        for book_id in ("1", "2", "3"):
+            store.put_many(book_id, chapters(book_id, 3))
+            time.sleep(0.01)
+        # 只能再多放下不到一本
+        store.max_bytes = store._conn.execute("SELECT SUM(size) FROM chapters").fetchone()[0] + 100
+        store.get_many([chapter for chapter, _ in chapters("1", 3)])
+        store.put_many("4", chapters("4", 3))
+        self.assertEqual(store.missing([chapter for chapter, _ in chapters("1", 3)]), 0)
+        self.assertEqual(store.missing([chapter for chapter, _ in chapters("2", 3)]), 3)
+        self.assertEqual(store.missing([chapter for chapter, _ in chapters("4", 3)]), 0)
+        store.close()
+
+    def test_ttl(self) -> None:
+        store = ChapterStore(self.path)
+        store.put_many("1", chapters("1", 2))
+        store.put_cover("cover", b"image")
+        store.ttl = 0
+        store.prune()
+        self.assertEqual(store.missing([chapter for chapter, _ in chapters("1", 2)]), 2)
+        self.assertIsNone(store.get_cover("cover"))
+        store.put_many("2", chapters("2", 2))
+        store.clear()
+        self.assertEqual(store.missing([chapter for chapter, _ in chapters("2", 2)]), 2)
+        store.close()
+
+    def test_upgrade(self) -> None:
+        # 旧版本的存储文件没有size与accessed列
+        conn = sqlite3.connect(self.path)
+        conn.executescript("""
+            CREATE TABLE chapters (id TEXT PRIMARY KEY, md5 TEXT NOT NULL, book_id TEXT NOT NULL,
+                                   content BLOB NOT NULL);
+            CREATE TABLE covers (url TEXT PRIMARY KEY, content BLOB NOT NULL);
+        """)
+        conn.execute("INSERT INTO covers VALUES ('cover', x'00')")
+        conn.commit()
+        conn.close()
+        store = ChapterStore(self.path)
+        self.assertEqual(store.get_cover("cover"), b"\x00")
+        store.put_many("1", chapters("1", 2))
+        self.assertEqual(len(store.get_many([chapter for chapter, _ in chapters("1", 2)])), 2)
+        store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()